@@ -0,0 +1,40 @@
+"""
+This example times a single evaluation of the variance objective (with and
+without its gradient) that the ACV optimizers minimize, for several
+algorithms and numbers of models. The objective is evaluated at the default
+increasing ratios on a random covariance matrix.
+"""
+import timeit
+
+import numpy as np
+from mxmc import Optimizer
+
+
+def random_covariance(num_models):
+    rand_matrix = np.random.random((num_models, num_models))
+    return np.dot(rand_matrix.T, rand_matrix)
+
+
+np.random.seed(1)
+target_cost = 100
+num_repeats = 1000
+algorithms_to_compare = ["acvis", "wrdiff", "acvmf", "acvmfmc", "acvmfu"]
+
+print(" Algorithm   Models   Objective (us)   Objective+Grad (us)")
+print("-----------------------------------------------------------")
+template = "{:^11s} {:^8d} {:^16.1f} {:^21.1f}"
+for num_models in [3, 6, 10]:
+    covariance = random_covariance(num_models)
+    model_costs = np.power(10.0, -np.arange(num_models))
+    ratios = np.arange(2, num_models + 1, dtype=float)
+    for algorithm in algorithms_to_compare:
+        optimizer = Optimizer.get_algorithm(algorithm)(model_costs,
+                                                       covariance)
+        times = []
+        for gradient in [False, True]:
+            run_time = timeit.timeit(
+                    lambda: optimizer._compute_objective_function(
+                            ratios, target_cost, gradient=gradient),
+                    number=num_repeats)
+            times.append(run_time / num_repeats * 1e6)
+        print(template.format(algorithm, num_models, *times))
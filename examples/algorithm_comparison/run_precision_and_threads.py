@@ -0,0 +1,69 @@
+"""
+This example benchmarks the precision policies and thread count setting of
+the ACV optimizers on a problem with many quantities of interest.
+
+The first table compares the run time and resulting estimator variance of
+the "double" (default), "single" and "mixed" (single precision optimization
+followed by a double precision refinement) precision policies.
+
+The second table compares the throughput of running several optimizations
+in parallel processes when torch is left with its default thread pool and
+when each optimizer is limited to a single thread (num_threads=1), which
+avoids oversubscribing the cores.
+"""
+import multiprocessing
+import time
+import warnings
+
+import numpy as np
+from mxmc import Optimizer
+
+
+def random_covariance(num_models, num_qois):
+    covariance = np.empty((num_models, num_models, num_qois))
+    for i in range(num_qois):
+        rand_matrix = np.random.random((num_models, num_models))
+        covariance[:, :, i] = np.dot(rand_matrix.T, rand_matrix)
+    return covariance
+
+
+def run_optimization(args):
+    algorithm, precision, num_threads = args
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        optimizer = Optimizer(model_costs, covariance, num_threads=num_threads)
+        result = optimizer.optimize(algorithm, target_cost,
+                                    precision=precision)
+    return np.sum(result.variance)
+
+
+np.random.seed(1)
+num_models = 5
+num_qois = 5000
+target_cost = 100
+model_costs = np.power(10.0, -np.arange(num_models))
+covariance = random_covariance(num_models, num_qois)
+
+print(" Algorithm   Precision   Time (s)   Variance")
+print("---------------------------------------------")
+template = "{:^11s} {:^11s} {:>8.2f} {:>11.4e}"
+for algorithm in ["acvmf", "acvis", "wrdiff"]:
+    for precision in ["double", "single", "mixed"]:
+        start_time = time.perf_counter()
+        variance = run_optimization((algorithm, precision, None))
+        run_time = time.perf_counter() - start_time
+        print(template.format(algorithm, precision, run_time, variance))
+
+num_processes = multiprocessing.cpu_count()
+num_optimizations = 2 * num_processes
+print()
+print(" Threads per optimizer   Optimizations / s")
+print("-------------------------------------------")
+for num_threads in [None, 1]:
+    jobs = [("acvmf", "double", num_threads)] * num_optimizations
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(num_processes) as pool:
+        pool.map(run_optimization, jobs)
+    run_time = time.perf_counter() - start_time
+    label = "default" if num_threads is None else str(num_threads)
+    print("{:^23s} {:>12.2f}".format(label, num_optimizations / run_time))
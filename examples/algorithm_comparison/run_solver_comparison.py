@@ -0,0 +1,67 @@
+"""
+This example compares the numerical solvers available to the ACV optimizers
+on the monomial model scenario (no cost gap) of run_monomial.py. For each
+algorithm and solver, the number of objective function evaluations needed to
+reach the solution, the wall clock time and the resulting estimator variance
+are reported.
+
+Available solvers:
+
+* slsqp_nelder_mead (default): SLSQP followed by a penalized Nelder-Mead
+  polish
+* slsqp: SLSQP only, falling back to Nelder-Mead if SLSQP does not converge
+  to a feasible point
+* trust_constr: scipy trust-constr using exact (torch) Hessians
+* trust_constr_bfgs: scipy trust-constr using BFGS Hessian approximations
+
+"""
+import time
+import warnings
+
+import numpy as np
+from mxmc import Optimizer
+
+
+def monomial_covariance(exponents):
+    num_models = len(exponents)
+    cov = np.empty((num_models, num_models))
+    for i, p_i in enumerate(exponents):
+        for j, p_j in enumerate(exponents):
+            cov[i, j] = 1.0 / (p_i + p_j + 1) - 1.0 / ((p_i + 1) * (p_j + 1))
+    return cov
+
+
+def counting_optimizer(algorithm, counter):
+    algorithm_class = Optimizer.get_algorithm(algorithm)
+
+    class CountingOptimizer(algorithm_class):
+        def _compute_objective_function(self, *args, **kwargs):
+            counter[0] += 1
+            return super()._compute_objective_function(*args, **kwargs)
+
+    return CountingOptimizer
+
+
+covariance = monomial_covariance(exponents=[5, 4, 3, 2, 1])
+target_cost = 20
+model_costs = np.power(10.0, [0, -1, -2, -3, -4])
+
+algorithms_to_compare = ["acvmf", "acvmfu", "acvis", "wrdiff"]
+solvers_to_compare = ["slsqp_nelder_mead", "slsqp", "trust_constr",
+                      "trust_constr_bfgs"]
+
+print(" Algorithm       Solver        Evals   Time (s)   Variance")
+print("------------------------------------------------------------")
+template = "{:^11s} {:^19s} {:>6d} {:>10.3f} {:>10.3e}"
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    for algorithm in algorithms_to_compare:
+        for solver in solvers_to_compare:
+            num_evals = [0]
+            optimizer = counting_optimizer(algorithm, num_evals)(
+                    model_costs, covariance, solver=solver)
+            start_time = time.perf_counter()
+            opt_result = optimizer.optimize(target_cost)
+            run_time = time.perf_counter() - start_time
+            print(template.format(algorithm, solver, num_evals[0], run_time,
+                                  np.sum(opt_result.variance)))
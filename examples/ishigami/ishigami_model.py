@@ -1,5 +1,3 @@
-from math import sin
-
 import numpy as np
 
 
@@ -11,7 +9,12 @@ class IshigamiModel:
     Authors: E. Qian, B. Peherstorfer, D. O’Malley, V. V. Vesselinov,
         and K. Willcox
     URL: https://epubs.siam.org/doi/abs/10.1137/17M1151006
+
+    The model is batched and callable, so the mxmc evaluators use it like an
+    mxmc.evaluation.Model.
     """
+    batched = True
+
     def __init__(self, a, b, c):
 
         # Ishigami takes three input random variables abc, usually drawn
@@ -29,14 +32,16 @@ class IshigamiModel:
         """
         Run Ishigami for each row of ndarray inputs and return outputs.
         Outputs will be one value for each row in an ndarray.
-        Each row should have three inputs as defined by Ishigami.
+        Each row should have three inputs as defined by Ishigami. All rows
+        are evaluated at once with vectorized numpy operations.
         """
         assert isinstance(inputs, np.ndarray)
         assert len(inputs.shape) == 2 and inputs.shape[1] == 3
 
-        return np.apply_along_axis(func1d=self.simulate,
-                                   axis=1,
-                                   arr=inputs)
+        return self._ishigami_func(inputs[:, 0], inputs[:, 1], inputs[:, 2])
+
+    def __call__(self, inputs):
+        return self.evaluate(inputs)
 
     def simulate(self, inputs):
         """
@@ -49,12 +54,13 @@ class IshigamiModel:
 
     def _ishigami_func(self, z1, z2, z3):
         """
-        Return result of Ishigami function for given zi, i=1, 2, 3
+        Return result of Ishigami function for given zi, i=1, 2, 3 (scalars
+        or arrays)
         """
         # Compute each term.
-        term1 = sin(z1)
-        term2 = self._a * sin(z2) ** 2
-        term3 = self._b * z3 ** self._c * sin(z1)
+        term1 = np.sin(z1)
+        term2 = self._a * np.sin(z2) ** 2
+        term3 = self._b * z3 ** self._c * np.sin(z1)
 
         # Return the sum of the terms.
         return term1 + term2 + term3
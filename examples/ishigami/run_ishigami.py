@@ -3,6 +3,7 @@ import numpy as np
 from mxmc import Optimizer
 from mxmc import OutputProcessor
 from mxmc import Estimator
+from mxmc.evaluation import ModelEvaluator
 
 from ishigami_model import IshigamiModel
 
@@ -71,9 +72,10 @@ for samples in model_input_samples:
 print("\n")
 
 # Step 4: Compute model outputs for prescribed inputs.
-model_outputs = list()
-for input_sample, model in zip(model_input_samples, models):
-    model_outputs.append(model.evaluate(input_sample))
+# MXMC's ModelEvaluator runs every model on its prescribed inputs in a pool
+# of workers, scheduling the most expensive batches first.
+evaluator = ModelEvaluator(models, model_costs)
+model_outputs = evaluator.evaluate(sample_allocation, all_samples)
 
 # Step 5. Form estimator.
 
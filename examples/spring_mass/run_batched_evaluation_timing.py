@@ -0,0 +1,34 @@
+"""
+This example compares evaluating the spring mass model one sample at a time
+(as a scalar model) with passing it whole blocks of samples, which the
+vectorized model integrates together.
+"""
+import time
+
+import numpy as np
+
+from mxmc.evaluation import evaluate_model
+
+from spring_mass_model import SpringMassModel
+
+
+np.random.seed(1)
+num_samples = 500
+inputs = (1.0 + 2.5 * np.random.beta(3., 2., num_samples)).reshape(-1, 1)
+
+print(" Time step   Per sample (s)   Blocks (s)   Speedup")
+print("----------------------------------------------------")
+for time_step in [1, 0.01, 0.001]:
+    model = SpringMassModel(time_step=time_step)
+
+    start_time = time.perf_counter()
+    per_sample_outputs = evaluate_model(model, inputs, chunk_size=1)
+    per_sample_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    block_outputs = evaluate_model(model, inputs, chunk_size=250)
+    block_time = time.perf_counter() - start_time
+
+    assert np.allclose(per_sample_outputs, block_outputs, rtol=1e-5)
+    print("{:^10} {:>14.3f} {:>12.3f} {:>9.1f}".format(
+        time_step, per_sample_time, block_time, per_sample_time / block_time))
@@ -1,8 +1,11 @@
+import os
+import tempfile
+
 import numpy as np
 
 from mxmc import Optimizer
-from mxmc import OutputProcessor
 from mxmc import Estimator
+from mxmc.evaluation import CampaignStore, ModelEvaluator, profile_pilot_runs
 
 from spring_mass_model import SpringMassModel
 
@@ -18,35 +21,34 @@ def get_sample_beta_distribution(num_samples):
 
 np.random.seed(1)
 
-num_pilot_samples = 10
+num_pilot_samples = 40
 
-model_costs = np.array([100, 10, 1])
 model_hifi = SpringMassModel(time_step=0.001)
 model_medfi = SpringMassModel(time_step=0.01)
 model_lofi = SpringMassModel(time_step=1)
 
-# Step 1: Compute model outputs for pilot samples.
-pilot_inputs = get_sample_beta_distribution(num_pilot_samples)
-
-pilot_outputs_hifi = np.zeros(num_pilot_samples)
-pilot_outputs_medfi = np.zeros(num_pilot_samples)
-pilot_outputs_lofi = np.zeros(num_pilot_samples)
+models = [model_hifi, model_medfi, model_lofi]
 
-for i, pilot_input in enumerate(pilot_inputs):
-    pilot_outputs_hifi[i] = model_hifi.evaluate([pilot_input])
-    pilot_outputs_medfi[i] = model_medfi.evaluate([pilot_input])
-    pilot_outputs_lofi[i] = model_lofi.evaluate([pilot_input])
+# Step 1: Compute model outputs for pilot samples. The pilot runs are timed
+# to measure the cost (seconds per sample) of every model, and the covariance
+# matrix is computed from their outputs.
+pilot_inputs = get_sample_beta_distribution(num_pilot_samples).reshape(-1, 1)
+pilot_profile = profile_pilot_runs(models, pilot_inputs)
+model_costs = pilot_profile.model_costs
+covariance_matrix = pilot_profile.covariance
 
-# Get covariance matrix from model outputs.
-pilot_outputs = [pilot_outputs_hifi, pilot_outputs_medfi, pilot_outputs_lofi]
-covariance_matrix = OutputProcessor.compute_covariance_matrix(pilot_outputs)
+print("Measured model costs (s) = ", model_costs)
+print("Confidence intervals = ", pilot_profile.cost_intervals.tolist())
 
-# Step 2: Perform sample allocation optimization.
-target_cost = 10000
+# Step 2: Perform sample allocation optimization. The pilot samples were
+# evaluated with all models, so they are reused as the first group of the
+# allocation and only additional samples are allocated within the target cost.
+target_cost = 1000 * model_costs[0]
 variance_results = {}
 sample_allocation_results = {}
 
-mxmc_optimizer = Optimizer(model_costs, covariance_matrix)
+mxmc_optimizer = Optimizer(model_costs, covariance_matrix,
+                           num_pilot_samples=num_pilot_samples)
 
 for algorithm in ["acvmf", "acvkl", "grdmr"]:
     opt_result = mxmc_optimizer.optimize(algorithm, target_cost)
@@ -58,28 +60,26 @@ sample_allocation = sample_allocation_results[best_method]
 
 print("Best method = ", best_method)
 
-# Step 3: Generate input samples for models.
-all_samples = get_sample_beta_distribution(sample_allocation.num_total_samples)
-model_input_samples = sample_allocation.allocate_samples_to_models(all_samples)
-
-# Step 4: Compute model outputs for prescribed inputs.
-input_samples_hifi = model_input_samples[0]
-outputs_hifi = np.zeros(len(input_samples_hifi))
-for i, input_hifi in enumerate(input_samples_hifi):
-    outputs_hifi[i] = model_hifi.evaluate([input_hifi])
-
-input_samples_medfi = model_input_samples[1]
-outputs_medfi = np.zeros(len(input_samples_medfi))
-for i, input_medfi in enumerate(input_samples_medfi):
-    outputs_medfi[i] = model_medfi.evaluate([input_medfi])
-
-input_samples_lofi = model_input_samples[2]
-outputs_lofi = np.zeros(len(input_samples_lofi))
-for i, input_lofi in enumerate(input_samples_lofi):
-    outputs_lofi[i] = model_lofi.evaluate([input_lofi])
+# Step 3: Generate input samples for models (one row per sample). The pilot
+# inputs are the first samples of the allocation.
+num_new_samples = sample_allocation.num_total_samples - num_pilot_samples
+new_samples = get_sample_beta_distribution(num_new_samples).reshape(-1, 1)
+all_samples = np.concatenate((pilot_inputs, new_samples))
+
+# Step 4: Compute model outputs for prescribed inputs. The pilot outputs are
+# recorded in a campaign store first, so that only the new samples are
+# evaluated. Each model receives its assigned input samples in blocks.
+with tempfile.TemporaryDirectory() as campaign_dir:
+    store = CampaignStore(os.path.join(campaign_dir, "campaign.h5"),
+                          sample_allocation, all_samples)
+    for i, pilot_outputs in enumerate(pilot_profile.outputs):
+        store.write_outputs(i, np.arange(num_pilot_samples), pilot_outputs)
+
+    evaluator = ModelEvaluator(models, model_costs)
+    model_outputs = evaluator.evaluate(sample_allocation, all_samples,
+                                       store=store)
 
 # Step 5. Form estimator.
-model_outputs = [outputs_hifi, outputs_medfi, outputs_lofi]
 estimator = Estimator(sample_allocation, covariance_matrix)
 estimate = estimator.get_estimate(model_outputs)
 print("estimate = ", estimate)
@@ -0,0 +1,52 @@
+"""
+This example drives the spring mass model as an external executable through
+its input-file/output-file command line convention (see the __main__ block
+of spring_mass_model.py). Each fidelity is a SubprocessModel with its own
+fixed inputs (gravity, mass, time step, cost) and the sample allocation is
+evaluated with concurrent runs of the executable.
+"""
+import os
+import sys
+
+import numpy as np
+
+from mxmc import Optimizer
+from mxmc import OutputProcessor
+from mxmc import Estimator
+from mxmc.evaluation import ModelEvaluator, SubprocessModel
+
+
+def get_sample_beta_distribution(num_samples):
+    return (1.0 + 2.5 * np.random.beta(3., 2., num_samples)).reshape(-1, 1)
+
+
+np.random.seed(1)
+model_script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "spring_mass_model.py")
+command = [sys.executable, model_script, "{input_file}", "{output_file}"]
+
+model_costs = np.array([100, 10, 1])
+time_steps = [0.001, 0.01, 1]
+models = [SubprocessModel(command,
+                          fixed_inputs=[9.8, 1.5, time_step, cost],
+                          timeout=60, retries=1)
+          for time_step, cost in zip(time_steps, model_costs)]
+
+# Step 1: Compute model outputs for pilot samples.
+pilot_inputs = get_sample_beta_distribution(10)
+pilot_outputs = [model(pilot_inputs) for model in models]
+covariance_matrix = OutputProcessor.compute_covariance_matrix(pilot_outputs)
+
+# Step 2: Perform sample allocation optimization.
+optimizer = Optimizer(model_costs, covariance_matrix)
+sample_allocation = optimizer.optimize("acvmf", 2000).allocation
+
+# Step 3/4: Generate input samples and evaluate the models on them.
+all_samples = \
+    get_sample_beta_distribution(sample_allocation.num_total_samples)
+evaluator = ModelEvaluator(models, model_costs, max_workers=1)
+model_outputs = evaluator.evaluate(sample_allocation, all_samples)
+
+# Step 5. Form estimator.
+estimator = Estimator(sample_allocation, covariance_matrix)
+print("estimate = ", estimator.get_estimate(model_outputs))
@@ -8,7 +8,13 @@ class SpringMassModel():
     Defines Spring Mass model with 1 free param (stiffness of spring, k). The
     quantity of interest that is returned by the evaluate() function is the
     maximum displacement over the specified time interval
+
+    The model is batched and callable, so the mxmc evaluators use it like an
+    mxmc.evaluation.Model; it does not import mxmc so that the command line
+    tool below stays standalone.
     """
+    batched = True
+
     def __init__(self, mass=1.5, gravity=9.8, state0=None, time_step=None,
                  cost=None):
 
@@ -30,20 +36,32 @@ class SpringMassModel():
     def simulate(self, stiffness):
         """
         Simulate spring mass system for given spring constant. Returns state
-        (position, velocity) at all points in time grid
+        (position, velocity) at all points in time grid. For an array of
+        spring constants, the systems are integrated together and the states
+        are stacked along a last axis.
         """
-        return odeint(self._integration_func, self._state0, self._t,
-                      args=(stiffness, self._mass, self._gravity))
+        stiffness = np.asarray(stiffness, dtype=float)
+        state0 = np.repeat(self._state0, stiffness.size)
+        states = odeint(self._integration_func, state0, self._t,
+                        args=(stiffness.ravel(), self._mass, self._gravity))
+        states = states.reshape(len(self._t), 2, -1)
+        if stiffness.ndim == 0:
+            return states[:, :, 0]
+        return states
 
     def evaluate(self, inputs):
         """
-        Returns the max displacement over the course of the simulation.
-        MXMC convention is that evaluated takes in an array and returns an
-        array (even for 1D examples like this one).
+        Returns the max displacement over the course of the simulation for
+        every input sample (one spring constant per sample). MXMC convention
+        is that evaluated takes in an array and returns an array (even for 1D
+        examples like this one).
         """
-        stiffness = inputs[0]
-        state = self.simulate(stiffness)
-        return np.array([max(state[:, 0])])
+        stiffness = np.asarray(inputs, dtype=float).reshape(-1)
+        states = self.simulate(stiffness)
+        return np.max(states[:, 0, :], axis=0)
+
+    def __call__(self, inputs):
+        return self.evaluate(inputs)
 
     @staticmethod
     def _integration_func(state, t, k, m, g):
@@ -52,15 +70,14 @@ class SpringMassModel():
         stiffness and mass. Helper function for numerical integrator
         """
 
-        # Unpack the state vector.
-        x = state[0]
-        xd = state[1]
+        # Unpack the state vector (positions, then velocities).
+        x, xd = state.reshape(2, -1)
 
         # Compute acceleration xdd.
         xdd = ((-k * x) / m) + g
 
         # Return the two state derivatives.
-        return [xd, xdd]
+        return np.concatenate((xd, xdd))
 
 
 if __name__ == "__main__":
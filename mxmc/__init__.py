@@ -1,3 +1,12 @@
 from mxmc.estimator import Estimator                 # noqa: F401
-from mxmc.optimizer import Optimizer                 # noqa: F401
 from mxmc.output_processor import OutputProcessor    # noqa: F401
+
+
+def __getattr__(name):
+    # The optimizers depend on torch; they are imported on first use so that
+    # the evaluation tools (e.g. in model subprocesses) stay lightweight.
+    if name == "Optimizer":
+        from mxmc.optimizer import Optimizer
+        return Optimizer
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
@@ -22,6 +22,7 @@ class ACVEstimator(EstimatorBase):
         self._alpha = self._calculate_alpha()
 
     def get_estimate(self, model_outputs):
+        model_outputs = self._read_model_outputs(model_outputs)
         self._validate_model_outputs(model_outputs)
         q = np.mean(model_outputs[0])
         for i in range(1, self._allocation.num_models):
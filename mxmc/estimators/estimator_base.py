@@ -43,8 +43,9 @@ class EstimatorBase(metaclass=ABCMeta):
         :param model_outputs: arrays of outputs for each model evaluated at the
             random inputs prescribed by the optimal sample allocation. Note:
             each output array must correspond exactly to the size/order of the
-            random inputs given by the optimal SampleAllocation object.
-        :type model_outputs: list of np.arrays
+            random inputs given by the optimal SampleAllocation object. A
+            CampaignStore holding the outputs can be given instead.
+        :type model_outputs: list of np.arrays or CampaignStore
 
         :Returns: the expected value estimator (float)
         """
@@ -54,6 +55,15 @@ class EstimatorBase(metaclass=ABCMeta):
     def _get_approximate_variance(self):
         raise NotImplementedError
 
+    @staticmethod
+    def _read_model_outputs(model_outputs):
+        if hasattr(model_outputs, "get_model_outputs"):
+            if not model_outputs.is_complete():
+                raise ValueError("Campaign store does not contain the outputs "
+                                 "of all model evaluations")
+            return model_outputs.get_model_outputs()
+        return model_outputs
+
     def _validate_model_outputs(self, model_outputs):
 
         if len(model_outputs) != self._allocation.num_models:
@@ -0,0 +1,22 @@
+from mxmc.evaluation.model import Model, evaluate_model        # noqa: F401
+from mxmc.evaluation.model_evaluator import ModelEvaluator     # noqa: F401
+from mxmc.evaluation.subprocess_model import SubprocessModel   # noqa: F401
+from mxmc.evaluation.campaign_store import CampaignStore       # noqa: F401
+from mxmc.evaluation.async_evaluator import AsyncModelEvaluator  # noqa: F401
+
+_OPTIMIZER_DEPENDENT_MODULES = {
+    "profile_pilot_runs": "mxmc.evaluation.pilot",
+    "run_adaptive_pilot": "mxmc.evaluation.pilot",
+    "AdaptiveCampaign": "mxmc.evaluation.adaptive_campaign",
+}
+
+
+def __getattr__(name):
+    # The pilot and campaign tools depend on the optimizers and torch; they
+    # are imported on first use so that models can be evaluated without them.
+    if name in _OPTIMIZER_DEPENDENT_MODULES:
+        from importlib import import_module
+        module = import_module(_OPTIMIZER_DEPENDENT_MODULES[name])
+        return getattr(module, name)
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
@@ -0,0 +1,279 @@
+from collections import namedtuple
+
+import numpy as np
+
+from mxmc.estimator import Estimator
+from mxmc.optimizer import Optimizer
+from mxmc.optimizers.approximate_control_variates.acv_optimizer import \
+    ACVOptimizer
+from mxmc.optimizers.approximate_control_variates.recursion_enumerator \
+    import RecursionEnumerator
+from mxmc.output_processor import OutputProcessor
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+from mxmc.util.batch_costs import get_total_cost
+
+CampaignBatch = namedtuple('CampaignBatch', ['allocation', 'inputs'])
+
+
+class AdaptiveCampaign:
+    '''
+    Controller of an evaluation campaign whose sample allocation is
+    re-optimized as model outputs arrive. The budget is spent in stages:
+    before every stage, the covariance is recomputed from all outputs
+    collected so far and the ACV algorithm optimizes the allocation of the
+    remaining budget, keeping all evaluated samples (see
+    mxmc.util.sample_modification.extend_sample_allocation). A fraction of
+    the new samples of this allocation (all of them in the last stage) is
+    issued as the next batch of work.
+
+    The re-optimization overhead is bounded by warm starts and caching: the
+    recursion structure of enumerating algorithms is selected in the first
+    stage only, every optimization starts from the ratios of the previous
+    one, and the previous ratios are reused without optimizing if the
+    covariance changed by less than reoptimize_tolerance.
+
+    :param model_costs: cost of all models
+    :type model_costs: np.array
+    :param sample_generator: function returning the given number of random
+        input samples (one row per sample)
+    :type sample_generator: callable
+    :param algorithm: name of the ACV algorithm
+    :type algorithm: string
+    :param target_cost: total cost of the campaign, including the pilot
+        samples. With setup_costs in algorithm_options, the pilot and every
+        batch pay the setup costs of their own batches.
+    :type target_cost: float
+    :param pilot_inputs: input samples that were evaluated with all models
+    :type pilot_inputs: np.array
+    :param pilot_outputs: outputs of all models for the pilot inputs
+    :type pilot_outputs: list of np.array
+    :param num_stages: number of stages the remaining budget is spent in
+    :type num_stages: int
+    :param reoptimize_tolerance: relative change (Frobenius norm) of the
+        covariance below which the previous ratios are reused
+    :type reoptimize_tolerance: float
+    :param algorithm_options: options of the optimization algorithm (see
+        Optimizer.optimize), except num_workers
+    '''
+    def __init__(self, model_costs, sample_generator, algorithm, target_cost,
+                 pilot_inputs, pilot_outputs, num_stages=4,
+                 reoptimize_tolerance=0.05, **algorithm_options):
+        algorithm_class = Optimizer.get_algorithm(algorithm)
+        if not issubclass(algorithm_class,
+                          (ACVOptimizer, RecursionEnumerator)):
+            raise ValueError("Adaptive campaigns are only available for the "
+                             "ACV algorithms")
+        if num_stages < 1:
+            raise ValueError("num_stages must be a positive integer")
+        if algorithm_options.get("num_workers") is not None:
+            raise ValueError("num_workers is not supported: the campaign "
+                             "budget is a total cost, not a makespan")
+        if len(pilot_outputs) != len(model_costs):
+            raise ValueError("Pilot outputs of every model are required")
+
+        self._model_costs = np.asarray(model_costs, dtype=float)
+        self._sample_generator = sample_generator
+        self._algorithm_class = algorithm_class
+        self._algorithm_options = algorithm_options
+        self._target_cost = target_cost
+        self._num_stages = num_stages
+        self._reoptimize_tolerance = reoptimize_tolerance
+
+        pilot_group = np.ones((1, 2 * len(model_costs)), dtype=int)
+        pilot_group[0, 0] = len(pilot_inputs)
+        self._allocation = ACVSampleAllocation(pilot_group)
+        self._inputs = np.asarray(pilot_inputs)
+        self._outputs = [np.asarray(outputs) for outputs in pilot_outputs]
+        self._spent_cost = self._get_batch_cost(
+                self._allocation.get_number_of_samples_per_model())
+        self._stage = 0
+        self._pending_batch = None
+
+        self._recursion_refs = None
+        self._cached_ratios = None
+        self._cached_covariance = None
+        self._num_optimizations = 0
+
+    @property
+    def allocation(self):
+        return self._allocation
+
+    @property
+    def inputs(self):
+        return self._inputs
+
+    @property
+    def outputs(self):
+        return self._outputs
+
+    @property
+    def num_optimizations(self):
+        '''
+        Number of numerical optimizations run so far (re-optimizations that
+        reused cached ratios are not counted)
+        '''
+        return self._num_optimizations
+
+    @property
+    def spent_cost(self):
+        '''
+        Cost of the pilot and all submitted batches, including their setup
+        costs
+        '''
+        return self._spent_cost
+
+    def is_complete(self):
+        '''
+        :Returns: whether the remaining budget does not allow another
+            evaluation of every model or all stages have been issued
+        '''
+        remaining_cost = self._target_cost - self.spent_cost
+        minimum_cost = self._get_batch_cost(np.ones(len(self._model_costs)))
+        return self._stage >= self._num_stages \
+            or remaining_cost < minimum_cost
+
+    def get_covariance(self):
+        '''
+        :Returns: covariance among the model outputs collected so far
+        '''
+        return OutputProcessor.compute_covariance_matrix(self._outputs,
+                                                         self._allocation)
+
+    def next_batch(self):
+        '''
+        Re-optimizes the allocation of the remaining budget with the current
+        covariance and issues the next batch of work.
+
+        :Returns: A CampaignBatch namedtuple with entries for allocation
+            (ACVSampleAllocation of the new samples, see ModelEvaluator) and
+            inputs (new input samples), or None if the campaign is complete
+        '''
+        if self._pending_batch is not None:
+            raise RuntimeError("The outputs of the previous batch must be "
+                               "submitted first")
+        if self.is_complete():
+            return None
+
+        remaining_cost = self._target_cost - self.spent_cost
+        allocation = self._optimize_allocation(self.get_covariance(),
+                                               remaining_cost)
+        num_existing_groups = len(self._allocation.compressed_allocation)
+        new_groups = allocation.compressed_allocation[num_existing_groups:]
+
+        fraction = 1 / (self._num_stages - self._stage)
+        stage_groups = new_groups.copy()
+        stage_groups[:, 0] = np.floor(new_groups[:, 0] * fraction)
+        stage_groups = stage_groups[stage_groups[:, 0] > 0]
+        if len(stage_groups) == 0:
+            stage_groups = new_groups
+
+        batch_allocation = ACVSampleAllocation(stage_groups)
+        batch_inputs = self._sample_generator(
+                batch_allocation.num_total_samples)
+        self._pending_batch = CampaignBatch(batch_allocation, batch_inputs)
+        return self._pending_batch
+
+    def submit(self, batch_outputs):
+        '''
+        Adds the outputs of the last issued batch to the campaign.
+
+        :param batch_outputs: outputs of all models for the samples of the
+            batch allocation (see ModelEvaluator.evaluate)
+        :type batch_outputs: list of np.array
+        '''
+        if self._pending_batch is None:
+            raise RuntimeError("No batch has been issued")
+        batch_allocation, batch_inputs = self._pending_batch
+        expected_lengths = batch_allocation.get_number_of_samples_per_model()
+        if [len(o) for o in batch_outputs] != list(expected_lengths):
+            raise ValueError("Batch outputs do not match the batch "
+                             "allocation")
+
+        self._spent_cost += self._get_batch_cost(expected_lengths)
+        self._allocation = ACVSampleAllocation(
+                np.vstack((self._allocation.compressed_allocation,
+                           batch_allocation.compressed_allocation)))
+        self._inputs = np.concatenate((self._inputs, batch_inputs))
+        self._outputs = [np.concatenate((outputs, np.asarray(new_outputs)))
+                         for outputs, new_outputs
+                         in zip(self._outputs, batch_outputs)]
+        self._stage += 1
+        self._pending_batch = None
+
+    def run(self, evaluator):
+        '''
+        Runs all stages of the campaign.
+
+        :param evaluator: evaluator of the batches
+        :type evaluator: ModelEvaluator
+
+        :Returns: estimate from all collected outputs
+        '''
+        batch = self.next_batch()
+        while batch is not None:
+            self.submit(evaluator.evaluate(batch.allocation, batch.inputs))
+            batch = self.next_batch()
+        return self.get_estimate()
+
+    def get_estimate(self):
+        '''
+        :Returns: estimate from all outputs collected so far
+        '''
+        estimator = Estimator(self._allocation, self.get_covariance())
+        return estimator.get_estimate(self._outputs)
+
+    def _get_batch_cost(self, samples_per_model):
+        return get_total_cost(samples_per_model, self._model_costs,
+                              self._algorithm_options.get("setup_costs"),
+                              self._algorithm_options.get("batch_sizes"))
+
+    def _optimize_allocation(self, covariance, remaining_cost):
+        optimizer = self._get_optimizer(covariance)
+        if isinstance(optimizer, RecursionEnumerator):
+            result = optimizer.optimize(remaining_cost)
+            self._num_optimizations += 1
+            if optimizer.best_recursion_refs is not None:
+                self._recursion_refs = optimizer.best_recursion_refs
+                self._cache_ratios(optimizer, covariance)
+            return result.allocation
+
+        if self._covariance_is_close(covariance):
+            result = optimizer.optimize_from_ratios(self._cached_ratios,
+                                                    remaining_cost)
+            if result is not None:
+                return result.allocation
+
+        result = optimizer.optimize(remaining_cost)
+        self._num_optimizations += 1
+        self._cache_ratios(optimizer, covariance)
+        return result.allocation
+
+    def _get_optimizer(self, covariance):
+        options = dict(self._algorithm_options,
+                       existing_allocation=self._allocation)
+        if self._cached_ratios is not None:
+            options["initial_guess"] = self._cached_ratios
+
+        if not issubclass(self._algorithm_class, RecursionEnumerator):
+            return self._algorithm_class(self._model_costs, covariance,
+                                         **options)
+        if self._recursion_refs is None:
+            options.pop("initial_guess", None)
+            return self._algorithm_class(self._model_costs, covariance,
+                                         **options)
+
+        enumerator = self._algorithm_class(self._model_costs, covariance,
+                                           **self._algorithm_options)
+        return enumerator.get_sub_optimizer(self._recursion_refs, **options)
+
+    def _covariance_is_close(self, covariance):
+        if self._cached_ratios is None:
+            return False
+        covariance_change = np.linalg.norm(covariance
+                                           - self._cached_covariance) \
+            / np.linalg.norm(self._cached_covariance)
+        return covariance_change < self._reoptimize_tolerance
+
+    def _cache_ratios(self, optimizer, covariance):
+        self._cached_ratios = optimizer.optimal_ratios
+        self._cached_covariance = covariance
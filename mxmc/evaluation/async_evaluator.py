@@ -0,0 +1,142 @@
+import asyncio
+
+import numpy as np
+
+from mxmc.evaluation.model_evaluator import ModelEvaluator
+
+
+class AsyncModelEvaluator(ModelEvaluator):
+    '''
+    Evaluates models exposed as async callables (e.g., clients of local
+    simulation servers) on the input samples prescribed by a sample
+    allocation, using a single event loop instead of one thread per call.
+    Every model is evaluated by its own number of concurrent workers, each
+    awaiting one batch of samples at a time in the order of decreasing batch
+    cost. Finished batches are handed to the consumer through a bounded
+    queue, so that the evaluations pause while the consumer (e.g., a
+    CampaignStore) falls behind.
+
+    :param models: async callables of all models; each is awaited with an
+        array of input samples and returns an array with an output for
+        every sample (or, if it is not batched, is awaited with a single
+        input sample and returns its output)
+    :type models: list of async callables
+    :param model_costs: cost of a single evaluation of every model, used to
+        size and order the batches (equal costs if not given)
+    :type model_costs: np.array
+    :param max_concurrency: maximum number of concurrent calls to every
+        model (a single int for all models, or one per model)
+    :type max_concurrency: int or list of ints
+    :param batch_size: maximum number of samples per batch (None to split
+        the total cost into about four batches per concurrent call)
+    :type batch_size: int
+    :param batched: whether model callables that do not declare a batch
+        capability (see Model) are called with arrays of samples
+    :type batched: Boolean
+    :param max_pending: maximum number of finished batches waiting for the
+        consumer (None for the total concurrency)
+    :type max_pending: int
+    '''
+    def __init__(self, models, model_costs=None, max_concurrency=1,
+                 batch_size=None, batched=True, max_pending=None):
+        max_concurrency = np.broadcast_to(max_concurrency,
+                                          (len(models),)).astype(int)
+        if np.any(max_concurrency < 1):
+            raise ValueError("max_concurrency must be a positive integer")
+        if max_pending is not None and max_pending < 1:
+            raise ValueError("max_pending must be a positive integer")
+        super().__init__(models, model_costs,
+                         max_workers=int(np.sum(max_concurrency)),
+                         batch_size=batch_size, batched=batched)
+        self._max_concurrency = max_concurrency
+        self._max_pending = max_pending or self._max_workers
+
+    async def evaluate_async(self, sample_allocation, all_samples,
+                             store=None):
+        '''
+        Coroutine version of evaluate (see ModelEvaluator.evaluate).
+        '''
+        results = []
+        async for result in self.iter_evaluations_async(
+                sample_allocation, all_samples, store):
+            if store is None:
+                results.append(result)
+        return self._collect_outputs(results, sample_allocation, all_samples,
+                                     store)
+
+    async def iter_evaluations_async(self, sample_allocation, all_samples,
+                                     store=None):
+        '''
+        Asynchronous generator version of evaluate that yields the results
+        of each batch as soon as it is available (and after it is written to
+        the store, if given).
+
+        :Returns: tuples of the model index, the (sorted) sample indices of
+            the batch and the outputs for those samples
+        '''
+        model_indices = self._get_pending_sample_indices(sample_allocation,
+                                                         all_samples, store)
+        async for model, indices, outputs in self._iter_batch_results_async(
+                self._get_batches(model_indices), all_samples):
+            if store is not None:
+                store.write_outputs(model, indices, outputs)
+            yield model, indices, outputs
+
+    def iter_evaluations(self, sample_allocation, all_samples, store=None):
+        '''
+        Synchronous version of iter_evaluations_async that runs the
+        evaluations in a new event loop while the results are consumed.
+        '''
+        loop = asyncio.new_event_loop()
+        results = self.iter_evaluations_async(sample_allocation, all_samples,
+                                              store)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
+
+    async def _iter_batch_results_async(self, batches, all_samples):
+        model_batches = [[] for _ in self._models]
+        for model, indices in batches:
+            model_batches[model].append(indices)
+
+        results = asyncio.Queue(self._max_pending)
+        workers = [asyncio.ensure_future(
+                       self._run_worker(model, model_batches[model],
+                                        all_samples, results))
+                   for model in range(len(self._models))
+                   for _ in range(min(self._max_concurrency[model],
+                                      len(model_batches[model])))]
+        try:
+            for _ in range(len(batches)):
+                model, indices, outputs, error = await results.get()
+                if error is not None:
+                    raise error
+                yield model, indices, outputs
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _run_worker(self, model, batches, all_samples, results):
+        while batches:
+            indices = batches.pop(0)
+            try:
+                outputs = await self._evaluate_batch_async(
+                        model, all_samples[indices])
+            except Exception as error:
+                await results.put((model, indices, None, error))
+                return
+            await results.put((model, indices, outputs, None))
+
+    async def _evaluate_batch_async(self, model_index, inputs):
+        model = self._models[model_index]
+        if self._batched[model_index]:
+            return np.asarray(await model(inputs))
+        return np.array([np.squeeze(await model(sample))
+                         for sample in inputs])
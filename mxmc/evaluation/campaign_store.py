@@ -0,0 +1,166 @@
+import os
+
+import h5py
+import numpy as np
+
+from mxmc.util.read_sample_allocation import read_sample_allocation
+
+
+class CampaignStore:
+    '''
+    HDF5 file that records the model outputs of an evaluation campaign as
+    they are computed, so that an interrupted campaign can be resumed
+    without repeating completed model evaluations. The file contains the
+    sample allocation (in the format of SampleAllocation.save, so it can be
+    read with read_sample_allocation), the input samples, a chunked output
+    dataset per model and a completion bitmap per model. Outputs are stored
+    in the order of the model's sample indices, as expected by
+    Estimator.get_estimate.
+
+    An existing file is opened to resume its campaign; otherwise a new file
+    is created, which requires the sample allocation and input samples.
+
+    :param file_path: path of the hdf5 campaign file
+    :type file_path: string
+    :param sample_allocation: allocation of the campaign; must match the
+        stored allocation when resuming
+    :type sample_allocation: SampleAllocation object
+    :param all_samples: input samples of the campaign (length of at least
+        num_total_samples of the allocation)
+    :type all_samples: np.array
+    '''
+    def __init__(self, file_path, sample_allocation=None, all_samples=None):
+        self._file_path = file_path
+        if os.path.exists(file_path):
+            self._sample_allocation = read_sample_allocation(file_path)
+            if sample_allocation is not None and not np.array_equal(
+                    sample_allocation.compressed_allocation,
+                    self._sample_allocation.compressed_allocation):
+                raise ValueError("Sample allocation does not match the "
+                                 "allocation of the campaign file")
+        else:
+            if sample_allocation is None or all_samples is None:
+                raise ValueError("A sample allocation and input samples are "
+                                 "required to create a campaign file")
+            if len(all_samples) < sample_allocation.num_total_samples:
+                raise ValueError("Too few inputs samples to allocate to "
+                                 "models!")
+            self._sample_allocation = sample_allocation
+            self._create(all_samples)
+
+        self._model_indices = [
+            np.asarray(self._sample_allocation
+                       .get_sample_indices_for_model(i), dtype=int)
+            for i in range(self._sample_allocation.num_models)]
+
+    def _create(self, all_samples):
+        self._sample_allocation.save(self._file_path)
+        with h5py.File(self._file_path, "a") as h5_file:
+            h5_file.create_dataset("Inputs/all_samples",
+                                   data=np.asarray(all_samples))
+            for model in range(self._sample_allocation.num_models):
+                num_samples = len(self._sample_allocation
+                                  .get_sample_indices_for_model(model))
+                h5_file.create_dataset(self._completed_key(model),
+                                       shape=(num_samples,), dtype=bool,
+                                       fillvalue=False)
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    @property
+    def sample_allocation(self):
+        return self._sample_allocation
+
+    @property
+    def all_samples(self):
+        with h5py.File(self._file_path, "r") as h5_file:
+            return np.array(h5_file["Inputs/all_samples"])
+
+    def get_pending_sample_indices(self, model_index):
+        '''
+        :Returns: sample indices (into all_samples) that the specified model
+            has not been evaluated at yet (np.array)
+        '''
+        return self._model_indices[model_index][
+            ~self.get_completed(model_index)]
+
+    def get_completed(self, model_index):
+        '''
+        :Returns: completion bitmap of the specified model's samples, in the
+            order of the model's sample indices (boolean np.array)
+        '''
+        with h5py.File(self._file_path, "r") as h5_file:
+            return np.array(h5_file[self._completed_key(model_index)])
+
+    def is_complete(self):
+        '''
+        :Returns: whether all models have been evaluated at all of their
+            samples
+        '''
+        return all(np.all(self.get_completed(i))
+                   for i in range(self._sample_allocation.num_models))
+
+    def write_outputs(self, model_index, sample_indices, outputs):
+        '''
+        Stores the outputs of a model at some of its samples and marks them
+        as completed. The file is flushed after every write.
+
+        :param model_index: index of the evaluated model
+        :type model_index: int
+        :param sample_indices: sample indices (into all_samples) of the
+            outputs; all must belong to the model's samples
+        :type sample_indices: np.array
+        :param outputs: model outputs at the samples
+        :type outputs: np.array
+        '''
+        sample_indices = np.asarray(sample_indices, dtype=int)
+        outputs = np.asarray(outputs, dtype=float)
+        if len(sample_indices) == 0:
+            return
+        model_indices = self._model_indices[model_index]
+        positions = np.searchsorted(model_indices, sample_indices)
+        if np.any(positions >= len(model_indices)) or \
+                np.any(model_indices[np.minimum(positions,
+                                                len(model_indices) - 1)]
+                       != sample_indices):
+            raise ValueError("Samples are not allocated to model {}"
+                             .format(model_index))
+        order = np.argsort(positions)
+        positions = positions[order]
+        outputs = outputs[order]
+
+        with h5py.File(self._file_path, "a") as h5_file:
+            key = self._outputs_key(model_index)
+            if key not in h5_file:
+                h5_file.create_dataset(
+                        key, shape=(len(model_indices),) + outputs.shape[1:],
+                        dtype=float, fillvalue=np.nan, chunks=True)
+            h5_file[key][positions] = outputs
+            h5_file[self._completed_key(model_index)][positions] = True
+            h5_file.flush()
+
+    def get_model_outputs(self):
+        '''
+        :Returns: stored outputs of every model, in the order of the model's
+            sample indices (list of np.arrays); outputs that have not been
+            computed yet are nan
+        '''
+        model_outputs = []
+        with h5py.File(self._file_path, "r") as h5_file:
+            for model, indices in enumerate(self._model_indices):
+                key = self._outputs_key(model)
+                if key in h5_file:
+                    model_outputs.append(np.array(h5_file[key]))
+                else:
+                    model_outputs.append(np.full(len(indices), np.nan))
+        return model_outputs
+
+    @staticmethod
+    def _outputs_key(model_index):
+        return "Outputs/model_{}".format(model_index)
+
+    @staticmethod
+    def _completed_key(model_index):
+        return "Completed/model_{}".format(model_index)
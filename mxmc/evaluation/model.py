@@ -0,0 +1,64 @@
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+
+
+class Model(metaclass=ABCMeta):
+    '''
+    Interface of models evaluated by the mxmc evaluators. A model declares
+    with the batched class attribute whether evaluate accepts a whole block
+    of input samples (True, default) or a single input sample (False);
+    scalar models are then called once per sample. Models are callable and
+    can be used wherever a model callable is expected.
+    '''
+    batched = True
+
+    @abstractmethod
+    def evaluate(self, inputs):
+        '''
+        :param inputs: a block of input samples (one row per sample) or, for
+            models that are not batched, a single input sample
+        :type inputs: np.array
+
+        :Returns: outputs of the samples (np.array with one entry or row per
+            sample), or the output of the single sample
+        '''
+        raise NotImplementedError
+
+    def __call__(self, inputs):
+        return self.evaluate(inputs)
+
+
+def is_batched(model, default=True):
+    '''
+    :Returns: the declared batch capability of the model, or default if the
+        model (e.g., a plain function) does not declare one
+    '''
+    return getattr(model, "batched", default)
+
+
+def evaluate_model(model, inputs, batched=None, chunk_size=None):
+    '''
+    Evaluates a model on a block of input samples, passing the block (or
+    chunks of at most chunk_size samples) to batched models and the samples
+    one at a time to scalar models.
+
+    :param model: model or model callable
+    :type model: Model or callable
+    :param inputs: input samples (one row per sample)
+    :type inputs: np.array
+    :param batched: batch capability of model callables that do not declare
+        one (None for batched)
+    :type batched: Boolean
+    :param chunk_size: maximum number of samples passed to a batched model
+        at once (None for the whole block)
+    :type chunk_size: int
+
+    :Returns: outputs of all samples (np.array)
+    '''
+    if not is_batched(model, True if batched is None else batched):
+        return np.array([np.squeeze(model(sample)) for sample in inputs])
+    if chunk_size is None or len(inputs) <= chunk_size:
+        return np.asarray(model(inputs))
+    return np.concatenate([np.asarray(model(inputs[start:start + chunk_size]))
+                           for start in range(0, len(inputs), chunk_size)])
@@ -0,0 +1,191 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+    as_completed
+
+import numpy as np
+
+from mxmc.evaluation.model import evaluate_model, is_batched
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+class ModelEvaluator:
+    '''
+    Evaluates models on the input samples prescribed by a sample allocation
+    using a pool of threads or processes. Each model is run exactly once on
+    each of its allocated samples, in batches that are scheduled largest
+    (most expensive) first so that the cheap batches fill in the gaps at the
+    end of the evaluation.
+
+    :param models: all models (see Model), or callables that are called with
+        an array of input samples and return an array with an output for
+        every sample (or, if batched is False, are called with a single
+        input sample and return its output)
+    :type models: list of Models or callables
+    :param model_costs: cost of a single evaluation of every model, used to
+        size and order the batches (equal costs if not given)
+    :type model_costs: np.array
+    :param executor: "thread" (default) or "process"; the models must be
+        picklable to be run in a process pool
+    :type executor: string
+    :param max_workers: number of workers of the pool (None for the
+        executor's default, 1 to evaluate in the calling thread)
+    :type max_workers: int
+    :param batch_size: maximum number of samples per batch (None to split
+        the total cost into about four batches per worker)
+    :type batch_size: int
+    :param batched: whether model callables that do not declare a batch
+        capability are called with arrays of samples
+    :type batched: Boolean
+    '''
+    def __init__(self, models, model_costs=None, executor="thread",
+                 max_workers=None, batch_size=None, batched=True):
+        if executor not in EXECUTORS:
+            raise ValueError("Executor {} not available; choose from {}"
+                             .format(executor, ", ".join(EXECUTORS)))
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be a positive integer")
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+        if model_costs is None:
+            model_costs = np.ones(len(models))
+        model_costs = np.asarray(model_costs, dtype=float)
+        if len(model_costs) != len(models):
+            raise ValueError("Number of models and model costs must match")
+
+        self._models = list(models)
+        self._model_costs = model_costs
+        self._executor = executor
+        self._max_workers = max_workers
+        self._batch_size = batch_size
+        self._batched = [is_batched(model, batched) for model in models]
+
+    def evaluate(self, sample_allocation, all_samples, store=None):
+        '''
+        Evaluates every model on its allocated input samples.
+
+        :param sample_allocation: allocation defining the samples of every
+            model
+        :type sample_allocation: SampleAllocation object
+        :param all_samples: array of all input samples with length of at
+            least num_total_samples of the allocation
+        :type all_samples: np.array
+        :param store: campaign store that the outputs are written to as soon
+            as they are computed; model evaluations that are already
+            completed in the store are skipped
+        :type store: CampaignStore
+
+        :Returns: outputs of every model, in the order of the model's sample
+            indices as expected by Estimator.get_estimate (list of np.arrays)
+        '''
+        results = self.iter_evaluations(sample_allocation, all_samples, store)
+        return self._collect_outputs(results, sample_allocation, all_samples,
+                                     store)
+
+    def iter_evaluations(self, sample_allocation, all_samples, store=None):
+        '''
+        Generator version of evaluate that yields the results of each batch
+        as soon as it is available (and after it is written to the store, if
+        given).
+
+        :Returns: tuples of the model index, the (sorted) sample indices of
+            the batch and the outputs for those samples
+        '''
+        model_indices = self._get_pending_sample_indices(sample_allocation,
+                                                         all_samples, store)
+        for model, indices, outputs in self._iter_batch_results(
+                self._get_batches(model_indices), all_samples):
+            if store is not None:
+                store.write_outputs(model, indices, outputs)
+            yield model, indices, outputs
+
+    def _get_pending_sample_indices(self, sample_allocation, all_samples,
+                                    store):
+        model_indices = self._get_model_sample_indices(sample_allocation,
+                                                       all_samples)
+        if store is None:
+            return model_indices
+        if not np.array_equal(store.sample_allocation.compressed_allocation,
+                              sample_allocation.compressed_allocation):
+            raise ValueError("Sample allocation does not match the "
+                             "allocation of the campaign store")
+        return [store.get_pending_sample_indices(i)
+                for i in range(len(self._models))]
+
+    def _collect_outputs(self, results, sample_allocation, all_samples,
+                         store):
+        if store is not None:
+            for _ in results:
+                pass
+            return store.get_model_outputs()
+
+        model_indices = self._get_model_sample_indices(sample_allocation,
+                                                       all_samples)
+        model_outputs = [dict() for _ in self._models]
+        for model, indices, outputs in results:
+            model_outputs[model][indices[0]] = outputs
+
+        return [self._concatenate_outputs(batches, len(indices))
+                for batches, indices in zip(model_outputs, model_indices)]
+
+    def _iter_batch_results(self, batches, all_samples):
+        if self._max_workers == 1:
+            for model, indices in batches:
+                yield model, indices, evaluate_model(
+                        self._models[model], all_samples[indices],
+                        self._batched[model])
+            return
+
+        with EXECUTORS[self._executor](self._max_workers) as executor:
+            futures = {executor.submit(evaluate_model, self._models[model],
+                                       all_samples[indices],
+                                       self._batched[model]):
+                       (model, indices) for model, indices in batches}
+            for future in as_completed(futures):
+                model, indices = futures[future]
+                yield model, indices, future.result()
+
+    def _get_model_sample_indices(self, sample_allocation, all_samples):
+        if sample_allocation.num_models != len(self._models):
+            raise ValueError("Number of models and allocation must match")
+        if len(all_samples) < sample_allocation.num_total_samples:
+            raise ValueError("Too few inputs samples to allocate to models!")
+
+        return [np.unique(np.asarray(
+                    sample_allocation.get_sample_indices_for_model(i),
+                    dtype=int))
+                for i in range(len(self._models))]
+
+    def _get_batches(self, model_indices):
+        '''
+        Splits the sample indices of every model into batches and sorts them
+        by decreasing cost.
+        '''
+        batch_cost = self._get_batch_cost(model_indices)
+        batches = []
+        for model, indices in enumerate(model_indices):
+            if len(indices) == 0:
+                continue
+            batch_size = self._batch_size
+            if batch_size is None:
+                batch_size = max(int(batch_cost // self._model_costs[model]),
+                                 1)
+            num_batches = int(np.ceil(len(indices) / batch_size))
+            batches.extend((model, batch)
+                           for batch in np.array_split(indices, num_batches))
+
+        batches.sort(key=lambda batch: -len(batch[1])
+                     * self._model_costs[batch[0]])
+        return batches
+
+    def _get_batch_cost(self, model_indices):
+        total_cost = sum(len(indices) * cost for indices, cost
+                         in zip(model_indices, self._model_costs))
+        num_workers = self._max_workers or os.cpu_count() or 1
+        return total_cost / (4 * num_workers)
+
+    @staticmethod
+    def _concatenate_outputs(batches, num_samples):
+        if num_samples == 0:
+            return np.empty(0)
+        return np.concatenate([batches[start] for start in sorted(batches)])
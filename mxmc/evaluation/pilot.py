@@ -0,0 +1,286 @@
+from collections import namedtuple
+import time
+
+import numpy as np
+from scipy import stats
+
+from mxmc.estimator import Estimator
+from mxmc.evaluation.model import evaluate_model, is_batched
+from mxmc.optimizer import Optimizer
+from mxmc.output_processor import OutputProcessor
+from mxmc.util.batch_costs import get_total_cost
+
+
+PilotProfile = namedtuple('PilotProfile',
+                          ['model_costs', 'cost_intervals', 'batch_overheads',
+                           'covariance', 'outputs'])
+
+AdaptivePilotResult = namedtuple('AdaptivePilotResult',
+                                 ['inputs', 'outputs', 'covariance',
+                                  'model_costs', 'setup_costs',
+                                  'optimization_result',
+                                  'variance_errors', 'converged',
+                                  'pilot_cost', 'pilot_time'])
+
+
+def profile_pilot_runs(models, pilot_inputs, num_warmup=1, confidence=0.95,
+                       batched=True):
+    '''
+    Evaluates all models on the pilot inputs, timing every model call, and
+    estimates the cost (wall-clock time per sample) of every model together
+    with the covariance of the model outputs.
+
+    The first num_warmup calls of every model (e.g., imports, caches or
+    just-in-time compilation) are evaluated but not timed. The remaining
+    samples are passed to batched models in blocks of varying size (1, 2,
+    4, ...), so that the time per call can be separated into a per-sample
+    cost and a batch overhead by a linear fit. Scalar models are timed per
+    sample.
+
+    :param models: all models (see Model) or model callables
+    :type models: list of Models or callables
+    :param pilot_inputs: pilot input samples (one row per sample)
+    :type pilot_inputs: np.array
+    :param num_warmup: number of untimed calls of every model (of a single
+        sample each)
+    :type num_warmup: int
+    :param confidence: confidence level of the cost intervals
+    :type confidence: float
+    :param batched: batch capability of model callables that do not declare
+        one
+    :type batched: Boolean
+
+    :Returns: A PilotProfile namedtuple with entries for model_costs
+        (estimated cost per sample of every model, np.array), cost_intervals
+        (lower and upper confidence bounds of the costs, Mx2 np.array; nan if
+        too few calls were timed), batch_overheads (estimated fixed time per
+        call of every model, which can be used as the setup_costs of the
+        Optimizer), covariance (covariance among the model
+        outputs) and outputs (pilot outputs of every model).
+    '''
+    if num_warmup < 0:
+        raise ValueError("num_warmup must be a non-negative integer")
+    if len(pilot_inputs) <= num_warmup:
+        raise ValueError("More pilot samples than warm-up calls are needed")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+
+    model_costs = np.empty(len(models))
+    cost_intervals = np.empty((len(models), 2))
+    batch_overheads = np.empty(len(models))
+    outputs = []
+    for i, model in enumerate(models):
+        model_is_batched = is_batched(model, batched)
+        model_outputs, call_times, call_sizes = _time_model_calls(
+                model, pilot_inputs, num_warmup, model_is_batched)
+        outputs.append(model_outputs)
+        model_costs[i], cost_intervals[i], batch_overheads[i] = \
+            _fit_call_times(call_times, call_sizes, confidence)
+
+    covariance = OutputProcessor.compute_covariance_matrix(outputs)
+    return PilotProfile(model_costs, cost_intervals, batch_overheads,
+                        covariance, outputs)
+
+
+def run_adaptive_pilot(models, sample_generator, algorithm, target_cost,
+                       model_costs=None, tolerance=0.1, batch_size=10,
+                       max_samples=1000, num_replicates=100, batched=True,
+                       **algorithm_options):
+    '''
+    Evaluates pilot samples in batches until the covariance among the model
+    outputs is precise enough for the sample allocation optimization.
+
+    After every batch, the sample allocation is optimized with the pilot
+    covariance and the error of the covariance is estimated from bootstrap
+    replicates of the pilot outputs (see
+    OutputProcessor.compute_bootstrap_covariances). The variance of the
+    optimized allocation is evaluated with the covariance of every replicate
+    and sampling stops when the relative standard deviation of these
+    variances is below the tolerance, or when max_samples is reached.
+
+    :param models: all models (see Model) or model callables
+    :type models: list of Models or callables
+    :param sample_generator: function returning the given number of random
+        input samples (one row per sample)
+    :type sample_generator: callable
+    :param algorithm: name of the optimization algorithm
+    :type algorithm: string
+    :param target_cost: target cost of the sample allocation
+    :type target_cost: float
+    :param model_costs: cost of all models; if None, the costs are measured
+        on the first batch (see profile_pilot_runs) and, unless setup_costs
+        are given in algorithm_options, the measured batch overheads are
+        used as setup costs
+    :type model_costs: np.array
+    :param tolerance: relative standard deviation of the allocation variance
+        at which sampling stops
+    :type tolerance: float
+    :param batch_size: number of pilot samples per batch
+    :type batch_size: int
+    :param max_samples: maximum number of pilot samples
+    :type max_samples: int
+    :param num_replicates: number of bootstrap replicates
+    :type num_replicates: int
+    :param batched: batch capability of model callables that do not declare
+        one
+    :type batched: Boolean
+    :param algorithm_options: options passed to the optimizer
+
+    :Returns: An AdaptivePilotResult namedtuple with entries for inputs
+        (all pilot inputs), outputs (pilot outputs of every model),
+        covariance (covariance among the model outputs), model_costs,
+        setup_costs (setup costs used in the optimization, or None),
+        optimization_result (OptimizationResult of the final covariance),
+        variance_errors (relative standard deviation of the allocation
+        variance after every batch, np.array), converged (whether the
+        tolerance was reached), pilot_cost (cost of the pilot samples in
+        units of the model costs, including the setup costs of every pilot
+        batch if there are setup costs) and pilot_time
+        (wall-clock time spent in model evaluations)
+    '''
+    if tolerance <= 0:
+        raise ValueError("tolerance must be positive")
+    if batch_size < 2 or max_samples < batch_size:
+        raise ValueError("batch_size must be at least 2 and at most "
+                         "max_samples")
+
+    inputs = sample_generator(batch_size)
+    if model_costs is None:
+        start_time = time.perf_counter()
+        profile = profile_pilot_runs(models, inputs, batched=batched)
+        pilot_time = time.perf_counter() - start_time
+        model_costs = profile.model_costs
+        outputs = profile.outputs
+        if algorithm_options.get("setup_costs") is None:
+            algorithm_options["setup_costs"] = profile.batch_overheads
+    else:
+        outputs, pilot_time = _evaluate_pilot_batch(models, inputs, batched)
+
+    pilot_batch_sizes = [len(inputs)]
+    variance_errors = []
+    while True:
+        covariance = OutputProcessor.compute_covariance_matrix(outputs)
+        optimizer = Optimizer(model_costs, covariance, **algorithm_options)
+        result = optimizer.optimize(algorithm, target_cost)
+        bootstrap_covariances = OutputProcessor.compute_bootstrap_covariances(
+                outputs, num_replicates)
+        variance_errors.append(_get_variance_error(result,
+                                                   bootstrap_covariances))
+
+        converged = variance_errors[-1] <= tolerance
+        num_samples = len(inputs)
+        if converged or num_samples >= max_samples:
+            break
+
+        batch_inputs = sample_generator(min(batch_size,
+                                            max_samples - num_samples))
+        batch_outputs, batch_time = _evaluate_pilot_batch(models,
+                                                          batch_inputs,
+                                                          batched)
+        inputs = np.concatenate((inputs, batch_inputs))
+        outputs = [np.concatenate(o) for o in zip(outputs, batch_outputs)]
+        pilot_time += batch_time
+        pilot_batch_sizes.append(len(batch_inputs))
+
+    setup_costs = algorithm_options.get("setup_costs")
+    samples_per_model = np.outer(pilot_batch_sizes, np.ones(len(models)))
+    pilot_cost = np.sum(get_total_cost(
+            samples_per_model, model_costs, setup_costs,
+            algorithm_options.get("batch_sizes")))
+    return AdaptivePilotResult(inputs, outputs, covariance, model_costs,
+                               setup_costs, result,
+                               np.array(variance_errors), converged,
+                               pilot_cost, pilot_time)
+
+
+def _evaluate_pilot_batch(models, inputs, batched):
+    start_time = time.perf_counter()
+    outputs = [evaluate_model(model, inputs, is_batched(model, batched))
+               for model in models]
+    return outputs, time.perf_counter() - start_time
+
+
+def _get_variance_error(optimization_result, bootstrap_covariances):
+    '''
+    Relative standard deviation of the variance of the optimized allocation
+    over the bootstrap covariances; replicates for which the estimator is
+    singular are skipped (inf if it cannot be determined)
+    '''
+    variance = np.sum(optimization_result.variance)
+    replicate_variances = np.empty(len(bootstrap_covariances))
+    for i, covariance in enumerate(bootstrap_covariances):
+        try:
+            estimator = Estimator(optimization_result.allocation, covariance)
+            replicate_variances[i] = np.sum(estimator.approximate_variance)
+        except (np.linalg.LinAlgError, ValueError):
+            replicate_variances[i] = np.nan
+
+    replicate_variances = replicate_variances[np.isfinite(replicate_variances)]
+    if not variance > 0 or len(replicate_variances) < 2:
+        return np.inf
+    return np.std(replicate_variances) / variance
+
+
+def _get_call_sizes(num_samples, batched):
+    if not batched:
+        return np.ones(num_samples, dtype=int)
+    sizes = []
+    size = 1
+    while num_samples > 0:
+        sizes.append(min(size, num_samples))
+        num_samples -= sizes[-1]
+        size = 1 if size >= 8 else 2 * size
+    return np.array(sizes)
+
+
+def _time_model_calls(model, inputs, num_warmup, batched):
+    outputs = [evaluate_model(model, inputs[i:i + 1], batched)
+               for i in range(num_warmup)]
+
+    call_sizes = _get_call_sizes(len(inputs) - num_warmup, batched)
+    call_times = np.empty(len(call_sizes))
+    start = num_warmup
+    for i, size in enumerate(call_sizes):
+        block = inputs[start:start + size]
+        start_time = time.perf_counter()
+        outputs.append(evaluate_model(model, block, batched))
+        call_times[i] = time.perf_counter() - start_time
+        start += size
+
+    return np.concatenate(outputs), call_times, call_sizes
+
+
+def _fit_call_times(call_times, call_sizes, confidence):
+    '''
+    Fits call time = overhead + cost * call size. Falls back to a fit
+    without overhead if the sizes do not vary or the fitted overhead or cost
+    is negative.
+    '''
+    num_calls = len(call_times)
+    if num_calls > 2 and len(np.unique(call_sizes)) > 1:
+        design = np.column_stack((np.ones(num_calls), call_sizes))
+        coefficients, _, _, _ = np.linalg.lstsq(design, call_times,
+                                                rcond=None)
+        overhead, cost = coefficients
+        if overhead >= 0 and cost > 0:
+            residuals = call_times - design.dot(coefficients)
+            cost_variance = np.sum(residuals ** 2) / (num_calls - 2) \
+                * np.linalg.inv(design.T.dot(design))[1, 1]
+            interval = _get_interval(cost, cost_variance, num_calls - 2,
+                                     confidence)
+            return cost, interval, overhead
+
+    cost = np.sum(call_times * call_sizes) / np.sum(call_sizes ** 2)
+    if num_calls < 2:
+        return cost, np.array([np.nan, np.nan]), 0.
+    residuals = call_times - cost * call_sizes
+    cost_variance = np.sum(residuals ** 2) / (num_calls - 1) \
+        / np.sum(call_sizes ** 2)
+    interval = _get_interval(cost, cost_variance, num_calls - 1, confidence)
+    return cost, interval, 0.
+
+
+def _get_interval(estimate, variance, degrees_of_freedom, confidence):
+    half_width = stats.t.ppf(0.5 + confidence / 2, degrees_of_freedom) \
+        * np.sqrt(variance)
+    return np.array([estimate - half_width, estimate + half_width])
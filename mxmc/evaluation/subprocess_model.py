@@ -0,0 +1,132 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mxmc.evaluation.model import Model
+
+INPUT_FILE_PLACEHOLDER = "{input_file}"
+OUTPUT_FILE_PLACEHOLDER = "{output_file}"
+
+
+class SubprocessModel(Model):
+    '''
+    Model adapter that evaluates an external executable through an
+    input-file/output-file protocol: the inputs are written to a comma
+    delimited text file, the command is run and the outputs are read from
+    the whitespace delimited text file it writes. Every run gets its own
+    temporary directory, which is the working directory of the command.
+    The adapter is a batched Model; the samples of a block are run
+    concurrently, or in a single run if per_sample is False.
+
+    :param command: the command to run (list of strings); occurrences of
+        "{input_file}" and "{output_file}" are replaced by the paths of the
+        input and output files of the run
+    :type command: list of strings
+    :param fixed_inputs: values written in front of the sample inputs on
+        every input file line (e.g., model parameters)
+    :type fixed_inputs: list of floats
+    :param per_sample: run the command once per sample (True, default), or
+        once per batch with one input line and one output line per sample
+    :type per_sample: Boolean
+    :param max_workers: maximum number of concurrent runs
+    :type max_workers: int
+    :param timeout: time limit of a single run in seconds (None for no limit)
+    :type timeout: float
+    :param retries: number of times a failed or timed out run is repeated
+    :type retries: int
+    :param work_dir: directory in which the temporary run directories are
+        created (None for the system's default)
+    :type work_dir: string
+    :param keep_files: keep the run directories after the run
+    :type keep_files: Boolean
+    '''
+    def __init__(self, command, fixed_inputs=None, per_sample=True,
+                 max_workers=None, timeout=None, retries=0, work_dir=None,
+                 keep_files=False):
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be a positive integer")
+        if retries < 0:
+            raise ValueError("retries must be a non-negative integer")
+        self._command = list(command)
+        self._fixed_inputs = np.array([] if fixed_inputs is None
+                                      else fixed_inputs, dtype=float)
+        self._per_sample = per_sample
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._timeout = timeout
+        self._retries = retries
+        self._work_dir = work_dir
+        self._keep_files = keep_files
+
+    def evaluate(self, inputs):
+        '''
+        :param inputs: input samples (one row per sample)
+        :type inputs: np.array
+
+        :Returns: outputs of all samples (np.array with one entry or row per
+            sample)
+        '''
+        inputs = np.asarray(inputs, dtype=float)
+        if inputs.ndim < 2:
+            inputs = inputs.reshape(len(inputs), -1)
+        if len(inputs) == 0:
+            return np.empty(0)
+        if not self._per_sample:
+            return self._run_with_retries(inputs)
+
+        num_workers = min(self._max_workers, len(inputs))
+        if num_workers == 1:
+            outputs = [self._run_with_retries(sample[np.newaxis])
+                       for sample in inputs]
+        else:
+            with ThreadPoolExecutor(num_workers) as executor:
+                outputs = list(executor.map(
+                        lambda sample: self._run_with_retries(
+                            sample[np.newaxis]), inputs))
+        return np.concatenate(outputs)
+
+    def _run_with_retries(self, inputs):
+        for attempt in range(self._retries + 1):
+            try:
+                return self._run(inputs)
+            except (subprocess.SubprocessError, OSError, ValueError) as error:
+                last_error = error
+        message = "Model command {} failed after {} attempt(s): {}".format(
+                self._command, self._retries + 1, last_error)
+        if getattr(last_error, "stderr", None):
+            message += "\n" + last_error.stderr.decode(errors="replace")
+        raise RuntimeError(message) from last_error
+
+    def _run(self, inputs):
+        run_dir = tempfile.mkdtemp(prefix="mxmc_run_", dir=self._work_dir)
+        input_file = os.path.join(run_dir, "inputs.txt")
+        output_file = os.path.join(run_dir, "outputs.txt")
+        try:
+            fixed_inputs = np.tile(self._fixed_inputs, (len(inputs), 1))
+            np.savetxt(input_file, np.hstack((fixed_inputs, inputs)),
+                       delimiter=",")
+            command = [arg.replace(INPUT_FILE_PLACEHOLDER, input_file)
+                       .replace(OUTPUT_FILE_PLACEHOLDER, output_file)
+                       for arg in self._command]
+            subprocess.run(command, cwd=run_dir, timeout=self._timeout,
+                           check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE)
+            return self._read_outputs(output_file, len(inputs))
+        finally:
+            if not self._keep_files:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    def _read_outputs(self, output_file, num_samples):
+        if self._per_sample:
+            outputs = np.loadtxt(output_file, ndmin=1)
+            outputs = outputs.reshape(1, -1)
+        else:
+            outputs = np.loadtxt(output_file, ndmin=2)
+            if outputs.shape[0] != num_samples:
+                outputs = outputs.reshape(num_samples, -1)
+        if outputs.shape[1] == 1:
+            outputs = outputs[:, 0]
+        return outputs
@@ -1,3 +1,5 @@
+import numpy as np
+
 from mxmc.optimizers.mfmc import MFMC
 from mxmc.optimizers.mlmc import MLMC
 
@@ -5,7 +7,14 @@ from mxmc.optimizers.approximate_control_variates.generalized_independent_sample
 from mxmc.optimizers.approximate_control_variates.generalized_multifidelity.impl_optimizers import *  # noqa: E501, F403
 from mxmc.optimizers.approximate_control_variates.generalized_recursive_difference.impl_optimizers import *  # noqa: E501, F403
 
+from mxmc.optimizers.approximate_control_variates.acv_optimizer import \
+    ACVOptimizer
+from mxmc.optimizers.approximate_control_variates.recursion_enumerator \
+    import RecursionEnumerator
 from mxmc.optimizers.model_selection import AutoModelSelection
+from mxmc.output_processor import OutputProcessor
+from mxmc.util.makespan import MakespanResult, schedule_allocation
+from mxmc.util.torch_threads import torch_num_threads
 
 ALGORITHM_MAP = {"mfmc": MFMC, "mlmc": MLMC, "acvmfu": ACVMFU,     # noqa: F405
                  "acvmf": ACVMF, "acvmfmc": ACVMFMC,               # noqa: F405
@@ -28,11 +37,27 @@ class Optimizer:
         form of an MxMxN array, where N is the number of quantities of
         interest.
     :type covariance: 2D np.array or 3D np.array
+    :param setup_costs: optional fixed cost of every batch of evaluations of
+        every model (e.g., mesh loading or license checkout; see the
+        batch_overheads of mxmc.evaluation.profile_pilot_runs). model_costs
+        are then the costs per sample, and the optimizers minimize the
+        variance under the exact cost of evaluating every model in as few
+        batches as possible.
+    :type setup_costs: list of floats
+    :param batch_sizes: optional maximum number of evaluations per batch of
+        every model (unlimited if not given)
+    :type batch_sizes: list of ints
+    :param num_threads: number of threads the ACV optimizers' torch
+        computations may use during optimization (None for torch's default)
+    :type num_threads: int
 
     '''
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, num_threads=None, **kwargs):
+        if num_threads is not None and num_threads < 1:
+            raise ValueError("num_threads must be a positive integer")
         self._args = args
         self._kwargs = kwargs
+        self._num_threads = num_threads
 
     @staticmethod
     def get_algorithm_names():
@@ -53,7 +78,8 @@ class Optimizer:
 
         return ALGORITHM_MAP[algorithm_name.lower()]
 
-    def optimize(self, algorithm, target_cost, auto_model_selection=False):
+    def optimize(self, algorithm, target_cost, auto_model_selection=False,
+                 **algorithm_options):
         '''
         Performs variance minimization optimization to determine the optimal
         sample allocation across available models within a specified target
@@ -69,6 +95,21 @@ class Optimizer:
         :param auto_model_selection: flag to use automatic model selection in
             optimization to test all subsets of models for best set.
         :type auto_model_selection: Boolean
+        :param algorithm_options: options for the optimization algorithm used
+            in this call only, overriding those given at construction. The
+            ACV algorithms accept solver ("slsqp_nelder_mead" (default),
+            "slsqp", "trust_constr" or "trust_constr_bfgs") and
+            qoi_compression (number of groups that many quantities of
+            interest are compressed into during optimization; the reported
+            variance is always exact) and precision ("double" (default),
+            "single", or "mixed": single precision optimization refined in
+            double precision) and num_pilot_samples (number of already
+            evaluated pilot samples of all models that are reused as the
+            first group of the allocation; only additional samples are
+            allocated and counted in the cost) and num_workers (number of
+            parallel workers; target_cost is then the makespan, see
+            optimize_for_makespan). The enumerating ACV
+            algorithms also accept warm_start and num_screened.
 
         :Returns: An OptimizationResult namedtuple with entries for cost,
             variance, and sample_array. cost (float) is expected cost of all
@@ -77,8 +118,205 @@ class Optimizer:
             If more than one quantity of interest is optimized, then the
             variance will be a vector containing the variance of each quantity.
         '''
-        optimizer = ALGORITHM_MAP[algorithm.lower()](*self._args,
-                                                     **self._kwargs)
+        with torch_num_threads(self._num_threads):
+            optimizer = self._get_optimizer(algorithm, auto_model_selection,
+                                            algorithm_options)
+            return optimizer.optimize(target_cost=target_cost)
+
+    def optimize_for_variance(self, algorithm, target_variance,
+                              auto_model_selection=False,
+                              **algorithm_options):
+        '''
+        Performs the dual optimization: finds the least expensive sample
+        allocation across available models whose estimator variance does not
+        exceed a specified target variance.
+
+        :param algorithm: name of method to use for optimization (e.g., "mlmc",
+            "mfmc", "acvkl").
+        :type algorithm: string
+        :param target_variance: maximum allowed estimator variance. If more
+            than one quantity of interest is optimized, the sum of the
+            variances of all quantities is compared to target_variance.
+        :type target_variance: float
+        :param auto_model_selection: flag to use automatic model selection in
+            optimization to test all subsets of models for the least
+            expensive set.
+        :type auto_model_selection: Boolean
+        :param algorithm_options: options for the optimization algorithm used
+            in this call only (see optimize).
+
+        :Returns: An OptimizationResult namedtuple (see optimize)
+        '''
+        with torch_num_threads(self._num_threads):
+            optimizer = self._get_optimizer(algorithm, auto_model_selection,
+                                            algorithm_options)
+            return optimizer.optimize_for_variance(
+                    target_variance=target_variance)
+
+    def optimize_robust(self, algorithm, target_cost,
+                        covariance_replicates=None, pilot_outputs=None,
+                        num_replicates=100, statistic="mean",
+                        auto_model_selection=False, **algorithm_options):
+        '''
+        Performs variance minimization optimization that is robust to the
+        uncertainty of an estimated covariance: the mean or a quantile of the
+        estimator variance over many covariance replicates (e.g., bootstrap
+        replicates of pilot outputs) is minimized in a single optimization
+        in which all replicates are evaluated at once. Only available for
+        the ACV algorithms; the covariance given at construction is not
+        used.
+
+        :param algorithm: name of an ACV method to use for optimization
+            (e.g., "acvmf", "acvis", "gmfmr").
+        :type algorithm: string
+        :param target_cost: total target cost constraint (see optimize)
+        :type target_cost: float
+        :param covariance_replicates: covariance replicates stacked along a
+            leading axis (RxMxM, or RxMxMxN for multiple quantities of
+            interest)
+        :type covariance_replicates: 3D np.array or 4D np.array
+        :param pilot_outputs: pilot outputs of every model to compute
+            bootstrap covariance replicates from when covariance_replicates is
+            not given (see OutputProcessor.compute_bootstrap_covariances)
+        :type pilot_outputs: list of np.array
+        :param num_replicates: number of bootstrap replicates of the pilot
+            outputs
+        :type num_replicates: int
+        :param statistic: statistic of the variance of each quantity of
+            interest over the replicates that is minimized: "mean" or a
+            quantile between 0 and 1 (e.g., 0.9)
+        :type statistic: string or float
+        :param auto_model_selection: flag to use automatic model selection
+        :type auto_model_selection: Boolean
+        :param algorithm_options: options for the optimization algorithm used
+            in this call only (see optimize).
+
+        :Returns: An OptimizationResult namedtuple (see optimize); variance is
+            the statistic of the variance over the replicates
+        '''
+        algorithm_class = self.get_algorithm(algorithm)
+        if not issubclass(algorithm_class,
+                          (ACVOptimizer, RecursionEnumerator)):
+            raise ValueError("Robust optimization is only available for the "
+                             "ACV algorithms")
+        if covariance_replicates is None:
+            if pilot_outputs is None:
+                raise ValueError("Either covariance_replicates or "
+                                 "pilot_outputs must be given")
+            covariance_replicates = \
+                OutputProcessor.compute_bootstrap_covariances(
+                        pilot_outputs, num_replicates)
+
+        covariance_replicates = np.asarray(covariance_replicates)
+        if covariance_replicates.ndim == 3:
+            covariance_replicates = covariance_replicates[..., np.newaxis]
+        if covariance_replicates.ndim != 4:
+            raise ValueError("Covariance replicates must be stacked along a "
+                             "leading replicate axis")
+        num_reps, num_models, _, num_qois = covariance_replicates.shape
+        covariance = covariance_replicates.transpose([1, 2, 0, 3]).reshape(
+                num_models, num_models, num_reps * num_qois)
+
+        kwargs = {key: value for key, value in self._kwargs.items()
+                  if key not in ("model_costs", "covariance")}
+        kwargs.update(algorithm_options, num_replicates=num_reps,
+                      replicate_statistic=statistic)
+        with torch_num_threads(self._num_threads):
+            optimizer = algorithm_class(self._get_model_costs(), covariance,
+                                        **kwargs)
+            if auto_model_selection:
+                optimizer = AutoModelSelection(optimizer)
+            return optimizer.optimize(target_cost=target_cost)
+
+    def optimize_for_makespan(self, algorithm, target_variance, num_workers,
+                              auto_model_selection=False, max_iterations=20,
+                              **algorithm_options):
+        '''
+        Finds a sample allocation whose estimator variance does not exceed a
+        target variance with a minimal makespan (wall-clock time) on a
+        number of parallel workers, paired with a schedule of all model
+        evaluations. Model evaluations are indivisible jobs, so allocations
+        with few evaluations of an expensive model can leave workers idle.
+
+        The ACV algorithm is run with num_workers, which makes the target
+        cost a makespan: the total cost is limited by num_workers times the
+        makespan, and the number of evaluations of every model by the
+        number of its evaluations that fit on the workers within the
+        makespan. The makespan is bisected between the lower bound of the
+        least expensive allocation and the makespan of its schedule. The
+        allocations are scheduled with schedule_allocation (see
+        mxmc.util.makespan), and the one with the smallest makespan is
+        returned. Setup costs (see setup_costs) are not scheduled: the
+        makespan of the schedule only covers the per-sample model costs,
+        while the cost of the result includes the setup costs.
+
+        :param algorithm: name of an ACV method to use for optimization
+        :type algorithm: string
+        :param target_variance: maximum allowed estimator variance
+        :type target_variance: float
+        :param num_workers: number of parallel workers
+        :type num_workers: int
+        :param auto_model_selection: flag to use automatic model selection
+        :type auto_model_selection: Boolean
+        :param max_iterations: maximum number of bisection steps
+        :type max_iterations: int
+        :param algorithm_options: options for the optimization algorithm used
+            in this call only (see optimize).
+
+        :Returns: A MakespanResult namedtuple with entries for cost (total
+            cost of all model evaluations), variance, allocation and
+            schedule (Schedule namedtuple with the makespan and the worker
+            and start time of every model evaluation)
+        '''
+        algorithm_class = self.get_algorithm(algorithm)
+        if not issubclass(algorithm_class,
+                          (ACVOptimizer, RecursionEnumerator)):
+            raise ValueError("Makespan optimization is only available for "
+                             "the ACV algorithms")
+        if num_workers < 1:
+            raise ValueError("num_workers must be a positive integer")
+
+        model_costs = np.asarray(self._get_model_costs(), dtype=float)
+        result = self.optimize_for_variance(algorithm, target_variance,
+                                            auto_model_selection,
+                                            **algorithm_options)
+        best_result = MakespanResult(*result, schedule_allocation(
+                result.allocation, model_costs, num_workers))
+
+        lower = max(np.sum(result.cost) / num_workers, np.max(model_costs))
+        upper = best_result.schedule.makespan
+        with torch_num_threads(self._num_threads):
+            optimizer = self._get_optimizer(
+                    algorithm, auto_model_selection,
+                    dict(algorithm_options, num_workers=num_workers))
+            for _ in range(max_iterations):
+                if upper - lower <= 1e-3 * upper:
+                    break
+                makespan = (lower + upper) / 2
+                result = optimizer.optimize(target_cost=makespan)
+                if not np.sum(result.variance) <= target_variance:
+                    lower = makespan
+                    continue
+                upper = makespan
+                schedule = schedule_allocation(result.allocation,
+                                               model_costs, num_workers)
+                if schedule.makespan < best_result.schedule.makespan:
+                    best_result = MakespanResult(*result, schedule)
+
+        return best_result
+
+    def _get_model_costs(self):
+        return self._args[0] if self._args else self._kwargs["model_costs"]
+
+    def _get_optimizer(self, algorithm, auto_model_selection,
+                       algorithm_options):
+        kwargs = dict(self._kwargs, **algorithm_options)
+        algorithm_class = self.get_algorithm(algorithm)
+        if kwargs.get("num_pilot_samples") and not issubclass(
+                algorithm_class, (ACVOptimizer, RecursionEnumerator)):
+            raise ValueError("Pilot samples can only be reused by the ACV "
+                             "algorithms")
+        optimizer = algorithm_class(*self._args, **kwargs)
         if auto_model_selection:
             optimizer = AutoModelSelection(optimizer)
-        return optimizer.optimize(target_cost=target_cost)
+        return optimizer
@@ -1,89 +1,76 @@
 from abc import abstractmethod
 
+import numpy as np
+
 
 def satisfies_constraints(x, constraints):
     for constr in constraints:
         c_val = constr["fun"](x, *constr["args"])
-        if c_val < 0:
-            print(constr["fun"])
+        if np.any(np.asarray(c_val) < 0):
             return False
     return True
 
 
 class ACVConstraints:
 
-    def _constr_n_greater_than_1(self, target_cost):
-        def n_constraint(ratios):
+    def _vectorize_constraints(self, target_cost, *constraint_rows):
+        '''
+        Combines sets of constraint rows into a single vector valued
+        constraint with an analytic jacobian. Each row k encodes the
+        constraint N * h_k - 1 >= 0 where h_k = coefs_k . [1, ratios],
+        or its absolute value for rows flagged in use_abs.
+        '''
+        coefs = np.vstack([rows[0] for rows in constraint_rows])
+        use_abs = np.concatenate([rows[1] for rows in constraint_rows])
+
+        def _row_values(ratios):
+            values = coefs[:, 0] + coefs[:, 1:].dot(ratios)
+            signs = np.where(use_abs & (values < 0), -1., 1.)
+            return values * signs, signs
+
+        def constraints_fun(ratios):
             N = self._calculate_n(ratios, target_cost)
-            return N - 1
-        return [{"type": "ineq", "fun": n_constraint, "args": tuple()}]
+            values, _ = _row_values(ratios)
+            return N * values - 1
 
-    def _constr_ratios_result_in_samples_1_greater_than_n(self, target_cost):
-        def n_ratio_constraint(ratios, ind):
-            N = self._calculate_n(ratios, target_cost)
-            return N * (ratios[ind] - 1) - 1
+        def constraints_jac(ratios):
+            N, N_grad = self._calculate_n_and_gradient(ratios, target_cost)
+            values, signs = _row_values(ratios)
+            return np.outer(values, N_grad) + N * signs[:, None] * coefs[:, 1:]
 
-        nr_constraints = []
-        for ind in range(self._num_models - 1):
-            nr_constraints.append({"type": "ineq",
-                                   "fun": n_ratio_constraint,
-                                   "args": (ind, )})
-        return nr_constraints
+        return [{"type": "ineq", "fun": constraints_fun,
+                 "jac": constraints_jac, "args": tuple()}]
 
-    def _constr_ratios_result_in_samples_greater_than_1(self, target_cost):
-        def ratio_1_constraint(ratios, ind):
-            N = self._calculate_n(ratios, target_cost)
-            return N * (ratios[ind]) - 1
-
-        r1_constraints = []
-        for ind in range(self._num_models - 1):
-            r1_constraints.append({"type": "ineq",
-                                   "fun": ratio_1_constraint,
-                                   "args": (ind, )})
-        return r1_constraints
-
-    def _constr_ratios_result_in_samples_1_greater_than_prev_ratio(
-            self, target_cost):
-        def n_ratio_constraint(ratios, ind):
-            N = self._calculate_n(ratios, target_cost)
-            return N * (ratios[ind] - 1) - 1
+    def _rows_n_greater_than_1(self):
+        coefs = np.zeros((1, self._num_models))
+        coefs[0, 0] = 1
+        return coefs, np.zeros(1, dtype=bool)
 
-        def r_ratio_constraint(ratios, ind):
-            N = self._calculate_n(ratios, target_cost)
-            return N * (ratios[ind] - ratios[ind-1]) - 1
-
-        nr_constraints = []
-        if self._num_models > 1:
-            nr_constraints.append({"type": "ineq", "fun": n_ratio_constraint,
-                                   "args": (0, )})
-        for ind in range(1, self._num_models - 1):
-            nr_constraints.append({"type": "ineq",
-                                   "fun": r_ratio_constraint,
-                                   "args": (ind, )})
-        return nr_constraints
-
-    def _constr_ratios_result_in_samples_1_different_than_ref(self,
-                                                              target_cost):
-        def n_ratio_constraint(ratios, ind):
-            N = self._calculate_n(ratios, target_cost)
-            return N * (ratios[ind] - 1) - 1
+    def _rows_ratios_result_in_samples_greater_than_1(self):
+        coefs = np.zeros((self._num_models - 1, self._num_models))
+        coefs[:, 1:] = np.eye(self._num_models - 1)
+        return coefs, np.zeros(self._num_models - 1, dtype=bool)
 
-        def ratio_ref_constraint(ratios, ind, ref):
-            N = self._calculate_n(ratios, target_cost)
-            return N * abs(ratios[ind] - ratios[ref - 1]) - 1
+    def _rows_ratios_result_in_samples_1_greater_than_prev_ratio(self):
+        coefs = np.zeros((self._num_models - 1, self._num_models))
+        for ind in range(self._num_models - 1):
+            coefs[ind, ind + 1] = 1
+            coefs[ind, ind] = -1
+        return coefs, np.zeros(self._num_models - 1, dtype=bool)
 
-        rl_constraints = []
+    def _rows_ratios_result_in_samples_1_different_than_ref(self):
+        coefs = np.zeros((self._num_models - 1, self._num_models))
         for ind, ref in enumerate(self._recursion_refs):
-            if ref == 0:
-                rl_constraints.append({"type": "ineq",
-                                       "fun": n_ratio_constraint,
-                                       "args": (ind,)})
-            else:
-                rl_constraints.append({"type": "ineq",
-                                       "fun": ratio_ref_constraint,
-                                       "args": (ind, ref)})
-        return rl_constraints
+            coefs[ind, ind + 1] = 1
+            coefs[ind, ref] = -1
+        use_abs = np.array([ref != 0 for ref in self._recursion_refs],
+                           dtype=bool)
+        return coefs, use_abs
 
     @abstractmethod
     def _calculate_n(self, ratios, target_cost):
         raise NotImplementedError
+
+    @abstractmethod
+    def _calculate_n_and_gradient(self, ratios, target_cost):
+        raise NotImplementedError
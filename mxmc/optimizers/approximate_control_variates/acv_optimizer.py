@@ -5,64 +5,341 @@ import numpy as np
 import torch
 
 from mxmc.util.generic_numerical_optimization \
-    import perform_slsqp_then_nelder_mead
+    import perform_slsqp_then_nelder_mead, \
+    perform_slsqp_with_convergence_check, perform_trust_constr
 from .acv_constraints import satisfies_constraints
+from .worker_budget import WorkerBudget
+from mxmc.optimizers.mfmc import MFMC
 from mxmc.optimizers.optimizer_base import OptimizerBase
 from mxmc.optimizers.optimizer_base import OptimizationResult
+from mxmc.optimizers.optimizer_base import COST_RTOL
+from mxmc.optimizers.optimizer_base import TargetVarianceError
 from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
 
 TORCHDTYPE = torch.double
-
-
-class ACVOptimizer(OptimizerBase):
-
-    def __init__(self, model_costs, covariance=None, recursion_refs=None):
-        super().__init__(model_costs, covariance)
-        self._covariance_tensor = self._create_covariance_tensor()
-
-        self._model_costs_tensor = torch.tensor(self._model_costs,
-                                                dtype=TORCHDTYPE)
+SOLVERS = ("slsqp_nelder_mead", "slsqp", "trust_constr",
+           "trust_constr_bfgs")
+PRECISIONS = ("double", "single", "mixed")
+
+
+class ACVOptimizer(WorkerBudget, OptimizerBase):
+
+    def __init__(self, model_costs, covariance=None, recursion_refs=None,
+                 initial_guess=None, solver="slsqp_nelder_mead",
+                 qoi_compression=None, precision="double",
+                 num_replicates=None, replicate_statistic="mean",
+                 num_pilot_samples=None, existing_allocation=None,
+                 num_workers=None, **options):
+        super().__init__(model_costs, covariance, solver=solver,
+                         qoi_compression=qoi_compression,
+                         precision=precision, num_replicates=num_replicates,
+                         replicate_statistic=replicate_statistic,
+                         num_pilot_samples=num_pilot_samples,
+                         existing_allocation=existing_allocation,
+                         num_workers=num_workers, **options)
+        if solver not in SOLVERS:
+            raise ValueError("Solver {} not available; choose from {}"
+                             .format(solver, ", ".join(SOLVERS)))
+        if qoi_compression is not None and qoi_compression < 1:
+            raise ValueError("qoi_compression must be a positive integer")
+        if precision not in PRECISIONS:
+            raise ValueError("Precision {} not available; choose from {}"
+                             .format(precision, ", ".join(PRECISIONS)))
+        self._validate_replicates(num_replicates, replicate_statistic,
+                                  qoi_compression)
+        if num_workers is not None and num_workers < 1:
+            raise ValueError("num_workers must be a positive integer")
+        self._solver = solver
+        self._qoi_compression = qoi_compression
+        self._precision = precision
+        self._num_replicates = num_replicates
+        self._replicate_statistic = replicate_statistic
+        self._fixed_allocation = self._get_fixed_allocation(
+                num_pilot_samples, existing_allocation)
+        self._num_workers = num_workers
         if recursion_refs is None:
             recursion_refs = [0] * (self._num_models - 1)
         self._recursion_refs = recursion_refs
+        self._set_dtype(TORCHDTYPE)
+        self._initial_guess = initial_guess
+        self._optimal_ratios = None
+        self._optimal_target_cost = None
 
         self._alloc_class = ACVSampleAllocation
 
-    def _create_covariance_tensor(self):
-        covariance = torch.tensor(self._covariance, dtype=TORCHDTYPE)
-        ndim = covariance.ndimension()
-        if ndim == 2:
-            return covariance.unsqueeze(0)
-        if ndim == 3:
-            return covariance.permute([2, 0, 1])
-        raise RuntimeError("Invalid Covariance matrix encountered with "
-                           "dimension =", str(ndim))
+    def _validate_replicates(self, num_replicates, replicate_statistic,
+                             qoi_compression):
+        if num_replicates is None:
+            return
+        num_qois = 1 if self._covariance.ndim == 2 \
+            else self._covariance.shape[2]
+        if num_replicates < 1 or num_qois % num_replicates != 0:
+            raise ValueError("num_replicates must be a positive divisor of "
+                             "the number of covariance matrices")
+        if replicate_statistic != "mean" \
+                and not (isinstance(replicate_statistic, float)
+                         and 0 < replicate_statistic < 1):
+            raise ValueError("replicate_statistic must be 'mean' or a "
+                             "quantile between 0 and 1")
+        if qoi_compression is not None:
+            raise ValueError("qoi_compression cannot be combined with "
+                             "covariance replicates")
 
     def optimize(self, target_cost):
-        if target_cost < np.sum(self._model_costs):
+        if target_cost < self._get_minimum_target_cost():
             return self._get_invalid_result()
         if self._num_models == 1:
             return self._get_monte_carlo_result(target_cost)
 
         ratios = self._solve_opt_problem(target_cost)
+        self._optimal_ratios = ratios
+        self._optimal_target_cost = target_cost
 
         sample_nums = self._compute_sample_nums_from_ratios(ratios,
                                                             target_cost)
         sample_nums = np.floor(sample_nums)
+        if sample_nums[0] < 1:
+            return self._get_invalid_result()
 
+        return self._get_result_from_sample_nums(sample_nums)
+
+    @property
+    def optimal_ratios(self):
+        '''
+        Sample ratios of the last optimization (None before the first one)
+        '''
+        return self._optimal_ratios
+
+    def optimize_from_ratios(self, ratios, target_cost):
+        '''
+        Computes the allocation for a target cost from given sample ratios
+        (e.g., the optimal_ratios of a previous optimization of a similar
+        problem) without solving the optimization problem.
+
+        :param ratios: sample ratios of all models except the first
+        :type ratios: np.array
+        :param target_cost: target cost of the allocation
+        :type target_cost: float
+
+        :Returns: An OptimizationResult namedtuple (see optimize), or None if
+            the ratios violate the sample number constraints at target_cost
+        '''
+        if target_cost < self._get_minimum_target_cost() \
+                or not satisfies_constraints(
+                    ratios, self._get_constraints(target_cost)):
+            return None
+        sample_nums = self._compute_sample_nums_from_ratios(ratios,
+                                                            target_cost)
+        return self._get_result_from_sample_nums(np.floor(sample_nums))
+
+    def optimize_for_variance(self, target_variance, max_iterations=10):
+        '''
+        Finds the least expensive sample allocation whose estimator variance
+        (summed over quantities of interest) does not exceed target_variance.
+
+        The optimal sample ratios do not depend on the target cost unless
+        the sample number constraints are active, so the ratios of a single
+        optimization (or of the last call to optimize) are rescaled to the
+        required cost. The optimization is only repeated at the required
+        cost if the rescaled ratios violate the constraints there. Rounding
+        the rescaled allocation to integers can make it noticeably more
+        expensive than the required cost at small budgets; cheaper
+        allocations are then searched for with optimize (see
+        _search_cost_for_variance).
+
+        With pilot samples or an existing allocation, the variance does not
+        scale with the inverse of the cost, so the ratios are not rescaled
+        (see _optimize_for_variance_with_fixed_allocation).
+
+        :param target_variance: maximum allowed estimator variance
+        :type target_variance: float
+        :param max_iterations: maximum number of optimizations performed
+            (in each phase)
+        :type max_iterations: int
+
+        :Returns: An OptimizationResult namedtuple (see optimize)
+        '''
+        self._validate_target_variance(target_variance)
+        if self._num_models == 1:
+            return super().optimize_for_variance(target_variance,
+                                                 max_iterations)
+        if self._fixed_allocation is not None:
+            return self._optimize_for_variance_with_fixed_allocation(
+                    target_variance, max_iterations)
+
+        ratios = self._optimal_ratios
+        target_cost = self._optimal_target_cost
+        if ratios is None:
+            target_cost = \
+                self._get_monte_carlo_cost_for_variance(target_variance)
+            ratios = self._solve_opt_problem(target_cost)
+
+        required_cost = target_cost
+        for _ in range(max_iterations):
+            N = self._calculate_n(ratios, target_cost)
+            variance = self._compute_continuous_variance(ratios, N)
+            required_cost = self._get_target_cost_for_budget(
+                    self._get_sampling_budget(target_cost) * variance
+                    / target_variance)
+            required_cost = max(required_cost,
+                                self._get_minimum_target_cost())
+            constraints = self._get_constraints(required_cost)
+            if satisfies_constraints(ratios, constraints):
+                break
+            target_cost = required_cost
+            ratios = self._solve_opt_problem(target_cost)
+
+        self._optimal_ratios = ratios
+        self._optimal_target_cost = required_cost
+        num_hifi_samples = np.floor(self._calculate_n(ratios, required_cost))
+        result = self._get_result_for_variance(ratios, num_hifi_samples,
+                                               target_variance,
+                                               max_iterations)
+        return self._search_cost_for_variance(target_variance, required_cost,
+                                              result, max_iterations)
+
+    def _compute_continuous_variance(self, ratios, N):
+        ratios_tensor = torch.tensor(ratios, dtype=self._dtype)
+        variance = self._compute_acv_estimator_variance(
+                self._covariance_tensor, ratios_tensor, N)
+        return self._apply_replicate_statistic(variance).sum().item()
+
+    def _get_result_for_variance(self, ratios, num_hifi_samples,
+                                 target_variance, max_iterations):
+        num_hifi_samples = max(num_hifi_samples, 1)
+        for _ in range(max_iterations):
+            sample_nums = np.ceil(num_hifi_samples
+                                  * np.array([1] + list(ratios)))
+            result = self._get_result_from_sample_nums(sample_nums)
+            variance = np.sum(result.variance)
+            if variance <= target_variance:
+                return result
+            num_hifi_samples = max(num_hifi_samples + 1,
+                                   np.ceil(num_hifi_samples * variance
+                                           / target_variance))
+
+        raise TargetVarianceError("No allocation meets the target variance "
+                                  "{} with up to {} high fidelity samples"
+                                  .format(target_variance, num_hifi_samples))
+
+    def _optimize_for_variance_with_fixed_allocation(self, target_variance,
+                                                     max_iterations):
+        '''
+        With fixed groups of P samples, the variance decreases like 1/(N + P)
+        rather than 1/N. The required cost is bracketed by the minimum
+        target cost and the first cost meeting target_variance when doubling
+        from the Monte Carlo cost, and then found with
+        _search_cost_for_variance.
+        '''
+        lower_cost = self._get_minimum_target_cost()
+        result = self.optimize(lower_cost)
+        lower_variance = np.sum(result.variance)
+        if lower_variance <= target_variance:
+            return result
+
+        upper_cost = max(lower_cost, self._get_monte_carlo_cost_for_variance(
+                target_variance))
+        for _ in range(max_iterations):
+            result = self.optimize(upper_cost)
+            variance = np.sum(result.variance)
+            if variance <= target_variance:
+                return self._search_cost_for_variance(
+                        target_variance, lower_cost, result, max_iterations,
+                        lower_variance)
+            lower_cost, lower_variance = upper_cost, variance
+            upper_cost *= 2
+
+        raise TargetVarianceError("No allocation meets the target variance "
+                                  "{} up to a target cost of {}"
+                                  .format(target_variance, lower_cost))
+
+    def _search_cost_for_variance(self, target_variance, lower_cost,
+                                  best_result, max_iterations,
+                                  lower_variance=None):
+        '''
+        Searches for a result of optimize that meets target_variance at a
+        lower cost than best_result, with target costs between lower_cost
+        (which is not expected to meet the target; its variance is
+        lower_variance if known) and the cost of best_result. The logarithm
+        of the estimator variance is close to linear in the logarithm of the
+        target cost (with a slope of -1 without fixed sample groups), so the
+        next target cost is found with the Illinois variant of regula falsi
+        on log(variance / target_variance) over the log target cost. The
+        geometric mean of the bracket is used while the variance at
+        lower_cost is unknown or infinite. The search stops when the bracket
+        is narrower than COST_RTOL relative to its upper end.
+        '''
+        log_lower_cost = np.log(lower_cost)
+        log_upper_cost = np.log(np.sum(best_result.cost))
+        lower_residual = np.inf if lower_variance is None \
+            else np.log(lower_variance / target_variance)
+        upper_residual = np.log(np.sum(best_result.variance)
+                                / target_variance)
+        last_moved = None
+        for _ in range(max_iterations):
+            if log_upper_cost - log_lower_cost <= np.log1p(COST_RTOL):
+                break
+            log_target_cost = (log_lower_cost + log_upper_cost) / 2
+            if np.isfinite(lower_residual) \
+                    and lower_residual > upper_residual:
+                log_target_cost = log_lower_cost \
+                    + (log_upper_cost - log_lower_cost) * lower_residual \
+                    / (lower_residual - upper_residual)
+
+            result = self.optimize(np.exp(log_target_cost))
+            residual = np.log(np.sum(result.variance) / target_variance)
+            moved = "upper" if residual <= 0 else "lower"
+            if moved == "upper":
+                if np.sum(result.cost) < np.sum(best_result.cost):
+                    best_result = result
+                log_upper_cost, upper_residual = log_target_cost, residual
+                if last_moved == "upper":
+                    lower_residual /= 2
+            else:
+                log_lower_cost, lower_residual = log_target_cost, residual
+                if last_moved == "lower":
+                    upper_residual /= 2
+            last_moved = moved
+
+        return best_result
+
+    def _get_result_from_sample_nums(self, sample_nums):
         variance = self._compute_variance_from_sample_nums(sample_nums)
         actual_cost = self._compute_total_cost_from_sample_nums(sample_nums)
 
         comp_allocation = self._make_allocation(sample_nums)
+        if self._fixed_allocation is not None:
+            comp_allocation = np.vstack((self._fixed_allocation,
+                                         comp_allocation))
 
         allocation = self._alloc_class(comp_allocation)
 
         return OptimizationResult(actual_cost, variance, allocation)
 
+    def _set_dtype(self, dtype):
+        self._dtype = dtype
+        self._covariance_tensor = self._context.get_covariance_tensor(dtype)
+        self._objective_covariance_tensor = \
+            self._context.get_covariance_tensor(dtype, self._qoi_compression)
+        self._model_costs_tensor = self._context.get_model_costs_tensor(dtype)
+
     def _solve_opt_problem(self, target_cost):
+        if self._precision == "double":
+            return self._solve_opt_problem_with_solver(target_cost)
+
+        self._set_dtype(torch.float32)
+        try:
+            ratios = self._solve_opt_problem_with_solver(target_cost)
+        finally:
+            self._set_dtype(TORCHDTYPE)
+
+        if self._precision == "mixed":
+            ratios = self._refine_ratios(ratios, target_cost)
+        return ratios
+
+    def _refine_ratios(self, ratios, target_cost):
         bounds = self._get_bounds()
         constraints = self._get_constraints(target_cost)
-        initial_guess = self._get_initial_guess(constraints)
 
         def obj_func(rat):
             return self._compute_objective_function(rat, target_cost,
@@ -72,86 +349,190 @@ class ACVOptimizer(OptimizerBase):
             return self._compute_objective_function(rat, target_cost,
                                                     gradient=True)
 
-        ratios = perform_slsqp_then_nelder_mead(bounds, constraints,
-                                                initial_guess, obj_func,
-                                                obj_func_and_grad)
+        refined_ratios = perform_slsqp_with_convergence_check(
+                bounds, constraints, ratios, obj_func, obj_func_and_grad)
+        if not satisfies_constraints(refined_ratios, constraints) \
+                and satisfies_constraints(ratios, constraints):
+            return ratios
+        return refined_ratios
 
-        return ratios
+    def _solve_opt_problem_with_solver(self, target_cost):
+        bounds = self._get_bounds()
+        constraints = self._get_constraints(target_cost)
 
-    def _get_initial_guess(self, constraints):
-        # balanced_costs = self._model_costs[0] / self._model_costs[1:]
-        # if satisfies_constraints(balanced_costs, constraints):
-        #     return balanced_costs
-        #
-        # all_ones = np.ones(self._num_models - 1)
-        # if satisfies_constraints(all_ones, constraints):
-        #     return all_ones
-        #
-        # all_twos = np.full(self._num_models - 1, 2)
-        # if satisfies_constraints(all_twos, constraints):
-        #     return all_twos
-
-        increasing_values = np.arange(2, self._num_models + 1)
-        if not satisfies_constraints(increasing_values, constraints):
+        def obj_func(rat):
+            return self._compute_objective_function(rat, target_cost,
+                                                    gradient=False)
+
+        def obj_func_and_grad(rat):
+            return self._compute_objective_function(rat, target_cost,
+                                                    gradient=True)
+
+        initial_guess = self._get_initial_guess(constraints, obj_func)
+
+        if self._solver == "slsqp":
+            return perform_slsqp_with_convergence_check(bounds, constraints,
+                                                        initial_guess,
+                                                        obj_func,
+                                                        obj_func_and_grad)
+
+        if self._solver == "trust_constr":
+            def obj_func_hessian(rat):
+                return self._compute_objective_hessian(rat, target_cost)
+
+            return perform_trust_constr(bounds, constraints, initial_guess,
+                                        obj_func, obj_func_and_grad,
+                                        obj_func_hessian)
+
+        if self._solver == "trust_constr_bfgs":
+            return perform_trust_constr(bounds, constraints, initial_guess,
+                                        obj_func, obj_func_and_grad)
+
+        return perform_slsqp_then_nelder_mead(bounds, constraints,
+                                              initial_guess, obj_func,
+                                              obj_func_and_grad)
+
+    def _get_initial_guess(self, constraints, obj_func=None):
+        candidates = [guess for guess in self._get_initial_guess_candidates()
+                      if np.all(np.isfinite(guess))
+                      and satisfies_constraints(guess, constraints)]
+
+        if not candidates:
+            increasing_values = np.arange(2, self._num_models + 1)
             warnings.warn("Could not identify an initial guess that satisfies"
                           " constraints")
-        return increasing_values
-
-        # full_initial_guess = np.ones(self._num_models)
-        # for _ in range(self._num_models):
-        #     full_initial_guess[1:] = \
-        #         full_initial_guess[self._recursion_refs] + 1
-        # recursion_initial_guess = full_initial_guess[1:]
-        # if satisfies_constraints(recursion_initial_guess, constraints):
-        #     return recursion_initial_guess
-        #
-        # full_initial_guess = np.ones(self._num_models)
-        # for _ in range(self._num_models):
-        #     full_initial_guess[1:] = \
-        #         full_initial_guess[self._recursion_refs] + 1
-        #     full_initial_guess[1:] = \
-        #         full_initial_guess[self._recursion_refs] - 1
-        # full_initial_guess[1:] = \
-        #     full_initial_guess[self._recursion_refs] + 1
-        # recursion_initial_guess = full_initial_guess[1:]
-        # if satisfies_constraints(recursion_initial_guess, constraints):
-        #     return recursion_initial_guess
-
-        # raise RuntimeError("Could not identify an initial guess that
-        # satisfies constraints")
+            return increasing_values
+
+        if obj_func is None or len(candidates) == 1:
+            return candidates[0]
+
+        objectives = np.array([obj_func(guess) for guess in candidates],
+                              dtype=float)
+        objectives[~np.isfinite(objectives)] = np.inf
+        return candidates[int(np.argmin(objectives))]
+
+    def _get_initial_guess_candidates(self):
+        candidates = []
+        if self._initial_guess is not None:
+            candidates.append(np.array(self._initial_guess, dtype=float))
+        candidates.append(self._get_mfmc_initial_guess())
+        candidates.append(self._model_costs[0] / self._model_costs[1:])
+        candidates.append(self._get_recursion_initial_guess())
+        candidates.append(np.arange(2, self._num_models + 1, dtype=float))
+        return candidates
+
+    def _get_mfmc_initial_guess(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mfmc = MFMC(self._model_costs, self._covariance,
+                        context=self._context)
+            ordered_ratios = mfmc._calculate_sample_ratios()
+            ratios = np.empty(self._num_models)
+            ratios[mfmc._model_order_map] = ordered_ratios
+            ratios = ratios / ratios[0]
+        return ratios[1:]
+
+    def _get_recursion_initial_guess(self):
+        full_initial_guess = np.ones(self._num_models)
+        for _ in range(self._num_models):
+            full_initial_guess[1:] = \
+                full_initial_guess[self._recursion_refs] + 1
+        return full_initial_guess[1:]
 
     def _compute_objective_function(self, ratios, target_cost, gradient):
         ratios_tensor = torch.tensor(ratios, requires_grad=gradient,
-                                     dtype=TORCHDTYPE)
+                                     dtype=self._dtype)
         N = self._calculate_n_autodiff(ratios_tensor, target_cost)
 
         try:
-            variance = \
-                self._compute_acv_estimator_variance(self._covariance_tensor,
-                                                     ratios_tensor, N)
-            variance = variance.sum()
+            variance = self._compute_acv_estimator_variance(
+                    self._objective_covariance_tensor, ratios_tensor, N)
+            variance = self._apply_replicate_statistic(variance).sum()
         except RuntimeError:
-            variance = 9e99 * torch.dot(ratios_tensor, ratios_tensor)
+            ratios_double = ratios_tensor.type(torch.double)
+            variance = 9e99 * torch.dot(ratios_double, ratios_double)
 
         if not gradient:
-            return variance.detach().numpy()
+            return variance.detach().numpy().astype(float)
 
         variance.backward()
-        result = (variance.detach().numpy(),
-                  ratios_tensor.grad.detach().numpy())
+        result = (variance.detach().numpy().astype(float),
+                  ratios_tensor.grad.detach().numpy().astype(float))
         return result
 
+    def _compute_objective_hessian(self, ratios, target_cost):
+        def objective(ratios_tensor):
+            N = self._calculate_n_autodiff(ratios_tensor, target_cost)
+            variance = self._compute_acv_estimator_variance(
+                    self._objective_covariance_tensor, ratios_tensor, N)
+            return self._apply_replicate_statistic(variance).sum()
+
+        ratios_tensor = torch.tensor(ratios, dtype=self._dtype)
+        hessian = torch.autograd.functional.hessian(objective, ratios_tensor)
+        return hessian.detach().numpy().astype(float)
+
+    def _get_recursion_structure_tensors(self):
+        '''
+        Ratio independent tensors describing the recursion structure: the
+        reference model indices, masks of shared models between the two
+        sample sets (a: reference, b: own) of every pair of models, and a
+        mask of the models referencing the high fidelity model.
+        '''
+        refs = torch.tensor(self._recursion_refs, dtype=torch.long)
+        models = torch.arange(1, self._num_models, dtype=torch.long)
+        ref_masks = {
+            "ia_ja": refs.unsqueeze(1) == refs.unsqueeze(0),
+            "ia_jb": refs.unsqueeze(1) == models.unsqueeze(0),
+            "ib_ja": models.unsqueeze(1) == refs.unsqueeze(0),
+            "ib_jb": models.unsqueeze(1) == models.unsqueeze(0)}
+        ref_masks = {key: mask.type(self._dtype)
+                     for key, mask in ref_masks.items()}
+        refs_0 = (refs == 0).type(self._dtype)
+        return refs, ref_masks, refs_0
+
     def _calculate_n(self, ratios, target_cost):
         eval_ratios = self._get_model_eval_ratios(ratios)
-        N = target_cost / (np.dot(self._model_costs, eval_ratios))
+        N = self._get_sampling_budget(target_cost) \
+            / np.dot(self._model_costs, eval_ratios)
+        if self._num_workers is not None:
+            with np.errstate(divide="ignore"):
+                max_n = self._get_max_model_evals(target_cost) / eval_ratios
+            N = min(N, np.min(max_n))
         return N
 
+    def _calculate_n_and_gradient(self, ratios, target_cost):
+        eval_ratios = self._get_model_eval_ratios(ratios)
+        total_cost_per_n = np.dot(self._model_costs, eval_ratios)
+        N = self._get_sampling_budget(target_cost) / total_cost_per_n
+        eval_ratios_jacobian = self._get_model_eval_ratios_jacobian(ratios)
+        N_grad = -N / total_cost_per_n \
+            * self._model_costs.dot(eval_ratios_jacobian)
+        if self._num_workers is None:
+            return N, N_grad
+
+        with np.errstate(divide="ignore"):
+            max_n = self._get_max_model_evals(target_cost) / eval_ratios
+        limiting_model = np.argmin(max_n)
+        if max_n[limiting_model] < N:
+            N = max_n[limiting_model]
+            N_grad = -N / eval_ratios[limiting_model] \
+                * eval_ratios_jacobian[limiting_model]
+        return N, N_grad
+
     def _calculate_n_autodiff(self, ratios_tensor, target_cost):
         eval_ratios = self._get_model_eval_ratios_autodiff(ratios_tensor)
-        N = target_cost / (torch.dot(self._model_costs_tensor, eval_ratios))
+        N = self._get_sampling_budget(target_cost) \
+            / torch.dot(self._model_costs_tensor, eval_ratios)
+        if self._num_workers is not None:
+            max_evals = torch.as_tensor(
+                    self._get_max_model_evals(target_cost), dtype=self._dtype)
+            N = torch.min(torch.cat((N.reshape(1), max_evals / eval_ratios)))
         return N
 
     def _compute_acv_estimator_variance(self, covariance, ratios, N):
+        if self._fixed_allocation is not None:
+            return self._compute_shared_sample_acv_estimator_variance(
+                    covariance, ratios, N)
+
         big_C = covariance[:, 1:, 1:]
         c_bar = covariance[:, 0, 1:] \
             / torch.sqrt(covariance[:, 0, 0]).unsqueeze(1)
@@ -165,6 +546,107 @@ class ACVOptimizer(OptimizerBase):
 
         return variance
 
+    def _compute_shared_sample_acv_estimator_variance(self, covariance,
+                                                      ratios, N):
+        '''
+        ACV estimator variance computed from the numbers of samples shared by
+        the sample sets of all models (the columns of the allocation),
+        including the samples of the fixed groups (pilot samples or an
+        existing allocation) that precede the optimized groups.
+        '''
+        membership, group_sizes = self._get_sample_groups(ratios)
+        group_sizes = group_sizes * N
+        fixed_membership = torch.as_tensor(self._fixed_allocation[:, 1:],
+                                           dtype=self._dtype)
+        fixed_group_sizes = torch.as_tensor(self._fixed_allocation[:, 0],
+                                            dtype=self._dtype)
+        set_sizes = membership.T.mv(group_sizes) \
+            + fixed_membership.T.mv(fixed_group_sizes)
+        shared = (membership.T * group_sizes).mm(membership) \
+            + (fixed_membership.T * fixed_group_sizes).mm(fixed_membership)
+        shared = shared / torch.ger(set_sizes, set_sizes)
+
+        cols_a = torch.arange(1, 2 * self._num_models - 1, 2)
+        cols_b = cols_a + 1
+        k = shared[cols_a][:, cols_a] - shared[cols_a][:, cols_b] \
+            - shared[cols_b][:, cols_a] + shared[cols_b][:, cols_b]
+        k_0 = shared[0, cols_a] - shared[0, cols_b]
+
+        cov_q_delta = k_0.unsqueeze(0) * covariance[:, 0, 1:]
+        alpha = torch.linalg.solve(covariance[:, 1:, 1:] * k,
+                                   cov_q_delta.unsqueeze(2))
+        variance = covariance[:, 0, 0] / set_sizes[0] \
+            - (cov_q_delta.unsqueeze(2) * alpha).sum(1).sum(1)
+
+        return variance
+
+    def _get_fixed_allocation(self, num_pilot_samples, existing_allocation):
+        '''
+        :Returns: compressed allocation of the groups that precede the
+            optimized groups (a single group of pilot samples used by all
+            models, or the groups of an existing allocation), or None
+        '''
+        if num_pilot_samples is not None and existing_allocation is not None:
+            raise ValueError("num_pilot_samples and existing_allocation "
+                             "cannot be combined")
+        if num_pilot_samples is not None:
+            if num_pilot_samples < 0:
+                raise ValueError("num_pilot_samples must be a non-negative "
+                                 "integer")
+            if num_pilot_samples == 0:
+                return None
+            pilot_group = np.ones((1, 2 * self._num_models), dtype=int)
+            pilot_group[0, 0] = num_pilot_samples
+            return pilot_group
+        if existing_allocation is None:
+            return None
+
+        existing_allocation = np.array(
+                getattr(existing_allocation, "compressed_allocation",
+                        existing_allocation), dtype=int)
+        if existing_allocation.ndim != 2 \
+                or existing_allocation.shape[1] != 2 * self._num_models:
+            raise ValueError("Existing allocation and model cost dims must "
+                             "match")
+        return existing_allocation
+
+    def _apply_replicate_statistic(self, variance):
+        '''
+        Reduces the estimator variances of all covariance replicates (tensor
+        of length R*N, ordered by replicate) to the replicate statistic
+        (mean or quantile) of every quantity of interest (length N).
+        '''
+        if self._num_replicates is None:
+            return variance
+        variance = variance.reshape(self._num_replicates, -1)
+        if self._replicate_statistic == "mean":
+            return variance.mean(0)
+        return torch.quantile(variance, self._replicate_statistic, dim=0)
+
+    def _get_num_monte_carlo_samples(self, target_cost):
+        num_samples = super()._get_num_monte_carlo_samples(target_cost)
+        if self._num_workers is None:
+            return num_samples
+        return min(num_samples, self._get_max_model_evals(target_cost)[0])
+
+    def _get_monte_carlo_result(self, target_cost):
+        result = super()._get_monte_carlo_result(target_cost)
+        if self._fixed_allocation is not None:
+            allocation = np.vstack((self._fixed_allocation,
+                                    result.allocation.compressed_allocation))
+            allocation = self._alloc_class(allocation)
+            num_samples = allocation.get_number_of_samples_per_model()[0]
+            result = result._replace(
+                    variance=self._covariance[0, 0] / num_samples,
+                    allocation=allocation)
+        if self._num_replicates is None:
+            return result
+        variance = self._apply_replicate_statistic(
+                torch.as_tensor(np.atleast_1d(result.variance))).numpy()
+        if len(variance) == 1:
+            variance = variance[0]
+        return result._replace(variance=variance)
+
     def _compute_sample_nums_from_ratios(self, ratios, target_cost):
         N = self._calculate_n(ratios, target_cost)
         sample_nums = N * np.array([1] + list(ratios))
@@ -173,9 +655,10 @@ class ACVOptimizer(OptimizerBase):
     def _compute_variance_from_sample_nums(self, sample_nums):
         N = sample_nums[0]
         ratios = sample_nums[1:] / N
-        ratios_tensor = torch.tensor(ratios, dtype=TORCHDTYPE)
+        ratios_tensor = torch.tensor(ratios, dtype=self._dtype)
         variance = self._compute_acv_estimator_variance(
                 self._covariance_tensor, ratios_tensor, N)
+        variance = self._apply_replicate_statistic(variance)
         variance = variance.detach().numpy()
         if len(variance) == 1:
             return variance[0]
@@ -185,8 +668,7 @@ class ACVOptimizer(OptimizerBase):
         N = sample_nums[0]
         ratios = sample_nums[1:] / N
         eval_samples_nums = N * self._get_model_eval_ratios(ratios)
-        cost = np.dot(eval_samples_nums, self._model_costs)
-        return cost
+        return self._get_total_cost(eval_samples_nums)
 
     @abstractmethod
     def _get_bounds(self):
@@ -204,6 +686,16 @@ class ACVOptimizer(OptimizerBase):
     def _make_allocation(self, sample_nums):
         raise NotImplementedError
 
+    @abstractmethod
+    def _get_sample_groups(self, ratios):
+        '''
+        :Returns: membership of the groups of the allocation in the sample
+            sets (columns) of all models (GxC tensor of ones and zeros) and
+            the group sizes relative to the number of high fidelity samples
+            (tensor of length G, differentiable with respect to ratios)
+        '''
+        raise NotImplementedError
+
     @abstractmethod
     def _get_model_eval_ratios(self, ratios):
         raise NotImplementedError
@@ -211,3 +703,7 @@ class ACVOptimizer(OptimizerBase):
     @abstractmethod
     def _get_model_eval_ratios_autodiff(self, ratios_tensor):
         raise NotImplementedError
+
+    @abstractmethod
+    def _get_model_eval_ratios_jacobian(self, ratios):
+        raise NotImplementedError
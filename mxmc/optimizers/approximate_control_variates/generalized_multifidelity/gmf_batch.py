@@ -0,0 +1,207 @@
+import numpy as np
+import torch
+
+from ..acv_optimizer import TORCHDTYPE
+
+
+class GMFBatchEvaluator:
+    '''
+    Evaluates the GMF estimator variance and constraints of many recursion
+    structures at once by stacking them along a leading batch dimension.
+    Used to screen a whole family of recursion structures with a single
+    vectorized local optimization instead of one optimization per structure.
+
+    :param context: shared model costs and covariance
+    :type context: OptimizerContext
+    :param recursion_refs_list: recursion references of every structure
+    :type recursion_refs_list: list of lists of ints
+    :param ordered: whether the structures use the ordered (sample ratios
+        increasing with model index) or unordered GMF constraints
+    :type ordered: Boolean
+    :param qoi_compression: number of groups the quantities of interest are
+        compressed into for the variance evaluations (None for no
+        compression)
+    :type qoi_compression: int
+    :param precision: precision policy of the optimizers ("double",
+        "single" or "mixed"); screening is done in single precision unless
+        the policy is "double"
+    :type precision: string
+    '''
+    def __init__(self, context, recursion_refs_list, ordered=False,
+                 qoi_compression=None, precision="double"):
+        self._dtype = TORCHDTYPE if precision == "double" else torch.float32
+        self._model_costs = context.get_model_costs_tensor(self._dtype)
+        covariance = context.get_covariance_tensor(self._dtype,
+                                                   qoi_compression)
+        self._big_C = covariance[:, 1:, 1:]
+        self._c_bar = covariance[:, 0, 1:] \
+            / torch.sqrt(covariance[:, 0, 0]).unsqueeze(1)
+        self._var_0 = covariance[:, 0, 0]
+
+        self._refs = torch.tensor(recursion_refs_list, dtype=torch.long)
+        num_structures = self._refs.shape[0]
+        self._full_refs = torch.cat(
+                (torch.zeros((num_structures, 1), dtype=torch.long),
+                 self._refs), dim=1)
+        self._ordered = ordered
+
+    def compute_variances(self, ratios, target_cost, max_model_evals=None):
+        '''
+        :param ratios: sample ratios of every structure (KxM-1)
+        :type ratios: torch.Tensor
+        :param target_cost: sampling budget of every structure
+        :type target_cost: float
+        :param max_model_evals: maximum number of evaluations of every model
+            (e.g., on parallel workers; unlimited if None)
+        :type max_model_evals: np.array
+
+        :Returns: estimator variance of every structure, summed over
+            quantities of interest (torch.Tensor of length K); structures
+            with singular systems are given infinite variance
+        '''
+        full_ratios = self._get_full_ratios(ratios)
+        ref_ratios = torch.gather(full_ratios, 1, self._refs)
+
+        ria = ref_ratios.unsqueeze(2)
+        rib = ratios.unsqueeze(2)
+        rja = ref_ratios.unsqueeze(1)
+        rjb = ratios.unsqueeze(1)
+        F = torch.min(ria, rja) / (ria * rja) \
+            - torch.min(ria, rjb) / (ria * rjb) \
+            - torch.min(rib, rja) / (rib * rja) \
+            + torch.min(rib, rjb) / (rib * rjb)
+        F0 = torch.clamp(ref_ratios, max=1) / ref_ratios \
+            - torch.clamp(ratios, max=1) / ratios
+
+        N = self._calculate_n(full_ratios, target_cost, max_model_evals)
+
+        a = F0.unsqueeze(1) * self._c_bar.unsqueeze(0)
+        alpha, info = torch.linalg.solve_ex(
+                self._big_C.unsqueeze(0) * F.unsqueeze(1), a.unsqueeze(3))
+        R_squared = (a.unsqueeze(3) * alpha).sum(3).sum(2)
+        variance = self._var_0.unsqueeze(0) / N.unsqueeze(1) \
+            * (1 - R_squared)
+        variance = variance.sum(1)
+
+        singular = (info != 0).any(1)
+        return torch.where(singular,
+                           torch.full_like(variance, np.inf), variance)
+
+    def compute_constraints(self, ratios, target_cost, max_model_evals=None):
+        '''
+        :Returns: constraint values of every structure (KxC) that must be
+            non-negative for a feasible sample allocation
+        '''
+        full_ratios = self._get_full_ratios(ratios)
+        N = self._calculate_n(full_ratios, target_cost,
+                              max_model_evals).unsqueeze(1)
+
+        if self._ordered:
+            differences = full_ratios[:, 1:] - full_ratios[:, :-1]
+            rows = [differences]
+        else:
+            ref_ratios = torch.gather(full_ratios, 1, self._refs)
+            differences = ratios - ref_ratios
+            differences = torch.where(self._refs == 0, differences,
+                                      torch.abs(differences))
+            rows = [differences, ratios]
+
+        return torch.cat([N - 1] + [N * row - 1 for row in rows], dim=1)
+
+    def select_initial_ratios(self, candidate_ratios, target_cost,
+                              max_model_evals=None):
+        '''
+        Picks, for every structure, the candidate ratios with the lowest
+        variance among the feasible candidates, or the least constraint
+        violation when no candidate is feasible.
+
+        :param candidate_ratios: candidate ratios for every structure
+            (CxKxM-1)
+        :type candidate_ratios: np.array
+
+        :Returns: selected ratios for every structure (KxM-1 np.array)
+        '''
+        candidate_ratios = torch.tensor(candidate_ratios, dtype=self._dtype)
+        variances = []
+        violations = []
+        with torch.no_grad():
+            for ratios in candidate_ratios:
+                variances.append(self.compute_variances(
+                        ratios, target_cost, max_model_evals))
+                violations.append(torch.clamp(
+                        -self.compute_constraints(ratios, target_cost,
+                                                  max_model_evals),
+                        min=0).sum(1))
+        variances = torch.stack(variances)
+        violations = torch.stack(violations)
+
+        feasible = violations == 0
+        best_feasible = torch.argmin(
+                torch.where(feasible, variances,
+                            torch.full_like(variances, np.inf)), dim=0)
+        least_violation = torch.argmin(violations, dim=0)
+        best = torch.where(feasible.any(0), best_feasible, least_violation)
+        selected = candidate_ratios[best, torch.arange(len(best))]
+        return selected.numpy().astype(float)
+
+    def screen(self, target_cost, initial_ratios, num_steps=200,
+               learning_rate=0.05, max_model_evals=None):
+        '''
+        Jointly minimizes the variance of every structure with a few steps of
+        Adam on the log of the sample ratios and a quadratic constraint
+        penalty.
+
+        :param initial_ratios: starting ratios for every structure (KxM-1)
+        :type initial_ratios: np.array
+
+        :Returns: tuple of the screened ratios (KxM-1 np.array) and their
+            variances (np.array of length K, infinite when the screened
+            ratios are infeasible)
+        '''
+        log_ratios = torch.tensor(np.log(initial_ratios), dtype=self._dtype,
+                                  requires_grad=True)
+        with torch.no_grad():
+            scale = self.compute_variances(torch.exp(log_ratios),
+                                           target_cost, max_model_evals)
+            scale = torch.where(torch.isfinite(scale) & (scale > 0), scale,
+                                torch.ones_like(scale))
+
+        optimizer = torch.optim.Adam([log_ratios], lr=learning_rate)
+        for _ in range(num_steps):
+            optimizer.zero_grad()
+            ratios = torch.exp(log_ratios)
+            variance = self.compute_variances(ratios, target_cost,
+                                              max_model_evals) / scale
+            variance = torch.where(torch.isfinite(variance), variance,
+                                   torch.zeros_like(variance))
+            violation = torch.clamp(
+                    -self.compute_constraints(ratios, target_cost,
+                                              max_model_evals), min=0)
+            loss = (variance + 1e3 * (violation ** 2).sum(1)).sum()
+            loss.backward()
+            optimizer.step()
+
+        with torch.no_grad():
+            ratios = torch.exp(log_ratios)
+            variance = self.compute_variances(ratios, target_cost,
+                                              max_model_evals)
+            feasible = (self.compute_constraints(ratios, target_cost,
+                                                 max_model_evals)
+                        >= 0).all(1)
+            variance = torch.where(feasible, variance,
+                                   torch.full_like(variance, np.inf))
+
+        return ratios.numpy().astype(float), variance.numpy().astype(float)
+
+    def _get_full_ratios(self, ratios):
+        ones = torch.ones((ratios.shape[0], 1), dtype=self._dtype)
+        return torch.cat((ones, ratios), dim=1)
+
+    def _calculate_n(self, full_ratios, target_cost, max_model_evals=None):
+        ref_ratios = torch.gather(full_ratios, 1, self._full_refs)
+        eval_ratios = torch.max(full_ratios, ref_ratios)
+        N = target_cost / torch.mv(eval_ratios, self._model_costs)
+        if max_model_evals is None:
+            return N
+        max_model_evals = torch.as_tensor(max_model_evals, dtype=self._dtype)
+        return torch.min(N, (max_model_evals / eval_ratios).min(1).values)
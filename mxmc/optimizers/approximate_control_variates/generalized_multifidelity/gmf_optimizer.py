@@ -1,7 +1,7 @@
 import numpy as np
 import torch
 
-from ..acv_optimizer import ACVOptimizer, TORCHDTYPE
+from ..acv_optimizer import ACVOptimizer
 
 
 class GMFOptimizer(ACVOptimizer):
@@ -10,8 +10,8 @@ class GMFOptimizer(ACVOptimizer):
         return [(0, np.inf)] * (self._num_models - 1)
 
     def _compute_acv_F_and_F0(self, ratios):
-        ones = torch.ones(len(ratios), dtype=TORCHDTYPE)
-        full_ratios = torch.ones(len(ratios) + 1, dtype=TORCHDTYPE)
+        ones = torch.ones(len(ratios), dtype=self._dtype)
+        full_ratios = torch.ones(len(ratios) + 1, dtype=self._dtype)
         full_ratios[1:] = ratios
         ref_ratios = full_ratios[self._recursion_refs]
 
@@ -46,6 +46,19 @@ class GMFOptimizer(ACVOptimizer):
 
         return allocation
 
+    def _get_sample_groups(self, ratios):
+        full_ratios = torch.cat((torch.ones(1, dtype=self._dtype), ratios))
+        full_ratios_np = full_ratios.detach().numpy()
+        membership = self._make_allocation(full_ratios_np)[:, 1:]
+
+        ordered_ratios = np.unique(full_ratios_np)
+        group_ends = full_ratios[[int(np.argmax(full_ratios_np == ratio))
+                                  for ratio in ordered_ratios]]
+        group_sizes = torch.cat((group_ends[:1],
+                                 group_ends[1:] - group_ends[:-1]))
+
+        return torch.tensor(membership, dtype=self._dtype), group_sizes
+
     def _get_model_eval_ratios(self, ratios):
         full_ratios = np.ones(len(ratios) + 1)
         full_ratios[1:] = ratios
@@ -53,8 +66,20 @@ class GMFOptimizer(ACVOptimizer):
         eval_ratios = np.maximum(full_ratios, ref_ratios)
         return eval_ratios
 
+    def _get_model_eval_ratios_jacobian(self, ratios):
+        full_ratios = np.ones(len(ratios) + 1)
+        full_ratios[1:] = ratios
+        full_refs = [0] + self._recursion_refs
+        jacobian = np.zeros((self._num_models, self._num_models))
+        for i, ref in enumerate(full_refs):
+            if full_ratios[i] >= full_ratios[ref]:
+                jacobian[i, i] = 1
+            else:
+                jacobian[i, ref] = 1
+        return jacobian[:, 1:]
+
     def _get_model_eval_ratios_autodiff(self, ratios_tensor):
-        full_ratios = torch.ones(len(ratios_tensor) + 1, dtype=TORCHDTYPE)
+        full_ratios = torch.ones(len(ratios_tensor) + 1, dtype=self._dtype)
         full_ratios[1:] = ratios_tensor
         ref_ratios = full_ratios[[0] + self._recursion_refs]
         eval_ratios = torch.max(full_ratios, ref_ratios)
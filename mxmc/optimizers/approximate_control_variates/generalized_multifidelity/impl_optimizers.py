@@ -1,5 +1,6 @@
 from .gmf_ordered import GMFOrdered
 from .gmf_unordered import GMFUnordered
+from .gmf_batch import GMFBatchEvaluator
 from ..recursion_enumerator import KLEnumerator
 from ..recursion_enumerator import SREnumerator
 from ..recursion_enumerator import MREnumerator
@@ -12,6 +13,12 @@ class ACVKL(KLEnumerator):
     def _get_sub_optimizer(self, *args, **kwargs):
         return GMFOrdered(*args, **kwargs)
 
+    def _get_batch_evaluator(self, recursion_refs_list):
+        return GMFBatchEvaluator(
+                self._context, recursion_refs_list, ordered=True,
+                qoi_compression=self._options.get("qoi_compression"),
+                precision=self._options.get("precision", "double"))
+
 
 class ACVMFMC(GMFOrdered):
 
@@ -41,7 +48,19 @@ class GMFSR(SREnumerator):
     def _get_sub_optimizer(self, *args, **kwargs):
         return GMFUnordered(*args, **kwargs)
 
+    def _get_batch_evaluator(self, recursion_refs_list):
+        return GMFBatchEvaluator(
+                self._context, recursion_refs_list, ordered=False,
+                qoi_compression=self._options.get("qoi_compression"),
+                precision=self._options.get("precision", "double"))
+
 
 class GMFMR(MREnumerator):
     def _get_sub_optimizer(self, *args, **kwargs):
         return GMFUnordered(*args, **kwargs)
+
+    def _get_batch_evaluator(self, recursion_refs_list):
+        return GMFBatchEvaluator(
+                self._context, recursion_refs_list, ordered=False,
+                qoi_compression=self._options.get("qoi_compression"),
+                precision=self._options.get("precision", "double"))
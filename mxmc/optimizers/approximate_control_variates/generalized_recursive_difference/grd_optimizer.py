@@ -1,48 +1,37 @@
 import numpy as np
 import torch
 
-from ..acv_optimizer import ACVOptimizer, TORCHDTYPE
+from ..acv_optimizer import ACVOptimizer
 from ..acv_constraints import ACVConstraints
 
 
 class GRDOptimizer(ACVOptimizer, ACVConstraints):
 
+    def _set_dtype(self, dtype):
+        super()._set_dtype(dtype)
+        self._ref_indices, self._ref_masks, self._refs_0 = \
+            self._get_recursion_structure_tensors()
+
     def _get_bounds(self):
         return [(0, np.inf)] * (self._num_models - 1)
 
     def _get_constraints(self, target_cost):
-        constraints = self._constr_n_greater_than_1(target_cost)
-        ref_constraints = self._constr_ratios_result_in_samples_greater_than_1(
-                target_cost)
-        constraints.extend(ref_constraints)
-        return constraints
+        return self._vectorize_constraints(
+                target_cost, self._rows_n_greater_than_1(),
+                self._rows_ratios_result_in_samples_greater_than_1())
 
     def _compute_acv_F_and_F0(self, ratios):
-        ones = torch.ones(len(ratios), dtype=TORCHDTYPE)
-        full_ratios = torch.ones(len(ratios) + 1, dtype=TORCHDTYPE)
-        full_ratios[1:] = ratios
-        ref_ratios = full_ratios[self._recursion_refs]
-        ref_tensor = torch.tensor(self._recursion_refs, dtype=TORCHDTYPE)
-
-        modelia = torch.ger(ref_tensor, ones)
-        modelib = torch.ger(torch.arange(1, self._num_models,
-                                         dtype=TORCHDTYPE), ones)
-        modelja = torch.transpose(modelia, 0, 1)
-        modeljb = torch.transpose(modelib, 0, 1)
+        full_ratios = torch.cat((torch.ones(1, dtype=self._dtype), ratios))
+        ref_ratios = full_ratios[self._ref_indices]
+        masks = self._ref_masks
 
-        ria = torch.ger(ref_ratios, ones)
-        rib = torch.ger(ratios, ones)
-        rja = torch.transpose(ria, 0, 1)
-        rjb = torch.transpose(rib, 0, 1)
+        rja = ref_ratios.unsqueeze(0)
+        rjb = ratios.unsqueeze(0)
 
-        F = ria * (modelia == modelja).type(TORCHDTYPE) / (ria * rja) \
-            - ria * (modelia == modeljb).type(TORCHDTYPE) / (ria * rjb) \
-            - rib * (modelib == modelja).type(TORCHDTYPE) / (rib * rja) \
-            + rib * (modelib == modeljb).type(TORCHDTYPE) / (rib * rjb)
+        F = masks["ia_ja"] / rja - masks["ia_jb"] / rjb \
+            - masks["ib_ja"] / rja + masks["ib_jb"] / rjb
 
-        F0 = torch.zeros(len(ratios), dtype=TORCHDTYPE)
-        filter = [i == 0 for i in self._recursion_refs]
-        F0[filter] = 1
+        F0 = self._refs_0
 
         return F, F0
 
@@ -59,6 +48,11 @@ class GRDOptimizer(ACVOptimizer, ACVConstraints):
 
         return allocation
 
+    def _get_sample_groups(self, ratios):
+        full_ratios = torch.cat((torch.ones(1, dtype=self._dtype), ratios))
+        membership = self._make_allocation(np.ones(self._num_models))[:, 1:]
+        return torch.tensor(membership, dtype=self._dtype), full_ratios
+
     def _get_model_eval_ratios(self, ratios):
         full_ratios = np.ones(len(ratios) + 1)
         full_ratios[1:] = ratios
@@ -67,10 +61,18 @@ class GRDOptimizer(ACVOptimizer, ACVConstraints):
         eval_ratios = full_ratios + ref_ratios
         return eval_ratios
 
+    def _get_model_eval_ratios_jacobian(self, ratios):
+        jacobian = np.zeros((self._num_models, len(ratios)))
+        jacobian[1:] = np.eye(len(ratios))
+        for i, ref in enumerate(self._recursion_refs):
+            if ref > 0:
+                jacobian[i + 1, ref - 1] += 1
+        return jacobian
+
     def _get_model_eval_ratios_autodiff(self, ratios_tensor):
-        full_ratios = torch.ones(len(ratios_tensor) + 1, dtype=TORCHDTYPE)
+        full_ratios = torch.ones(len(ratios_tensor) + 1, dtype=self._dtype)
         full_ratios[1:] = ratios_tensor
-        ref_ratios = torch.zeros(len(ratios_tensor) + 1, dtype=TORCHDTYPE)
+        ref_ratios = torch.zeros(len(ratios_tensor) + 1, dtype=self._dtype)
         ref_ratios[1:] = full_ratios[self._recursion_refs]
         eval_ratios = full_ratios + ref_ratios
         return eval_ratios
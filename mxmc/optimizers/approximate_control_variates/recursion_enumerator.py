@@ -4,35 +4,117 @@ from abc import abstractmethod
 
 from mxmc.optimizers.optimizer_base import OptimizerBase
 from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+from .worker_budget import WorkerBudget
 
 
 class NoMatchingCombosError(RuntimeError):
     pass
 
 
-class RecursionEnumerator(OptimizerBase):
+class RecursionEnumerator(WorkerBudget, OptimizerBase):
+    '''
+    Optimizes every recursion structure produced by the enumerator and keeps
+    the one with the lowest variance.
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    :param warm_start: when True, recursion structures are visited so that
+        neighbouring structures (differing in as few reference models as
+        possible) are optimized consecutively and each sub-optimization is
+        seeded with the ratios of the best already solved neighbour.
+    :type warm_start: Boolean
+    :param num_screened: when given, all recursion structures are first
+        screened together with a vectorized local optimization and only the
+        num_screened most promising ones are fully optimized, seeded with
+        their screened ratios. Only enumerators providing a batch evaluator
+        (the GMF family) support screening; others optimize every structure.
+    :type num_screened: int
+    '''
+
+    def __init__(self, model_costs, covariance=None, *args, warm_start=False,
+                 num_screened=None, num_workers=None, **kwargs):
+        super().__init__(model_costs, covariance, *args,
+                         warm_start=warm_start, num_screened=num_screened,
+                         num_workers=num_workers, **kwargs)
+        if num_screened is not None and num_screened < 1:
+            raise ValueError("num_screened must be a positive integer")
+        if num_workers is not None and num_workers < 1:
+            raise ValueError("num_workers must be a positive integer")
+        self._warm_start = warm_start
+        self._num_screened = num_screened
+        self._num_workers = num_workers
+        self._best_sub_optimizer = None
         self._alloc_class = ACVSampleAllocation
 
+    @property
+    def best_recursion_refs(self):
+        '''
+        Recursion references of the best structure of the last optimization
+        (None before the first one)
+        '''
+        if self._best_sub_optimizer is None:
+            return None
+        return self._best_sub_optimizer._recursion_refs
+
+    @property
+    def optimal_ratios(self):
+        '''
+        Sample ratios of the best structure of the last optimization (None
+        before the first one)
+        '''
+        if self._best_sub_optimizer is None:
+            return None
+        return self._best_sub_optimizer.optimal_ratios
+
+    def get_sub_optimizer(self, recursion_refs, **options):
+        '''
+        :param recursion_refs: recursion references of a single structure
+        :type recursion_refs: list of ints
+        :param options: options overriding those of the enumerator
+
+        :Returns: ACV optimizer of the structure, sharing the model costs and
+            covariance of the enumerator
+        '''
+        options = dict(self._options, **options)
+        options["recursion_refs"] = list(recursion_refs)
+        return self._get_sub_optimizer(self._model_costs, self._covariance,
+                                       context=self._context, **options)
+
     def optimize(self, target_cost):
-        if target_cost < np.sum(self._model_costs):
+        if target_cost < self._get_minimum_target_cost():
             return self._get_invalid_result()
         if self._num_models == 1:
             return self._get_monte_carlo_result(target_cost)
 
+        all_refs = [list(refs) for refs in self._recursion_iterator()]
+        initial_guesses = [None] * len(all_refs)
+        if self._num_screened is not None:
+            all_refs, initial_guesses = \
+                self._screen_recursions(all_refs, target_cost)
+        if self._warm_start:
+            order = self._get_neighbour_order(all_refs)
+            all_refs = [all_refs[i] for i in order]
+            initial_guesses = [initial_guesses[i] for i in order]
+
         best_result = None
-        for recursion_refs in self._recursion_iterator():
-            sub_opt = self._get_sub_optimizer(self._model_costs,
-                                              self._covariance,
-                                              recursion_refs=recursion_refs)
+        solved_structures = []
+        for recursion_refs, initial_guess in zip(all_refs, initial_guesses):
+            if self._warm_start and initial_guess is None:
+                initial_guess = self._get_warm_start_guess(recursion_refs,
+                                                           solved_structures)
+            if initial_guess is None:
+                initial_guess = self._options.get("initial_guess")
+            sub_opt = self.get_sub_optimizer(recursion_refs,
+                                             initial_guess=initial_guess)
 
             sub_opt_result = sub_opt.optimize(target_cost)
+            if self._warm_start:
+                self._record_solved_structure(recursion_refs, sub_opt,
+                                              sub_opt_result,
+                                              solved_structures)
             if best_result is None \
                     or (np.array(sub_opt_result.variance).sum()
                         < np.array(best_result.variance).sum()):
                 best_result = sub_opt_result
+                self._best_sub_optimizer = sub_opt
 
         if best_result is None:
             error_msg = "No potential recursion enumerations"
@@ -40,6 +122,104 @@ class RecursionEnumerator(OptimizerBase):
 
         return best_result
 
+    def optimize_for_variance(self, target_variance, max_iterations=10):
+        '''
+        Finds the least expensive sample allocation whose estimator variance
+        (summed over quantities of interest) does not exceed target_variance.
+        The recursion structures are compared with a single enumeration and
+        the best one is rescaled to the target variance.
+        '''
+        self._validate_target_variance(target_variance)
+        if self._num_models == 1:
+            return super().optimize_for_variance(target_variance,
+                                                 max_iterations)
+
+        self.optimize(self._get_monte_carlo_cost_for_variance(target_variance))
+        return self._best_sub_optimizer.optimize_for_variance(target_variance,
+                                                              max_iterations)
+
+    def _screen_recursions(self, all_refs, target_cost):
+        evaluator = self._get_batch_evaluator(all_refs)
+        if evaluator is None or len(all_refs) <= self._num_screened:
+            return all_refs, [None] * len(all_refs)
+
+        candidates = self._get_screening_candidates(all_refs)
+        sampling_budget = self._get_sampling_budget(target_cost)
+        max_model_evals = None
+        if self._num_workers is not None:
+            max_model_evals = self._get_max_model_evals(target_cost)
+        initial_ratios = evaluator.select_initial_ratios(
+                candidates, sampling_budget, max_model_evals)
+        ratios, variances = evaluator.screen(sampling_budget, initial_ratios,
+                                             max_model_evals=max_model_evals)
+
+        kept = np.argsort(variances, kind="stable")[:self._num_screened]
+        screened_guesses = [ratios[i] if np.isfinite(variances[i]) else None
+                            for i in kept]
+        return [all_refs[i] for i in kept], screened_guesses
+
+    def _get_screening_candidates(self, all_refs):
+        num_structures = len(all_refs)
+        balanced_costs = self._model_costs[0] / self._model_costs[1:]
+        increasing_values = np.arange(2, self._num_models + 1, dtype=float)
+
+        full_depth_guess = np.ones((num_structures, self._num_models))
+        refs_array = np.array(all_refs)
+        for _ in range(self._num_models):
+            full_depth_guess[:, 1:] = \
+                np.take_along_axis(full_depth_guess, refs_array, axis=1) + 1
+
+        return np.array([np.tile(balanced_costs, (num_structures, 1)),
+                         np.tile(increasing_values, (num_structures, 1)),
+                         full_depth_guess[:, 1:]])
+
+    def _get_batch_evaluator(self, recursion_refs_list):
+        return None
+
+    @staticmethod
+    def _get_neighbour_order(all_refs):
+        if len(all_refs) <= 2:
+            return list(range(len(all_refs)))
+
+        refs_array = np.array(all_refs)
+        distances = np.sum(refs_array[:, None, :] != refs_array[None, :, :],
+                           axis=2)
+        unvisited = np.ones(len(all_refs), dtype=bool)
+        order = [0]
+        unvisited[0] = False
+        for _ in range(len(all_refs) - 1):
+            candidate_distances = np.where(unvisited, distances[order[-1]],
+                                           np.iinfo(distances.dtype).max)
+            next_index = int(np.argmin(candidate_distances))
+            order.append(next_index)
+            unvisited[next_index] = False
+
+        return order
+
+    @staticmethod
+    def _get_warm_start_guess(recursion_refs, solved_structures):
+        if not solved_structures:
+            return None
+
+        solved_refs, solved_variances, solved_ratios = \
+            zip(*solved_structures)
+        distances = np.sum(np.array(solved_refs) != np.array(recursion_refs),
+                           axis=1)
+        neighbours = np.flatnonzero(distances == np.min(distances))
+        best_neighbour = neighbours[np.argmin(
+                np.array(solved_variances)[neighbours])]
+        return solved_ratios[best_neighbour]
+
+    @staticmethod
+    def _record_solved_structure(recursion_refs, sub_opt, sub_opt_result,
+                                 solved_structures):
+        variance = np.array(sub_opt_result.variance).sum()
+        ratios = sub_opt.optimal_ratios
+        if ratios is None or not np.isfinite(variance):
+            return
+        solved_structures.append((list(recursion_refs), variance,
+                                  np.array(ratios, dtype=float)))
+
     @abstractmethod
     def _get_sub_optimizer(self, *args, **kwargs):
         raise NotImplementedError
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class WorkerBudget:
+    '''
+    Sampling budget of optimizers that accept num_workers: with workers,
+    the target cost is a makespan, the total cost is limited by num_workers
+    times the makespan and the number of evaluations of every model by the
+    number of its (indivisible) evaluations that fit on the workers.
+    Requires self._num_workers to be set.
+    '''
+
+    def _get_minimum_target_cost(self):
+        minimum_cost = self._get_target_cost_for_budget(
+                np.sum(self._model_costs))
+        if self._num_workers is None:
+            return minimum_cost
+        return max(np.max(self._model_costs), minimum_cost)
+
+    def _get_sampling_budget(self, target_cost):
+        if self._num_workers is not None:
+            target_cost = self._num_workers * target_cost
+        return super()._get_sampling_budget(target_cost)
+
+    def _get_target_cost_for_budget(self, budget):
+        '''
+        Inverse of _get_sampling_budget
+        '''
+        target_cost = budget + np.sum(self._context.setup_costs)
+        if self._num_workers is not None:
+            target_cost = target_cost / self._num_workers
+        return target_cost
+
+    def _get_max_model_evals(self, target_cost):
+        '''
+        Maximum number of evaluations of every model that fit into a
+        makespan of target_cost on the workers (evaluations are indivisible)
+        '''
+        return self._num_workers * np.floor(target_cost / self._model_costs)
@@ -1,134 +1,246 @@
+from collections import namedtuple
+
 import numpy as np
 
 from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
 from .optimizer_base import OptimizerBase, InconsistentModelError,\
-                            OptimizationResult
+                            OptimizationResult, get_invalid_allocation
+
+
+MFMCParameters = namedtuple("MFMCParameters",
+                            ["model_order", "costs", "agg_corr", "corr",
+                             "stdev"])
 
 
 class MFMC(OptimizerBase):
 
-    def __init__(self, model_costs, covariance):
+    def __init__(self, model_costs, covariance, **options):
 
-        super().__init__(model_costs, covariance)
+        super().__init__(model_costs, covariance, **options)
         self._update_covariance_dimension()
-        stdev = self._calculate_stdevs()
-        correlations = (covariance[0] / stdev[0]).reshape(stdev.shape) / stdev
-        aggregate_correlations = \
-            self._calc_aggregate_correlations(correlations, stdev)
-
-        self._model_order_map = list(range(self._num_models))
-        self._model_order_map.sort(
-                key=lambda x: abs(aggregate_correlations[x]), reverse=True)
-
-        self._ordered_agg_corr = \
-            aggregate_correlations[self._model_order_map]
-        self._ordered_agg_corr = np.append(self._ordered_agg_corr, 0.)
-        self._ordered_cost = self._model_costs[self._model_order_map]
-        self._ordered_corr = correlations[self._model_order_map]
-        self._ordered_corr = np.vstack((self._ordered_corr,
-                                        np.zeros(self._ordered_corr.shape[1])))
-        self._ordered_stdev = stdev[self._model_order_map]
+        self._parameters = get_mfmc_parameters(
+                self._model_costs[np.newaxis],
+                self._covariance[np.newaxis])
+        self._model_order_map = self._parameters.model_order[0]
 
+        self._models_are_consistent = None
         self._alloc_class = ACVSampleAllocation
 
     def _update_covariance_dimension(self):
         if self._covariance.ndim == 2:
             self._covariance = self._covariance[:, :, None]
 
-    def _calculate_stdevs(self):
-        stdev = []
-        for i in range(self._covariance.shape[2]):
-            stdev.append(np.sqrt(np.diag(self._covariance[:, :, i])))
-        return np.array(stdev).T
-
-    @staticmethod
-    def _calc_aggregate_correlations(correlations, stdev):
-        aggregate_correlations = np.sqrt(
-                np.sum(correlations ** 2 * stdev ** 2, axis=1)
-                / np.sum(stdev ** 2, axis=1))
-        return aggregate_correlations
-
     def optimize(self, target_cost):
-        if target_cost < self._model_costs[0]:
-            return self._get_invalid_result()
-
-        if not self._model_indices_are_consistent():
+        '''
+        :param target_cost: target cost, or an array of target costs to
+            compute the allocations of all of them at once
+        :type target_cost: float or np.array
+
+        :Returns: An OptimizationResult, or a list of OptimizationResults
+            (one per target cost) if an array of target costs is given
+        '''
+        target_costs = np.atleast_1d(target_cost).astype(float)
+        valid = self._get_sampling_budget(target_costs) \
+            >= self._model_costs[0]
+
+        if np.any(valid) and not self._get_models_are_consistent():
             raise InconsistentModelError("Inconsistent Models")
 
-        sample_group_sizes = self._calculate_sample_group_sizes(target_cost)
-        estimator_variance = \
-            self._calculate_estimator_variance(sample_group_sizes)
-        actual_cost = np.dot(self._ordered_cost, sample_group_sizes)
-        comp_allocation = self._make_allocation(sample_group_sizes)
-
-        allocation = self._alloc_class(comp_allocation)
-
-        return OptimizationResult(actual_cost, estimator_variance, allocation)
-
-    def _model_indices_are_consistent(self):
-        for j in range(1, self._num_models):
-            cost_ratio = self._ordered_cost[j - 1] / self._ordered_cost[j]
-            denominator = self._ordered_agg_corr[j] ** 2 \
-                - self._ordered_agg_corr[j + 1] ** 2
-            if np.isclose(denominator, 0, atol=1e-16):
-                return False
-            numerator = self._ordered_agg_corr[j - 1] ** 2 \
-                - self._ordered_agg_corr[j] ** 2
-            req_cost_ratio = numerator / denominator
-            if cost_ratio <= req_cost_ratio:
-                return False
-        return True
-
-    def _calculate_sample_group_sizes(self, target_cost):
-        sample_ratios = self._calculate_sample_ratios()
-        num_hifi_samples = target_cost / np.dot(self._ordered_cost,
-                                                sample_ratios)
-        sample_group_sizes = num_hifi_samples * sample_ratios
-        sample_group_sizes = np.floor(sample_group_sizes)
-        return sample_group_sizes
+        valid_results = iter(self._optimize_valid(target_costs[valid]))
+        results = [next(valid_results) if is_valid
+                   else self._get_invalid_result() for is_valid in valid]
+
+        if np.ndim(target_cost) == 0:
+            return results[0]
+        return results
+
+    def _optimize_valid(self, target_costs):
+        sample_group_sizes = get_mfmc_sample_group_sizes(
+                self._parameters, self._get_sampling_budget(target_costs))
+        estimator_variances = get_mfmc_estimator_variances(
+                self._parameters, sample_group_sizes)
+        actual_costs = self._get_total_cost(get_mfmc_samples_per_model(
+                self._parameters, sample_group_sizes))
+        allocations = get_mfmc_allocations(self._parameters,
+                                           sample_group_sizes)
+
+        return [OptimizationResult(cost, variance, self._alloc_class(alloc))
+                for cost, variance, alloc
+                in zip(actual_costs, estimator_variances, allocations)]
+
+    def _get_models_are_consistent(self):
+        if self._models_are_consistent is None:
+            self._models_are_consistent = \
+                bool(mfmc_models_are_consistent(self._parameters)[0])
+        return self._models_are_consistent
 
     def _calculate_sample_ratios(self):
-        if self._num_models == 1:
-            return np.array([1])
-        sample_ratios = np.sqrt(self._ordered_cost[0]
-                                * (self._ordered_agg_corr[1:-1] ** 2 -
-                                   self._ordered_agg_corr[2:] ** 2)
-                                / (self._ordered_cost[1:]
-                                   * (1 - self._ordered_agg_corr[1] ** 2)))
-        sample_ratios = np.insert(sample_ratios, 0, 1)
-        return sample_ratios
-
-    def _calculate_estimator_variance(self, sample_grp_sizes):
-        alphas = self._calculate_optimal_alphas()
-        estimator_variance = self._ordered_stdev[0] ** 2 \
-            / sample_grp_sizes[0]
-        if self._num_models > 1:
-            estimator_variance += np.sum((1 / sample_grp_sizes[:-1][:, None]
-                                          - 1 / sample_grp_sizes[1:][:, None])
-                                         * (alphas[1:] ** 2
-                                            * self._ordered_stdev[1:] ** 2
-                                            + 2 * alphas[1:]
-                                            * self._ordered_corr[1:-1]
-                                            * self._ordered_stdev[0]
-                                            * self._ordered_stdev[1:]), axis=0)
-
-        return estimator_variance
-
-    def _calculate_optimal_alphas(self):
-        alpha_star = - self._ordered_corr[:-1] * self._ordered_stdev[0] / \
-                     self._ordered_stdev
-        return alpha_star
-
-    def _make_allocation(self, sample_nums):
-        allocation = np.zeros((self._num_models, 2 * self._num_models),
-                              dtype=int)
-        allocation[0, 0] = sample_nums[0]
-        allocation[1:, 0] = [sample_nums[i] - sample_nums[i - 1]
-                             for i in range(1, len(sample_nums))]
-
-        for i in range(len(sample_nums)):
-            for k, j in enumerate(self._model_order_map[i:]):
-                allocation[i, 1 + 2 * j] = 1
-                if k > 0:
-                    allocation[i, 2 * j] = 1
-        return allocation
+        return get_mfmc_sample_ratios(self._parameters)[0]
+
+
+def optimize_mfmc_scenarios(model_costs, covariances, target_costs):
+    '''
+    MFMC allocations of a batch of scenarios computed at once. The model
+    costs and covariances must already be validated (see
+    mxmc.optimizers.optimizer_context.OptimizerContext) and the scenarios
+    must not have setup costs.
+
+    :param model_costs: model costs of every scenario (SxM)
+    :type model_costs: np.array
+    :param covariances: covariance of every scenario (SxMxMxN)
+    :type covariances: np.array
+    :param target_costs: target cost of every scenario (S)
+    :type target_costs: np.array
+
+    :Returns: cost (S), estimator variance (SxN) and compressed allocation
+        (list of S np.arrays) of every scenario, with the invalid result of
+        MFMC.optimize for scenarios whose target cost is too small, and
+        whether the models of every scenario are consistent with MFMC (S);
+        the results of inconsistent scenarios are meaningless
+    '''
+    parameters = get_mfmc_parameters(model_costs, covariances)
+    consistent = mfmc_models_are_consistent(parameters)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sample_group_sizes = get_mfmc_sample_group_sizes(parameters,
+                                                         target_costs)
+        sample_group_sizes[~consistent] = 0
+        variances = get_mfmc_estimator_variances(parameters,
+                                                 sample_group_sizes)
+    allocations = get_mfmc_allocations(parameters, sample_group_sizes)
+    costs = np.sum(get_mfmc_samples_per_model(parameters, sample_group_sizes)
+                   * model_costs, axis=1)
+
+    valid = target_costs >= model_costs[:, 0]
+    costs = np.where(valid, costs, 0.)
+    variances[~valid] = np.inf
+    allocations = [allocation if is_valid
+                   else get_invalid_allocation(allocation.shape[0])
+                   for allocation, is_valid in zip(allocations, valid)]
+    return costs, variances, allocations, consistent
+
+
+def get_mfmc_parameters(model_costs, covariances):
+    '''
+    Orders the models of a batch of scenarios by their aggregate correlation
+    with the high fidelity model.
+
+    :param model_costs: model costs of every scenario (SxM)
+    :type model_costs: np.array
+    :param covariances: covariance of every scenario (SxMxMxN)
+    :type covariances: np.array
+
+    :Returns: MFMCParameters with the model order (SxM) and the ordered
+        costs (SxM), aggregate correlations (SxM+1, with a trailing zero),
+        correlations with the high fidelity model (SxMxN) and standard
+        deviations (SxMxN) of every scenario
+    '''
+    scenarios = np.arange(len(model_costs))[:, np.newaxis]
+    stdev = np.sqrt(np.diagonal(covariances, axis1=1, axis2=2)) \
+        .transpose([0, 2, 1])
+    correlations = covariances[:, 0] / stdev[:, :1] / stdev
+    aggregate_correlations = np.sqrt(
+            np.sum(correlations ** 2 * stdev ** 2, axis=2)
+            / np.sum(stdev ** 2, axis=2))
+
+    model_order = np.argsort(-np.abs(aggregate_correlations), axis=1,
+                             kind="stable")
+    ordered_agg_corr = np.hstack((aggregate_correlations[scenarios,
+                                                         model_order],
+                                  np.zeros((len(model_costs), 1))))
+    return MFMCParameters(model_order, model_costs[scenarios, model_order],
+                          ordered_agg_corr,
+                          correlations[scenarios, model_order],
+                          stdev[scenarios, model_order])
+
+
+def mfmc_models_are_consistent(parameters):
+    '''
+    :Returns: whether the models of every scenario satisfy the ordering
+        conditions of MFMC (boolean np.array of length S)
+    '''
+    agg_corr_squared = parameters.agg_corr ** 2
+    cost_ratios = parameters.costs[:, :-1] / parameters.costs[:, 1:]
+    denominators = agg_corr_squared[:, 1:-1] - agg_corr_squared[:, 2:]
+    numerators = agg_corr_squared[:, :-2] - agg_corr_squared[:, 1:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        req_cost_ratios = numerators / denominators
+    return np.all(np.abs(denominators) > 1e-16, axis=1) \
+        & np.all(cost_ratios > req_cost_ratios, axis=1)
+
+
+def get_mfmc_sample_ratios(parameters):
+    '''
+    :Returns: ratios of the sample group sizes to the number of high
+        fidelity samples, in model order (SxM)
+    '''
+    costs = parameters.costs
+    agg_corr = parameters.agg_corr
+    sample_ratios = np.sqrt(costs[:, :1]
+                            * (agg_corr[:, 1:-1] ** 2 - agg_corr[:, 2:] ** 2)
+                            / (costs[:, 1:] * (1 - agg_corr[:, 1:2] ** 2)))
+    return np.hstack((np.ones((len(costs), 1)), sample_ratios))
+
+
+def get_mfmc_sample_group_sizes(parameters, sampling_budgets):
+    '''
+    :param sampling_budgets: budget of every scenario (S), or any number of
+        budgets if the parameters are those of a single scenario
+    :type sampling_budgets: np.array
+
+    :Returns: number of evaluations of every model, in model order, for
+        every budget
+    '''
+    sample_ratios = get_mfmc_sample_ratios(parameters)
+    num_hifi_samples = sampling_budgets \
+        / np.sum(parameters.costs * sample_ratios, axis=1)
+    return np.floor(num_hifi_samples[:, np.newaxis] * sample_ratios)
+
+
+def get_mfmc_estimator_variances(parameters, sample_group_sizes):
+    '''
+    :Returns: MFMC estimator variance of every quantity of interest for
+        every row of sample_group_sizes (see get_mfmc_sample_group_sizes)
+    '''
+    stdev = parameters.stdev
+    corr = parameters.corr
+    alphas = -corr * stdev[:, :1] / stdev
+    control_terms = alphas[:, 1:] ** 2 * stdev[:, 1:] ** 2 \
+        + 2 * alphas[:, 1:] * corr[:, 1:] * stdev[:, :1] * stdev[:, 1:]
+    inverse_size_diffs = 1 / sample_group_sizes[:, :-1] \
+        - 1 / sample_group_sizes[:, 1:]
+    return stdev[:, 0] ** 2 / sample_group_sizes[:, :1] \
+        + np.sum(inverse_size_diffs[:, :, np.newaxis] * control_terms, axis=1)
+
+
+def get_mfmc_samples_per_model(parameters, sample_group_sizes):
+    '''
+    :Returns: sample_group_sizes rearranged from model order to the order of
+        the model costs
+    '''
+    samples_per_model = np.empty_like(sample_group_sizes)
+    model_order = np.broadcast_to(parameters.model_order,
+                                  sample_group_sizes.shape)
+    np.put_along_axis(samples_per_model, model_order, sample_group_sizes,
+                      axis=1)
+    return samples_per_model
+
+
+def get_mfmc_allocations(parameters, sample_group_sizes):
+    '''
+    :Returns: compressed allocation arrays for every row of
+        sample_group_sizes (see get_mfmc_sample_group_sizes)
+    '''
+    num_models = sample_group_sizes.shape[1]
+    model_positions = np.argsort(parameters.model_order, axis=1)
+    levels = np.arange(num_models)[:, np.newaxis]
+
+    structure = np.zeros((len(model_positions), num_models, 2 * num_models),
+                         dtype=int)
+    structure[:, :, 1::2] = model_positions[:, np.newaxis] >= levels
+    structure[:, :, 0::2] = model_positions[:, np.newaxis] > levels
+
+    allocations = np.array(np.broadcast_to(
+            structure, (len(sample_group_sizes),) + structure.shape[1:]))
+    group_sizes = np.diff(sample_group_sizes, axis=1, prepend=0)
+    allocations[:, :, 0] = np.where(structure[:, :, 0] == 1, 1, group_sizes)
+    return allocations
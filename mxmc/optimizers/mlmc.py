@@ -3,12 +3,20 @@ Implementation of an optimizer using the Multi-Level Monte Carlo (MLMC) method
 to find the sample allocation that yields the smallest variance for a target
 cost.
 """
-import numpy as np
+from collections import namedtuple
 import warnings
 
-from .optimizer_base import OptimizerBase
+import numpy as np
+
+from .optimizer_base import OptimizerBase, get_invalid_allocation
 from mxmc.optimizers.optimizer_base import OptimizationResult
 from mxmc.sample_allocations.mlmc_sample_allocation import MLMCSampleAllocation
+from mxmc.util.batch_costs import get_samples_per_model
+
+
+MLMCParameters = namedtuple("MLMCParameters",
+                            ["cost_sort_indices", "level_costs",
+                             "mlmc_variances"])
 
 
 class MLMC(OptimizerBase):
@@ -30,132 +38,208 @@ class MLMC(OptimizerBase):
     model_costs array.
     """
 
-    def __init__(self, model_costs, covariance=None):
-        super().__init__(model_costs, covariance)
+    def __init__(self, model_costs, covariance=None, **options):
+        super().__init__(model_costs, covariance, **options)
         self._update_covariance_dimension()
-        self._validate_inputs(model_costs)
-        self._level_costs = self._get_level_costs(self._model_costs)
-        sorted_cov = self._sort_covariance_by_cost(self._covariance)
-        self._mlmc_variances = self._get_variances_from_covariance(sorted_cov)
-        self._max_mlmc_variances = np.max(self._mlmc_variances, axis=1)
+        validate_mlmc_model_costs(model_costs)
+        self._parameters = get_mlmc_parameters(
+                self._model_costs[np.newaxis], self._covariance[np.newaxis])
         self._alloc_class = MLMCSampleAllocation
 
-    @staticmethod
-    def _validate_inputs(model_costs):
-        if model_costs[0] != np.max(model_costs):
-            raise ValueError("First model must have highest cost for MLMC")
-
     def _update_covariance_dimension(self):
         if self._covariance.ndim == 2:
             self._covariance = self._covariance[:, :, None]
 
-    def _get_level_costs(self, model_costs):
-
-        sort_indices, model_costs_sorted = self._sort_model_costs(model_costs)
-        level_costs_sorted = self._sum_adjacent_model_costs(model_costs_sorted)
-        level_costs = self._unsort_level_costs(level_costs_sorted,
-                                               sort_indices)
-        self._cost_sort_indices = np.flip(sort_indices)  # to unsort later
-        return level_costs
-
-    def _sort_covariance_by_cost(self, cov_matrix):
-        indices = np.ix_(self._cost_sort_indices, self._cost_sort_indices)
-        cov_matrix_sorted = cov_matrix[indices]
-        return cov_matrix_sorted
-
-    def _get_variances_from_covariance(self, cov_matrix):
-        vars_ = np.empty((cov_matrix.shape[0], cov_matrix.shape[2]))
-        for i in range(0, cov_matrix.shape[0] - 1):
-            vars_[i] = cov_matrix[i, i, :] + \
-                       cov_matrix[i+1, i+1, :] - \
-                       2 * cov_matrix[i, i+1, :]
-        vars_[-1] = cov_matrix[-1, -1, :]
-
-        sort_indices = self._cost_sort_indices.argsort()
-        return vars_[sort_indices]
-
-    @staticmethod
-    def _sort_model_costs(model_costs):
-
-        sort_indices = np.argsort(model_costs)
-        model_costs_sort = np.flip(model_costs[sort_indices])
-        return sort_indices, model_costs_sort
-
-    def _sum_adjacent_model_costs(self, model_costs_sorted):
-
-        level_costs_sorted = np.copy(model_costs_sorted)
-        for i in range(0, self._num_models - 1):
-            level_costs_sorted[i] = model_costs_sorted[i] \
-                                    + model_costs_sorted[i + 1]
-        return level_costs_sorted
-
-    def _unsort_level_costs(self, level_costs_sort, sort_indices):
-
-        level_costs = np.zeros(self._num_models)
-        level_costs_sort = np.flip(level_costs_sort)
-        for i in range(0, self._num_models):
-            level_costs[sort_indices[i]] = level_costs_sort[i]
-        return level_costs
-
     def optimize(self, target_cost):
-
-        if self._target_cost_is_too_small(target_cost):
-            return self._get_invalid_result()
-
-        return self._compute_optimization_result(target_cost)
+        '''
+        :param target_cost: target cost, or an array of target costs to
+            compute the allocations of all of them at once
+        :type target_cost: float or np.array
+
+        :Returns: An OptimizationResult, or a list of OptimizationResults
+            (one per target cost) if an array of target costs is given
+        '''
+        target_costs = np.atleast_1d(target_cost).astype(float)
+        valid = ~self._target_cost_is_too_small(target_costs)
+
+        valid_results = iter(
+                self._compute_optimization_results(target_costs[valid]))
+        results = [next(valid_results) if is_valid
+                   else self._get_invalid_result() for is_valid in valid]
+
+        if np.ndim(target_cost) == 0:
+            return results[0]
+        return results
 
     def _target_cost_is_too_small(self, target_cost):
-        return target_cost < np.min(self._model_costs)
-
-    def _compute_optimization_result(self, target_cost):
-
-        samples_per_level = self._get_num_samples_per_level(target_cost)
-        actual_cost = np.dot(samples_per_level, self._level_costs)
-
-        nonzero_sample_nums = np.where(samples_per_level != 0)
-        estimator_variance = \
-            np.sum(self._mlmc_variances[nonzero_sample_nums] /
-                   samples_per_level[nonzero_sample_nums].reshape((-1, 1)),
-                   axis=0)
-
-        comp_allocation = self._make_allocation(samples_per_level)
-
-        allocation = self._alloc_class(comp_allocation)
-
-        return OptimizationResult(actual_cost, estimator_variance, allocation)
-
-    def _get_num_samples_per_level(self, target_cost):
-
-        mu_mlmc = self._calculate_mlmc_mu(target_cost)
-        var_to_cost_ratios = self._max_mlmc_variances / self._level_costs
-        samples_per_level = mu_mlmc * np.sqrt(var_to_cost_ratios)
-
-        return samples_per_level.astype(int)
-
-    def _calculate_mlmc_mu(self, target_cost):
-
-        mu_mlmc = 0.
-        for var_k, cost_k in zip(self._max_mlmc_variances, self._level_costs):
-            mu_mlmc += np.sqrt(var_k * cost_k)
-        mu_mlmc = target_cost / mu_mlmc
-        return mu_mlmc
-
-    def _make_allocation(self, num_samples_per_level):
-
-        allocation = np.zeros((self._num_models, 2 * self._num_models),
-                              dtype=int)
-        allocation[:, 0] = num_samples_per_level[self._cost_sort_indices]
-
-        for model_index in range(1, self._num_models):
-            cost_index = self._cost_sort_indices[model_index]
-            allocation[model_index - 1, 2 * cost_index] = 1
-            allocation[model_index, 2 * cost_index + 1] = 1
-        allocation[0, 1] = 1
-
-        if allocation[0, 0] == 0:
-
-            msg1 = "No samples are allocated for the highest fidelity model!\n"
-            msg2 = "Is your target cost too low?"
-            warnings.warn(msg1 + msg2)
-
-        return allocation
+        return self._get_sampling_budget(target_cost) \
+            < np.min(self._model_costs)
+
+    def _compute_optimization_results(self, target_costs):
+        if len(target_costs) == 0:
+            return []
+
+        samples_per_level = get_mlmc_samples_per_level(
+                self._parameters, self._get_sampling_budget(target_costs))
+        estimator_variances = get_mlmc_estimator_variances(
+                self._parameters, samples_per_level)
+
+        allocations = get_mlmc_allocations(self._parameters,
+                                           samples_per_level)
+        warn_if_no_hifi_samples(allocations)
+        actual_costs = self._get_total_cost(
+                get_samples_per_model(allocations))
+
+        return [OptimizationResult(cost, variance, self._alloc_class(alloc))
+                for cost, variance, alloc
+                in zip(actual_costs, estimator_variances, allocations)]
+
+
+def optimize_mlmc_scenarios(model_costs, covariances, target_costs):
+    '''
+    MLMC allocations of a batch of scenarios computed at once. The model
+    costs and covariances must already be validated (see
+    mxmc.optimizers.optimizer_context.OptimizerContext) and the scenarios
+    must not have setup costs.
+
+    :param model_costs: model costs of every scenario (SxM)
+    :type model_costs: np.array
+    :param covariances: covariance of every scenario (SxMxMxN)
+    :type covariances: np.array
+    :param target_costs: target cost of every scenario (S)
+    :type target_costs: np.array
+
+    :Returns: cost (S), estimator variance (SxN) and compressed allocation
+        (list of S np.arrays) of every scenario, with the invalid result of
+        MLMC.optimize for scenarios whose target cost is too small
+    '''
+    validate_mlmc_model_costs(model_costs)
+    parameters = get_mlmc_parameters(model_costs, covariances)
+    samples_per_level = get_mlmc_samples_per_level(parameters, target_costs)
+    variances = get_mlmc_estimator_variances(parameters, samples_per_level)
+    allocations = get_mlmc_allocations(parameters, samples_per_level)
+    costs = np.sum(get_samples_per_model(allocations) * model_costs, axis=1)
+
+    valid = target_costs >= np.min(model_costs, axis=1)
+    warn_if_no_hifi_samples(allocations[valid])
+    costs = np.where(valid, costs, 0.)
+    variances[~valid] = np.inf
+    allocations = [allocation if is_valid
+                   else get_invalid_allocation(allocation.shape[0])
+                   for allocation, is_valid in zip(allocations, valid)]
+    return costs, variances, allocations
+
+
+def validate_mlmc_model_costs(model_costs):
+    '''
+    Checks that the first model has the highest cost (in every scenario if
+    model_costs is SxM)
+    '''
+    model_costs = np.asarray(model_costs)
+    if np.any(model_costs[..., 0] != np.max(model_costs, axis=-1)):
+        raise ValueError("First model must have highest cost for MLMC")
+
+
+def get_mlmc_parameters(model_costs, covariances):
+    '''
+    Computes the level costs and the variances of the level differences of a
+    batch of scenarios.
+
+    :param model_costs: model costs of every scenario (SxM)
+    :type model_costs: np.array
+    :param covariances: covariance of every scenario (SxMxMxN)
+    :type covariances: np.array
+
+    :Returns: MLMCParameters with the model indices sorted by decreasing
+        cost (SxM), the cost of every level (SxM) and the variance of the
+        difference of every model and the next cheaper one (SxMxN; the
+        output variance for the cheapest model), indexed like model_costs
+    '''
+    scenarios = np.arange(len(model_costs))[:, np.newaxis]
+    cost_sort_indices = np.flip(np.argsort(model_costs, axis=1), axis=1)
+
+    sorted_costs = model_costs[scenarios, cost_sort_indices]
+    level_costs_sorted = np.copy(sorted_costs)
+    level_costs_sorted[:, :-1] += sorted_costs[:, 1:]
+    level_costs = np.empty_like(level_costs_sorted)
+    level_costs[scenarios, cost_sort_indices] = level_costs_sorted
+
+    sorted_covariances = covariances[scenarios[:, :, np.newaxis],
+                                     cost_sort_indices[:, :, np.newaxis],
+                                     cost_sort_indices[:, np.newaxis, :]]
+    variances = np.diagonal(sorted_covariances, axis1=1, axis2=2) \
+        .transpose([0, 2, 1])
+    adjacent_covariances = np.diagonal(sorted_covariances, offset=1,
+                                       axis1=1, axis2=2).transpose([0, 2, 1])
+    sorted_mlmc_variances = np.empty_like(variances)
+    sorted_mlmc_variances[:, :-1] = variances[:, :-1] + variances[:, 1:] \
+        - 2 * adjacent_covariances
+    sorted_mlmc_variances[:, -1] = variances[:, -1]
+    mlmc_variances = np.empty_like(sorted_mlmc_variances)
+    mlmc_variances[scenarios, cost_sort_indices] = sorted_mlmc_variances
+
+    return MLMCParameters(cost_sort_indices, level_costs, mlmc_variances)
+
+
+def get_mlmc_samples_per_level(parameters, sampling_budgets):
+    '''
+    :param sampling_budgets: budget of every scenario (S), or any number of
+        budgets if the parameters are those of a single scenario
+    :type sampling_budgets: np.array
+
+    :Returns: number of samples of every level for every budget
+    '''
+    max_mlmc_variances = np.max(parameters.mlmc_variances, axis=2)
+    mu_mlmc = sampling_budgets \
+        / np.sum(np.sqrt(max_mlmc_variances * parameters.level_costs),
+                 axis=1)
+    samples_per_level = mu_mlmc[:, np.newaxis] \
+        * np.sqrt(max_mlmc_variances / parameters.level_costs)
+    return samples_per_level.astype(int)
+
+
+def get_mlmc_estimator_variances(parameters, samples_per_level):
+    '''
+    :Returns: MLMC estimator variance of every quantity of interest for
+        every row of samples_per_level
+    '''
+    nonzero_samples = np.where(samples_per_level != 0, samples_per_level,
+                               np.inf)
+    return np.sum((1 / nonzero_samples)[:, :, np.newaxis]
+                  * parameters.mlmc_variances, axis=1)
+
+
+def get_mlmc_allocations(parameters, samples_per_level):
+    '''
+    :Returns: compressed allocation arrays for every row of
+        samples_per_level
+    '''
+    cost_sort_indices = parameters.cost_sort_indices
+    num_scenarios, num_models = cost_sort_indices.shape
+    scenarios = np.arange(num_scenarios)[:, np.newaxis]
+
+    structure = np.zeros((num_scenarios, num_models, 2 * num_models),
+                         dtype=int)
+    model_indices = np.arange(1, num_models)
+    cost_indices = cost_sort_indices[:, 1:]
+    structure[scenarios, model_indices - 1, 2 * cost_indices] = 1
+    structure[scenarios, model_indices, 2 * cost_indices + 1] = 1
+    structure[:, 0, 1] = 1
+
+    allocations = np.array(np.broadcast_to(
+            structure, (len(samples_per_level),) + structure.shape[1:]))
+    level_samples = np.take_along_axis(
+            samples_per_level,
+            np.broadcast_to(cost_sort_indices, samples_per_level.shape),
+            axis=1)
+    allocations[:, :, 0] = np.where(structure[:, :, 0] == 1, 1,
+                                    level_samples)
+    return allocations
+
+
+def warn_if_no_hifi_samples(allocations):
+    if np.any(allocations[:, 0, 0] == 0):
+
+        msg1 = "No samples are allocated for the highest fidelity model!\n"
+        msg2 = "Is your target cost too low?"
+        warnings.warn(msg1 + msg2)
@@ -2,7 +2,7 @@ from itertools import combinations
 
 import numpy as np
 
-from .optimizer_base import InconsistentModelError
+from .optimizer_base import InconsistentModelError, TargetVarianceError
 from mxmc.optimizers.optimizer_base import OptimizationResult
 
 
@@ -12,13 +12,38 @@ class AutoModelSelection:
         self._optimizer = optimizer
 
     def optimize(self, target_cost):
+        return self._optimize_model_subsets(
+                lambda optimizer: optimizer.optimize(target_cost),
+                self._has_lower_variance, InconsistentModelError)
+
+    def optimize_for_variance(self, target_variance):
+        '''
+        Finds the least expensive sample allocation over all subsets of models
+        whose estimator variance does not exceed target_variance. Subsets
+        that cannot meet target_variance are skipped; a TargetVarianceError
+        is raised only if no subset meets it.
+        '''
+        self._optimizer._validate_target_variance(target_variance)
+        result = self._optimize_model_subsets(
+                lambda optimizer: optimizer.optimize_for_variance(
+                    target_variance),
+                self._has_lower_cost,
+                (InconsistentModelError, TargetVarianceError))
+        if not np.isfinite(np.sum(result.variance)):
+            raise TargetVarianceError("No subset of models meets the target "
+                                      "variance {}".format(target_variance))
+        return result
+
+    def _optimize_model_subsets(self, optimize_candidate, is_better,
+                                skipped_errors):
         best_indices = None
         best_result = self._optimizer._get_invalid_result()
         num_models = self._optimizer.get_num_models()
 
         for indices in self._get_subsets_of_model_indices(num_models):
             best_result, best_indices = \
-                self._test_candidate_optimizer(target_cost, indices,
+                self._test_candidate_optimizer(optimize_candidate, is_better,
+                                               skipped_errors, indices,
                                                best_result, best_indices)
 
         if best_indices is None:
@@ -35,21 +60,32 @@ class AutoModelSelection:
 
         return OptimizationResult(actual_cost, estimator_variance, allocation)
 
-    def _test_candidate_optimizer(self, target_cost, indices,
-                                  best_result, best_indices):
+    def _test_candidate_optimizer(self, optimize_candidate, is_better,
+                                  skipped_errors, indices, best_result,
+                                  best_indices):
 
         candidate_optimizer = self._optimizer.subset(indices)
         try:
-            opt_result = candidate_optimizer.optimize(target_cost)
-        except InconsistentModelError:
+            opt_result = optimize_candidate(candidate_optimizer)
+        except skipped_errors:
             return best_result, best_indices
 
-        if np.array(opt_result.variance).sum() \
-                < np.array(best_result.variance).sum():
+        if is_better(opt_result, best_result):
             return opt_result, indices
 
         return best_result, best_indices
 
+    @staticmethod
+    def _has_lower_variance(opt_result, best_result):
+        return np.array(opt_result.variance).sum() \
+            < np.array(best_result.variance).sum()
+
+    @staticmethod
+    def _has_lower_cost(opt_result, best_result):
+        if not np.isfinite(np.array(best_result.variance).sum()):
+            return True
+        return np.sum(opt_result.cost) < np.sum(best_result.cost)
+
     @staticmethod
     def _gen_sample_array(result_sample, indices, num_models):
 
@@ -3,67 +3,159 @@ from collections import namedtuple
 
 import numpy as np
 
+from .optimizer_context import OptimizerContext
+
 
 OptimizationResult = namedtuple('OptResult',
                                 ['cost', 'variance', 'allocation'])
 
 
+COST_RTOL = 1e-3
+
+
 class InconsistentModelError(Exception):
     pass
 
 
-class OptimizerBase(metaclass=ABCMeta):
+class TargetVarianceError(RuntimeError):
+    pass
 
-    def __init__(self, model_costs, covariance=None, *_, **__):
-        self._model_costs = np.array(model_costs)
-        self._num_models = len(self._model_costs)
-        self._covariance = covariance
 
-        if covariance is not None:
-            self._validate_covariance_matrix(covariance)
+def get_invalid_allocation(num_models):
+    '''
+    :Returns: compressed allocation of the invalid result that optimizers
+        return when the target cost is too small for a single evaluation
+    '''
+    allocation = np.zeros((1, 2 * num_models), dtype=int)
+    allocation[0, :2] = 1
+    return allocation
 
-        self._alloc_class = None
 
-    def _validate_covariance_matrix(self, matrix):
-        if len(matrix) != self._num_models:
-            error_msg = "Covariance matrix and model cost dims must match"
-            raise ValueError(error_msg)
+class OptimizerBase(metaclass=ABCMeta):
+
+    def __init__(self, model_costs, covariance=None, *_, context=None,
+                 setup_costs=None, batch_sizes=None, **options):
+        if context is None:
+            context = OptimizerContext(model_costs, covariance, setup_costs,
+                                       batch_sizes)
+        self._context = context
+        self._model_costs = context.model_costs
+        self._num_models = context.num_models
+        self._covariance = context.covariance
+        self._options = dict(options, setup_costs=setup_costs,
+                             batch_sizes=batch_sizes)
 
-        matrix_t = matrix.transpose([1, 0] + list(range(2, matrix.ndim)))
-        if not np.allclose(matrix_t, matrix):
-            error_msg = "Covariance matrix array must be symmetric"
-            raise ValueError(error_msg)
+        self._alloc_class = None
 
     @abstractmethod
     def optimize(self, target_cost):
         raise NotImplementedError
 
-    def subset(self, model_indices):
-        subset_costs = np.copy(self._model_costs[model_indices])
-        subset_covariance = self._get_subset_of_matrix(self._covariance,
-                                                       model_indices)
-        return self.__class__(subset_costs, subset_covariance)
+    def optimize_for_variance(self, target_variance, max_iterations=10):
+        '''
+        Finds the least expensive sample allocation whose estimator variance
+        (summed over quantities of interest) does not exceed target_variance.
+
+        The variance of all estimators scales with the inverse of the target
+        cost, so the cost is updated with secant steps on that relation
+        until the variance of the (integer) allocation meets the target and
+        the next step changes the cost by less than COST_RTOL. If none of the
+        max_iterations optimizations meets the target, the cost is increased
+        by 10% for up to max_iterations further optimizations before a
+        TargetVarianceError is raised.
+
+        :param target_variance: maximum allowed estimator variance
+        :type target_variance: float
+        :param max_iterations: maximum number of optimizations performed
+            (in each of the two phases)
+        :type max_iterations: int
+
+        :Returns: An OptimizationResult namedtuple (see optimize)
+        '''
+        self._validate_target_variance(target_variance)
+        target_cost = self._get_monte_carlo_cost_for_variance(target_variance)
+
+        best_result = None
+        for _ in range(max_iterations):
+            result = self.optimize(target_cost)
+            variance = np.sum(result.variance)
+            if not np.isfinite(variance):
+                target_cost *= 2
+                continue
+            next_target_cost = target_cost * variance / target_variance
+            if variance <= target_variance:
+                if best_result is None \
+                        or np.sum(result.cost) < np.sum(best_result.cost):
+                    best_result = result
+                if np.isclose(next_target_cost, target_cost, rtol=COST_RTOL):
+                    break
+            else:
+                next_target_cost = max(next_target_cost,
+                                       target_cost * (1 + COST_RTOL))
+            target_cost = next_target_cost
+
+        for _ in range(max_iterations):
+            if best_result is not None:
+                return best_result
+            result = self.optimize(target_cost)
+            if np.sum(result.variance) <= target_variance:
+                best_result = result
+            target_cost *= 1.1
+
+        if best_result is None:
+            raise TargetVarianceError("No allocation meets the target "
+                                      "variance {} up to a target cost of {}"
+                                      .format(target_variance, target_cost))
+        return best_result
 
     @staticmethod
-    def _get_subset_of_matrix(matrix, model_indices):
-        if matrix is None:
-            return None
-        return np.copy(matrix[model_indices][:, model_indices])
+    def _validate_target_variance(target_variance):
+        if not target_variance > 0:
+            raise ValueError("Target variance must be positive")
+
+    def _get_monte_carlo_cost_for_variance(self, target_variance):
+        hifi_variance = np.sum(self._covariance[0, 0])
+        monte_carlo_cost = self._model_costs[0] \
+            * np.ceil(hifi_variance / target_variance)
+        return max(monte_carlo_cost, np.sum(self._model_costs))
+
+    def _get_sampling_budget(self, target_cost):
+        '''
+        Part of the target cost that is available for evaluations at the
+        amortized model costs; the setup cost of one batch of every model
+        is reserved for the last, partially filled batch.
+        '''
+        return target_cost - np.sum(self._context.setup_costs)
+
+    def _get_total_cost(self, samples_per_model):
+        return self._context.get_total_cost(samples_per_model)
+
+    def subset(self, model_indices):
+        subset_context = self._context.subset(model_indices)
+        return self.__class__(subset_context.model_costs,
+                              subset_context.covariance,
+                              context=subset_context, **self._options)
 
     def get_num_models(self):
         return self._num_models
 
     def _get_invalid_result(self):
-        allocation = np.zeros((1, 2 * self._num_models), dtype=int)
-        allocation[0, :2] = 1
+        allocation = get_invalid_allocation(self._num_models)
         return OptimizationResult(0, np.inf, self._alloc_class(allocation))
 
     def _get_monte_carlo_result(self, target_cost):
-        sample_nums = np.floor(np.array([target_cost / self._model_costs[0]]))
+        sample_nums = np.array(
+                [self._get_num_monte_carlo_samples(target_cost)])
         variance = self._covariance[0, 0] / sample_nums[0]
-        cost = self._model_costs * sample_nums[0]
+        samples_per_model = np.zeros(self._num_models)
+        samples_per_model[0] = sample_nums[0]
+        cost = self._get_total_cost(samples_per_model)
         allocation = np.zeros((1, 2 * self._num_models), dtype=int)
         allocation[0, 0] = sample_nums[0]
         allocation[0, 1] = 1
         return OptimizationResult(cost, variance,
                                   self._alloc_class(allocation))
+
+    def _get_num_monte_carlo_samples(self, target_cost):
+        return np.floor(self._get_sampling_budget(target_cost)
+                        / self._model_costs[0])
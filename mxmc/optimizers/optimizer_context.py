@@ -0,0 +1,160 @@
+import numpy as np
+import torch
+
+from mxmc.util.batch_costs import get_amortized_costs, \
+    get_batch_cost_arrays, get_total_cost
+from mxmc.util.qoi_compression import group_qoi_covariances
+
+
+class OptimizerContext:
+    '''
+    Validated, read-only model costs and covariance that are shared by an
+    optimizer, the sub-optimizers it spawns and the optimizers of its model
+    subsets. The costs and covariance are copied and validated once when the
+    context is created, torch tensors of the covariance and costs are created
+    at most once per dtype and the context of every model subset is created
+    at most once.
+
+    :param model_costs: cost of all models
+    :type model_costs: np.array
+    :param covariance: covariance among model outputs (MxM or MxMxN)
+    :type covariance: 2D np.array or 3D np.array
+    :param setup_costs: fixed cost of every batch of evaluations of every
+        model; model_costs are then the costs per sample
+    :type setup_costs: np.array
+    :param batch_sizes: maximum number of evaluations per batch of every
+        model; unlimited if None
+    :type batch_sizes: np.array
+    '''
+
+    def __init__(self, model_costs, covariance=None, setup_costs=None,
+                 batch_sizes=None):
+        sample_costs = np.array(model_costs)
+        setup_costs, batch_sizes = get_batch_cost_arrays(
+                len(sample_costs), setup_costs, batch_sizes)
+        self._set_data(sample_costs,
+                       None if covariance is None else np.array(covariance),
+                       setup_costs, batch_sizes)
+        if covariance is not None:
+            self._validate_covariance_matrix(self._covariance)
+
+    def _set_data(self, sample_costs, covariance, setup_costs, batch_sizes):
+        self._sample_costs = sample_costs
+        self._setup_costs = setup_costs
+        self._batch_sizes = batch_sizes
+        self._model_costs = sample_costs
+        if np.any(setup_costs > 0):
+            self._model_costs = get_amortized_costs(sample_costs,
+                                                    setup_costs, batch_sizes)
+        self._covariance = covariance
+        self._tensor_cache = {}
+        self._subset_cache = {}
+
+    @property
+    def num_models(self):
+        return len(self._model_costs)
+
+    @property
+    def model_costs(self):
+        '''
+        Cost per evaluation of every model, including the setup cost spread
+        over full batches
+        '''
+        return self._read_only_view(self._model_costs)
+
+    @property
+    def setup_costs(self):
+        return self._read_only_view(self._setup_costs)
+
+    def get_total_cost(self, samples_per_model):
+        '''
+        :Returns: exact cost of evaluating every model the given number of
+            times in batches (see mxmc.util.batch_costs.get_total_cost)
+        '''
+        if not np.any(self._setup_costs > 0):
+            return np.dot(samples_per_model, self._sample_costs)
+        return get_total_cost(samples_per_model, self._sample_costs,
+                              self._setup_costs, self._batch_sizes)
+
+    @property
+    def covariance(self):
+        if self._covariance is None:
+            return None
+        return self._read_only_view(self._covariance)
+
+    @staticmethod
+    def _read_only_view(array):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def _validate_covariance_matrix(self, matrix):
+        if len(matrix) != self.num_models:
+            error_msg = "Covariance matrix and model cost dims must match"
+            raise ValueError(error_msg)
+
+        matrix_t = matrix.transpose([1, 0] + list(range(2, matrix.ndim)))
+        if not np.allclose(matrix_t, matrix):
+            error_msg = "Covariance matrix array must be symmetric"
+            raise ValueError(error_msg)
+
+    def get_covariance_tensor(self, dtype, num_qoi_groups=None):
+        '''
+        :param num_qoi_groups: when given, the quantities of interest are
+            compressed into at most this many groups with summed covariances
+            (see mxmc.util.qoi_compression.group_qoi_covariances)
+        :type num_qoi_groups: int
+
+        :Returns: covariance as a torch tensor of shape NxMxM (one MxM matrix
+            per quantity of interest or group); shares memory with the
+            covariance array when dtype matches and no compression is used
+        '''
+        key = ("covariance", dtype, num_qoi_groups)
+        if key not in self._tensor_cache:
+            covariance = self._covariance
+            if num_qoi_groups is not None and covariance.ndim == 3:
+                covariance = group_qoi_covariances(covariance,
+                                                   num_qoi_groups)
+            covariance = torch.as_tensor(covariance, dtype=dtype)
+            ndim = covariance.ndimension()
+            if ndim == 2:
+                covariance = covariance.unsqueeze(0)
+            elif ndim == 3:
+                covariance = covariance.permute([2, 0, 1])
+            else:
+                raise RuntimeError("Invalid Covariance matrix encountered "
+                                   "with dimension =", str(ndim))
+            self._tensor_cache[key] = covariance
+        return self._tensor_cache[key]
+
+    def get_model_costs_tensor(self, dtype):
+        key = ("model_costs", dtype)
+        if key not in self._tensor_cache:
+            self._tensor_cache[key] = torch.as_tensor(self._model_costs,
+                                                      dtype=dtype)
+        return self._tensor_cache[key]
+
+    def subset(self, model_indices):
+        '''
+        :Returns: context restricted to the models in model_indices; the
+            subset of an already validated context is not validated again and
+            is cached, so its covariance and tensors are only created once
+            per set of model indices
+        '''
+        key = tuple(np.asarray(model_indices).tolist())
+        if key not in self._subset_cache:
+            self._subset_cache[key] = self._create_subset(key)
+        return self._subset_cache[key]
+
+    def _create_subset(self, model_indices):
+        model_indices = np.asarray(model_indices, dtype=int)
+        subset_context = self.__class__.__new__(self.__class__)
+        subset_covariance = None
+        if self._covariance is not None:
+            subset_covariance = \
+                self._covariance[np.ix_(model_indices, model_indices)]
+        subset_context._set_data(self._sample_costs[model_indices],
+                                 subset_covariance,
+                                 self._setup_costs[model_indices],
+                                 self._batch_sizes[model_indices])
+        return subset_context
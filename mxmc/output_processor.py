@@ -23,7 +23,10 @@ class OutputProcessor:
 
         :param model_outputs: list of arrays of outputs for each model. Each
             array must be the same size unless a sample allocation is provided.
-        :type model_outputs: list of np.array
+            A CampaignStore can be given instead, in which case its outputs
+            and sample allocation are used (outputs that have not been
+            computed yet are ignored).
+        :type model_outputs: list of np.array or CampaignStore
         :param sample_allocation: An MXMC sample allocation object defining the
             indices of samples that each model output was generated for, if
             applicable. Default is None indicating that all supplied model
@@ -34,12 +37,85 @@ class OutputProcessor:
         :Returns: covariance matrix among all model outputs (2D np.array with
             size equal to the number of models).
         '''
+        model_outputs, sample_allocation = \
+            OutputProcessor._read_model_outputs(model_outputs,
+                                                sample_allocation)
 
         output_array = OutputProcessor._build_output_array(model_outputs,
                                                            sample_allocation)
         cov_matrix = OutputProcessor._compute_cov_elements(output_array)
         return np.array(cov_matrix)
 
+    @staticmethod
+    def compute_bootstrap_covariances(model_outputs, num_replicates,
+                                      sample_allocation=None):
+        '''
+        Estimate covariance matrices of bootstrap replicates of the model
+        outputs, e.g., to quantify the uncertainty of a pilot covariance
+        estimate (see Optimizer.optimize_robust). Every replicate resamples
+        the inputs with replacement, keeping the outputs of all models for a
+        resampled input together, and the covariances of all replicates are
+        computed at once.
+
+        :param model_outputs: list of arrays of outputs for each model (see
+            compute_covariance_matrix)
+        :type model_outputs: list of np.array or CampaignStore
+        :param num_replicates: number of bootstrap replicates
+        :type num_replicates: int
+        :param sample_allocation: An MXMC sample allocation object defining the
+            indices of samples that each model output was generated for, if
+            applicable (see compute_covariance_matrix).
+        :type sample_allocation: SampleAllocation object.
+
+        :Returns: covariance matrices of all replicates (3D np.array of size
+            num_replicates x number of models x number of models)
+        '''
+        if num_replicates < 1:
+            raise ValueError("num_replicates must be a positive integer")
+        model_outputs, sample_allocation = \
+            OutputProcessor._read_model_outputs(model_outputs,
+                                                sample_allocation)
+        output_array = OutputProcessor._build_output_array(model_outputs,
+                                                           sample_allocation)
+        num_models, num_samples = output_array.shape
+        if num_samples == 0:
+            return np.full((num_replicates, num_models, num_models), np.nan)
+
+        resample_indices = np.random.randint(num_samples,
+                                             size=(num_replicates,
+                                                   num_samples))
+        return OutputProcessor._compute_stacked_cov_elements(
+                output_array[:, resample_indices])
+
+    @staticmethod
+    def _compute_stacked_cov_elements(output_arrays):
+        '''
+        Pairwise covariances (of the samples available for both models) of
+        a stack of output arrays (models x stack x samples).
+        '''
+        available = ~np.isnan(output_arrays)
+        weights = available.astype(float)
+        outputs = np.where(available, output_arrays, 0.)
+        means = outputs.sum(axis=2, keepdims=True) \
+            / np.maximum(weights.sum(axis=2, keepdims=True), 1)
+        centered = (outputs - means) * weights
+
+        counts = np.einsum("irs,jrs->rij", weights, weights)
+        sums = np.einsum("irs,jrs->rij", centered, weights)
+        products = np.einsum("irs,jrs->rij", centered, centered)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = (products - sums * sums.transpose(0, 2, 1) / counts) \
+                / (counts - 1)
+        matrix[counts <= 1] = np.nan
+        return matrix
+
+    @staticmethod
+    def _read_model_outputs(model_outputs, sample_allocation):
+        if hasattr(model_outputs, "get_model_outputs"):
+            return model_outputs.get_model_outputs(), \
+                model_outputs.sample_allocation
+        return model_outputs, sample_allocation
+
     @staticmethod
     def _build_output_array(model_outputs, sample_allocation):
         if sample_allocation is None:
@@ -54,7 +130,7 @@ class OutputProcessor:
 
     @staticmethod
     def _make_output_array_from_indices(model_inds, model_outputs):
-        max_model_inds = [max(i) for i in model_inds if i]
+        max_model_inds = [max(i) for i in model_inds if len(i)]
 
         if not max_model_inds:
             return np.empty((0, 0))
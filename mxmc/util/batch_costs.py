@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def get_batch_cost_arrays(num_models, setup_costs=None, batch_sizes=None):
+    '''
+    Validates the batch cost parameters of all models.
+
+    :param num_models: number of models
+    :type num_models: int
+    :param setup_costs: fixed cost of every batch of evaluations of every
+        model (e.g., loading a mesh or checking out a license); zero if None
+    :type setup_costs: np.array
+    :param batch_sizes: maximum number of evaluations per batch of every
+        model; unlimited (a single batch per model) if None
+    :type batch_sizes: np.array
+
+    :Returns: setup costs and batch sizes as arrays of length num_models
+    '''
+    if setup_costs is None:
+        setup_costs = np.zeros(num_models)
+    if batch_sizes is None:
+        batch_sizes = np.full(num_models, np.inf)
+    setup_costs = np.array(setup_costs, dtype=float)
+    batch_sizes = np.array(batch_sizes, dtype=float)
+
+    if setup_costs.shape != (num_models,) \
+            or batch_sizes.shape != (num_models,):
+        raise ValueError("Setup costs, batch sizes and model cost dims must "
+                         "match")
+    if np.any(setup_costs < 0):
+        raise ValueError("Setup costs must be non-negative")
+    if np.any(batch_sizes < 1):
+        raise ValueError("Batch sizes must be positive")
+    return setup_costs, batch_sizes
+
+
+def get_amortized_costs(model_costs, setup_costs, batch_sizes):
+    '''
+    :Returns: cost per evaluation of every model when the setup cost is
+        spread over full batches
+    '''
+    return np.asarray(model_costs) + setup_costs / batch_sizes
+
+
+def get_total_cost(samples_per_model, model_costs, setup_costs=None,
+                   batch_sizes=None):
+    '''
+    Cost of evaluating every model a given number of times: the cost per
+    sample of all evaluations plus the setup cost of every batch, where
+    the evaluations of a model are split into as few batches as possible.
+
+    :param samples_per_model: number of evaluations of every model, or one
+        row of numbers per allocation
+    :type samples_per_model: np.array
+    :param model_costs: cost per sample of all models
+    :type model_costs: np.array
+    :param setup_costs: fixed cost of every batch of evaluations of every
+        model; zero if None
+    :type setup_costs: np.array
+    :param batch_sizes: maximum number of evaluations per batch of every
+        model; unlimited if None
+    :type batch_sizes: np.array
+
+    :Returns: total cost (float, or np.array with one cost per row)
+    '''
+    samples_per_model = np.asarray(samples_per_model, dtype=float)
+    cost = np.dot(samples_per_model, model_costs)
+    if setup_costs is None and batch_sizes is None:
+        return cost
+
+    setup_costs, batch_sizes = get_batch_cost_arrays(len(model_costs),
+                                                     setup_costs, batch_sizes)
+    num_batches = np.where(samples_per_model > 0,
+                           np.maximum(np.ceil(samples_per_model
+                                              / batch_sizes), 1), 0)
+    return cost + np.dot(num_batches, setup_costs)
+
+
+def get_samples_per_model(compressed_allocation):
+    '''
+    :param compressed_allocation: compressed sample allocation, or an array
+        of compressed allocations (along the first axis)
+    :type compressed_allocation: np.array
+
+    :Returns: number of evaluations of every model (one row per allocation
+        if several are given)
+    '''
+    compressed_allocation = np.asarray(compressed_allocation)
+    model_is_run = np.concatenate(
+            (compressed_allocation[..., 1:2],
+             compressed_allocation[..., 2::2]
+             + compressed_allocation[..., 3::2]), axis=-1) > 0
+    return np.einsum("...g,...gm->...m", compressed_allocation[..., 0],
+                     model_is_run)
@@ -1,14 +1,17 @@
+import warnings
+
+import numpy as np
 from scipy import optimize as scipy_optimize
 
+FEASIBILITY_TOLERANCE = 1e-8
+
 
 def perform_slsqp_then_nelder_mead(bounds, constraints, initial_guess,
                                    obj_func, obj_func_and_grad):
     slsqp_result = _slsqp(bounds, constraints, initial_guess,
                           obj_func_and_grad)
 
-    slsqp_constr_violated = _calculate_penalty(slsqp_result.x, bounds,
-                                               constraints) > 0
-    if slsqp_constr_violated:
+    if not _is_feasible(slsqp_result.x, bounds, constraints):
         nm_initial_guess = initial_guess
     else:
         nm_initial_guess = slsqp_result.x
@@ -23,6 +26,100 @@ def perform_slsqp(bounds, constraints, initial_guess, obj_func_and_grad):
     return opt_result.x
 
 
+def perform_slsqp_with_convergence_check(bounds, constraints, initial_guess,
+                                         obj_func, obj_func_and_grad):
+    slsqp_result = _slsqp(bounds, constraints, initial_guess,
+                          obj_func_and_grad)
+
+    if _is_converged_and_feasible(slsqp_result, bounds, constraints):
+        return slsqp_result.x
+
+    return perform_nelder_mead(bounds, constraints, initial_guess, obj_func)
+
+
+def perform_trust_constr(bounds, constraints, initial_guess, obj_func,
+                         obj_func_and_grad, obj_func_hessian=None):
+    '''
+    Minimizes with scipy's trust-constr method, using the exact Hessian
+    obj_func_hessian if given and BFGS updates otherwise. If the exact
+    Hessian cannot be computed (it raises a RuntimeError or is not finite),
+    a warning is issued and the minimization is restarted with BFGS updates.
+    '''
+    if obj_func_hessian is not None:
+        try:
+            return _trust_constr(bounds, constraints, initial_guess,
+                                 obj_func, obj_func_and_grad,
+                                 obj_func_hessian)
+        except _HessianError as error:
+            warnings.warn("Exact Hessian could not be computed ({}); "
+                          "falling back to BFGS updates".format(error))
+    return _trust_constr(bounds, constraints, initial_guess, obj_func,
+                         obj_func_and_grad)
+
+
+class _HessianError(Exception):
+    pass
+
+
+def _trust_constr(bounds, constraints, initial_guess, obj_func,
+                  obj_func_and_grad, obj_func_hessian=None):
+    scale = _get_objective_scale(obj_func, initial_guess)
+
+    def scaled_obj_func_and_grad(x):
+        fun, grad = obj_func_and_grad(x)
+        return fun * scale, grad * scale
+
+    if obj_func_hessian is None:
+        hessian = scipy_optimize.BFGS()
+    else:
+        def hessian(x):
+            try:
+                hess = obj_func_hessian(x)
+            except RuntimeError as error:
+                raise _HessianError(error) from error
+            if not np.all(np.isfinite(hess)):
+                raise _HessianError("non-finite entries")
+            return hess * scale
+
+    options = {"disp": False, "gtol": 1e-8, "xtol": 1e-10, "maxiter": 1000}
+    opt_result = scipy_optimize.minimize(
+            scaled_obj_func_and_grad,
+            initial_guess,
+            constraints=constraints,
+            bounds=bounds, jac=True,
+            hess=hessian,
+            method='trust-constr',
+            options=options)
+
+    if not _is_feasible(opt_result.x, bounds, constraints):
+        return perform_nelder_mead(bounds, constraints, opt_result.x,
+                                   obj_func)
+
+    return opt_result.x
+
+
+def _get_objective_scale(obj_func, x):
+    fun = abs(float(obj_func(x)))
+    if fun == 0 or not np.isfinite(fun):
+        return 1.
+    return 1. / fun
+
+
+def _is_converged_and_feasible(opt_result, bounds, constraints):
+    return opt_result.success \
+        and _is_feasible(opt_result.x, bounds, constraints)
+
+
+def _is_feasible(x, bounds, constraints):
+    violations = [0.]
+    for constr in constraints:
+        c_val = np.atleast_1d(constr["fun"](x, *constr["args"]))
+        violations.extend(-c_val)
+    for r, (lb, ub) in zip(x, bounds):
+        violations.extend([lb - r, r - ub])
+    return np.max(violations) <= FEASIBILITY_TOLERANCE
+
+
 def _slsqp(bounds, constraints, initial_guess, obj_func_and_grad):
     options = {"disp": False, "ftol": 1e-10}
     opt_result = scipy_optimize.minimize(
@@ -57,9 +154,8 @@ def _calculate_penalty(x, bounds, constraints):
     penalty_weight = 1e16
     penalty = 0
     for constr in constraints:
-        c_val = constr["fun"](x, *constr["args"])
-        if c_val < 0:
-            penalty -= c_val * penalty_weight
+        c_val = np.atleast_1d(constr["fun"](x, *constr["args"]))
+        penalty -= np.sum(c_val[c_val < 0]) * penalty_weight
     for r, (lb, ub) in zip(x, bounds):
         lb_val = r - lb
         ub_val = ub - r
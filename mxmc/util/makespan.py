@@ -0,0 +1,51 @@
+from collections import namedtuple
+import heapq
+
+import numpy as np
+
+Schedule = namedtuple('Schedule', ['makespan', 'workers', 'start_times'])
+MakespanResult = namedtuple('MakespanResult',
+                            ['cost', 'variance', 'allocation', 'schedule'])
+
+
+def schedule_allocation(sample_allocation, model_costs, num_workers):
+    '''
+    Schedules all model evaluations of a sample allocation on parallel
+    workers with the longest processing time rule: the evaluations are
+    assigned in order of decreasing duration (model cost), each to the
+    worker that becomes available first. Evaluations are indivisible, and
+    the makespan is at most 4/3 of the optimal makespan. Setup costs of
+    batches of evaluations are not scheduled: model_costs are the
+    durations of single evaluations.
+
+    :param sample_allocation: sample allocation to schedule
+    :type sample_allocation: SampleAllocation object
+    :param model_costs: cost (run time) of all models
+    :type model_costs: np.array
+    :param num_workers: number of parallel workers
+    :type num_workers: int
+
+    :Returns: A Schedule namedtuple with entries for makespan (time until
+        all evaluations are complete), workers (worker index of every sample
+        of every model, in the order of get_sample_indices_for_model; list of
+        np.arrays) and start_times (start time of every sample of every
+        model, in the same layout)
+    '''
+    if num_workers < 1:
+        raise ValueError("num_workers must be a positive integer")
+    model_costs = np.asarray(model_costs, dtype=float)
+    samples_per_model = sample_allocation.get_number_of_samples_per_model()
+
+    workers = [np.empty(n, dtype=int) for n in samples_per_model]
+    start_times = [np.empty(n) for n in samples_per_model]
+    available_times = [(0., worker) for worker in range(num_workers)]
+    for model in np.argsort(-model_costs, kind="stable"):
+        for sample in range(samples_per_model[model]):
+            start_time, worker = heapq.heappop(available_times)
+            workers[model][sample] = worker
+            start_times[model][sample] = start_time
+            heapq.heappush(available_times,
+                           (start_time + model_costs[model], worker))
+
+    makespan = max(time for time, _ in available_times)
+    return Schedule(makespan, workers, start_times)
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+def group_qoi_covariances(covariance, num_groups, max_iterations=100):
+    '''
+    Compresses the covariance of many quantities of interest (QoIs) into the
+    summed covariances of a few groups of QoIs with similar normalized
+    covariance structure (weighted k-means with the high fidelity variance
+    of each QoI as weight).
+
+    The summed estimator variance of a group's QoIs using a single set of
+    control variate weights per group depends on the covariance only through
+    the group's summed covariance. Optimizing with the compressed covariance
+    therefore minimizes an upper bound of the exact summed variance that is
+    tight when the QoIs of each group have proportional covariances.
+
+    :param covariance: covariance among model outputs for every QoI (MxMxN)
+    :type covariance: 3D np.array
+    :param num_groups: number of groups to compress the QoIs into
+    :type num_groups: int
+    :param max_iterations: maximum number of k-means iterations
+    :type max_iterations: int
+
+    :Returns: summed covariance of each group (MxMxnum_groups np.array)
+    '''
+    num_models, _, num_qois = covariance.shape
+    if num_groups >= num_qois:
+        return covariance
+
+    labels = _cluster_qois(covariance, num_groups, max_iterations)
+    group_membership = np.zeros((num_qois, num_groups))
+    group_membership[np.arange(num_qois), labels] = 1
+    grouped_covariance = np.matmul(covariance, group_membership)
+    return grouped_covariance[:, :, group_membership.sum(axis=0) > 0]
+
+
+def _cluster_qois(covariance, num_groups, max_iterations):
+    weights = covariance[0, 0]
+    upper_indices = np.triu_indices(covariance.shape[0])
+    features = covariance[upper_indices].T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features = np.where(weights[:, None] > 0,
+                            features / weights[:, None], 0)
+
+    centroids = _get_farthest_point_centroids(features, weights, num_groups)
+    labels = None
+    for _ in range(max_iterations):
+        distances = _get_squared_distances(features, centroids)
+        new_labels = np.argmin(distances, axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        centroids = _get_weighted_centroids(features, weights, labels,
+                                            centroids)
+    return labels
+
+
+def _get_farthest_point_centroids(features, weights, num_groups):
+    centroids = [features[np.argmax(weights)]]
+    min_distances = _get_squared_distances(features,
+                                           np.array(centroids))[:, 0]
+    for _ in range(num_groups - 1):
+        centroids.append(features[np.argmax(min_distances * weights)])
+        min_distances = np.minimum(
+                min_distances,
+                _get_squared_distances(features, centroids[-1:])[:, 0])
+    return np.array(centroids)
+
+
+def _get_squared_distances(features, centroids):
+    return (np.sum(features ** 2, axis=1)[:, None]
+            - 2 * np.dot(features, np.transpose(centroids))
+            + np.sum(np.square(centroids), axis=1)[None, :])
+
+
+def _get_weighted_centroids(features, weights, labels, centroids):
+    num_groups = len(centroids)
+    group_weights = np.bincount(labels, weights=weights, minlength=num_groups)
+    weighted_sums = np.zeros_like(centroids)
+    np.add.at(weighted_sums, labels, features * weights[:, None])
+    empty = group_weights <= 0
+    group_weights[empty] = 1
+    new_centroids = weighted_sums / group_weights[:, None]
+    new_centroids[empty] = centroids[empty]
+    return new_centroids
@@ -1,14 +1,31 @@
+from collections import namedtuple
+
 import numpy as np
 
 from mxmc.estimator import Estimator
+from mxmc.optimizer import Optimizer
+from mxmc.optimizers.approximate_control_variates.acv_optimizer import \
+    ACVOptimizer
+from mxmc.optimizers.approximate_control_variates.recursion_enumerator \
+    import RecursionEnumerator
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+from mxmc.util.batch_costs import get_samples_per_model, get_total_cost
+
+AllocationExtension = namedtuple('AllocationExtension',
+                                 ['allocation', 'new_allocation', 'cost',
+                                  'variance'])
 
 
 def adjust_sample_allocation_to_cost(sample_allocation, target_cost,
-                                     model_costs, covariance):
+                                     model_costs, covariance,
+                                     setup_costs=None, batch_sizes=None):
     '''
     Tests all possible increases to sample counts per group and returns
     sample allocation with the lowest variance while limiting
-    total cost to be within the specified target_cost.
+    total cost to be within the specified target_cost. With setup_costs
+    (and batch_sizes), model_costs are the costs per sample and the total
+    cost includes the setup cost of every batch of every model (see
+    mxmc.util.batch_costs.get_total_cost).
     '''
     def _test_sampling(sampling):
 
@@ -24,12 +41,20 @@ def adjust_sample_allocation_to_cost(sample_allocation, target_cost,
     base_compressed_allocation = sample_allocation.compressed_allocation
     sampling_tests = _generate_test_samplings(base_compressed_allocation,
                                               model_costs,
-                                              target_cost)
+                                              target_cost, setup_costs,
+                                              batch_sizes)
 
     best_allocation = sample_allocation
     best_variance = _get_estimator_variance(sample_allocation, covariance)
     for sampling_test in sampling_tests:
 
+        if setup_costs is not None:
+            test = np.copy(base_compressed_allocation)
+            test[:, 0] = sampling_test
+            if _get_total_sampling_cost(test, model_costs, setup_costs,
+                                        batch_sizes) > target_cost:
+                continue
+
         test_variance, test_allocation = _test_sampling(sampling_test)
         if test_variance < best_variance:
 
@@ -39,6 +64,71 @@ def adjust_sample_allocation_to_cost(sample_allocation, target_cost,
     return best_allocation
 
 
+def extend_sample_allocation(sample_allocation, target_cost, model_costs,
+                             covariance, algorithm="acvmf",
+                             **algorithm_options):
+    '''
+    Extends an existing sample allocation (e.g., of a campaign whose budget
+    grew) to a larger target cost without discarding its samples. The
+    groups of the existing allocation are kept with their sample counts and
+    the ACV algorithm optimizes groups of new samples, appended after the
+    num_total_samples existing samples, that minimize the variance of the
+    estimator using all samples.
+
+    The outputs of the extended allocation are the outputs of the existing
+    allocation followed by the outputs of the new allocation for every
+    model, so only the new allocation has to be evaluated (with input
+    samples that follow the existing ones).
+
+    :param sample_allocation: existing sample allocation
+    :type sample_allocation: SampleAllocation object
+    :param target_cost: total target cost, including the cost of the
+        existing allocation
+    :type target_cost: float
+    :param model_costs: cost of all models
+    :type model_costs: np.array
+    :param covariance: covariance among model outputs (MxM or MxMxN)
+    :type covariance: 2D np.array or 3D np.array
+    :param algorithm: name of the ACV algorithm that allocates the new samples
+    :type algorithm: string
+    :param algorithm_options: options of the optimization algorithm (see
+        Optimizer.optimize); setup_costs and batch_sizes also apply to the
+        cost of the existing allocation
+
+    :Returns: An AllocationExtension namedtuple with entries for allocation
+        (extended ACVSampleAllocation), new_allocation (ACVSampleAllocation
+        of the new samples only), cost (cost of the new samples) and
+        variance (estimator variance of the extended allocation)
+    '''
+    algorithm_class = Optimizer.get_algorithm(algorithm)
+    if not issubclass(algorithm_class, (ACVOptimizer, RecursionEnumerator)):
+        raise ValueError("Allocations can only be extended by the ACV "
+                         "algorithms")
+
+    existing_allocation = sample_allocation.compressed_allocation
+    model_costs = np.asarray(model_costs, dtype=float)
+    batch_costs = (algorithm_options.get("setup_costs"),
+                   algorithm_options.get("batch_sizes"))
+    additional_cost = target_cost - _get_total_sampling_cost(
+            existing_allocation, model_costs, *batch_costs)
+    if additional_cost < get_total_cost(np.ones(len(model_costs)),
+                                        model_costs, *batch_costs):
+        raise ValueError("Target cost must exceed the cost of the existing "
+                         "allocation by at least one evaluation of every "
+                         "model")
+
+    optimizer = algorithm_class(model_costs, covariance,
+                                existing_allocation=existing_allocation,
+                                **algorithm_options)
+    result = optimizer.optimize(additional_cost)
+
+    extended_allocation = result.allocation.compressed_allocation
+    new_allocation = ACVSampleAllocation(
+            extended_allocation[len(existing_allocation):])
+    return AllocationExtension(result.allocation, new_allocation, result.cost,
+                               result.variance)
+
+
 def _get_estimator_variance(sample_allocation, covariance):
 
     estimator = Estimator(sample_allocation, covariance)
@@ -46,7 +136,12 @@ def _get_estimator_variance(sample_allocation, covariance):
 
 
 # Get cost of running all samples as specified by a compressed allocation.
-def _get_total_sampling_cost(compressed_allocation, model_costs):
+def _get_total_sampling_cost(compressed_allocation, model_costs,
+                             setup_costs=None, batch_sizes=None):
+
+    if setup_costs is not None:
+        return get_total_cost(get_samples_per_model(compressed_allocation),
+                              model_costs, setup_costs, batch_sizes)
 
     cost_per_sample_by_group = \
         _get_cost_per_sample_by_group(compressed_allocation,
@@ -82,7 +177,8 @@ def _get_cost_per_sample_by_group(compressed_allocation, model_costs):
 
 
 # Produces an set of tuples, each of which is a unique sampling.
-def _generate_test_samplings(compressed_allocation, model_costs, target_cost):
+def _generate_test_samplings(compressed_allocation, model_costs, target_cost,
+                             setup_costs=None, batch_sizes=None):
 
     # Recursively add samplings to set sampling_tests until we've exhausted
     # all possibilities within target_cost.
@@ -96,12 +192,27 @@ def _generate_test_samplings(compressed_allocation, model_costs, target_cost):
                 new_sampling[g] += 1
                 new_cost_remaining = cost_remaining - group_cost
 
+                # An additional batch can exceed the remaining cost.
+                if setup_costs is not None:
+                    new_cost_remaining = target_cost \
+                        - get_sampling_cost(new_sampling)
+                    if new_cost_remaining < 0.:
+                        sampling_tests.add(tuple(test_sampling))
+                        continue
+
                 if new_cost_remaining < min_group_cost:
                     sampling_tests.add(tuple(new_sampling))
 
                 if new_cost_remaining > 0.:
                     add_test_samplings(new_sampling, new_cost_remaining)
 
+    def get_sampling_cost(sampling):
+
+        test = np.copy(compressed_allocation)
+        test[:, 0] = sampling
+        return _get_total_sampling_cost(test, model_costs, setup_costs,
+                                        batch_sizes)
+
     sample_cost_by_group = \
         _get_cost_per_sample_by_group(compressed_allocation, model_costs)
     min_group_cost = np.min(sample_cost_by_group)
@@ -109,7 +220,9 @@ def _generate_test_samplings(compressed_allocation, model_costs, target_cost):
     sampling_tests = set()
     starting_sampling = compressed_allocation
     starting_sampling_cost = _get_total_sampling_cost(starting_sampling,
-                                                      model_costs)
+                                                      model_costs,
+                                                      setup_costs,
+                                                      batch_sizes)
     cost_margin = target_cost - starting_sampling_cost
 
     if cost_margin > 0:
@@ -0,0 +1,166 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from mxmc.optimizer import Optimizer
+from mxmc.optimizers.mfmc import optimize_mfmc_scenarios
+from mxmc.optimizers.mlmc import optimize_mlmc_scenarios
+from mxmc.optimizers.optimizer_base import InconsistentModelError
+from mxmc.optimizers.optimizer_context import OptimizerContext
+
+CLOSED_FORM_ALGORITHMS = ("mfmc", "mlmc")
+SCENARIO_RESULT_DTYPE = [("scenario", int), ("algorithm", "U16"),
+                         ("target_cost", float), ("cost", float),
+                         ("variance", float), ("allocation", object)]
+
+
+def optimize_scenarios(algorithms, model_costs, covariances, target_costs,
+                       auto_model_selection=False, num_processes=None,
+                       **algorithm_options):
+    '''
+    Optimizes sample allocations for a batch of model scenarios with several
+    algorithms and collects the results in a table.
+
+    Numerical (ACV) optimizations are distributed over a pool of processes,
+    each limited to a single torch thread. Closed-form optimizers (MFMC,
+    MLMC) run in the calling process while the pool works, in a single
+    vectorized pass over all scenarios (unless auto_model_selection,
+    setup_costs or batch_sizes are used, which are handled per scenario).
+
+    :param algorithms: names of the optimization algorithms to run on every
+        scenario
+    :type algorithms: list of strings
+    :param model_costs: model costs of every scenario (SxM), or a single
+        cost vector (M) shared by all scenarios
+    :type model_costs: np.array
+    :param covariances: covariance of every scenario (SxMxM, or SxMxMxN for
+        multiple quantities of interest)
+    :type covariances: np.array
+    :param target_costs: target cost of every scenario (S), or a single
+        target cost shared by all scenarios
+    :type target_costs: float or np.array
+    :param auto_model_selection: flag to use automatic model selection
+    :type auto_model_selection: Boolean
+    :param num_processes: number of worker processes (None for the number of
+        cpus, 1 to run everything in the calling process)
+    :type num_processes: int
+    :param algorithm_options: options passed to every optimizer
+
+    :Returns: structured np.array with one row per scenario and algorithm
+        (ordered by scenario, then algorithm) and the fields scenario,
+        algorithm, target_cost, cost, variance (summed over quantities of
+        interest; nan if the models are inconsistent with the algorithm) and
+        allocation (compressed allocation np.array, or None)
+    '''
+    rows = list(iter_scenario_results(algorithms, model_costs, covariances,
+                                      target_costs, auto_model_selection,
+                                      num_processes, **algorithm_options))
+    algorithm_order = {algorithm: i for i, algorithm in enumerate(algorithms)}
+    rows.sort(key=lambda row: (row[0], algorithm_order[row[1]]))
+
+    table = np.empty(len(rows), dtype=SCENARIO_RESULT_DTYPE)
+    for i, row in enumerate(rows):
+        table[i] = row
+    return table
+
+
+def iter_scenario_results(algorithms, model_costs, covariances, target_costs,
+                          auto_model_selection=False, num_processes=None,
+                          **algorithm_options):
+    '''
+    Generator version of optimize_scenarios that yields the result rows
+    (tuples with the fields of SCENARIO_RESULT_DTYPE) as soon as they are
+    available, in completion order.
+    '''
+    model_costs, covariances, target_costs = \
+        _broadcast_scenarios(model_costs, covariances, target_costs)
+    closed_form = [a for a in algorithms
+                   if a.lower() in CLOSED_FORM_ALGORITHMS]
+    numerical = [a for a in algorithms
+                 if a.lower() not in CLOSED_FORM_ALGORITHMS]
+
+    def scenario_tasks(task_algorithms):
+        for i in range(len(target_costs)):
+            yield (i, task_algorithms, model_costs[i], covariances[i],
+                   target_costs[i], auto_model_selection, algorithm_options)
+
+    def closed_form_results():
+        if auto_model_selection \
+                or algorithm_options.get("setup_costs") is not None \
+                or algorithm_options.get("batch_sizes") is not None:
+            for task in scenario_tasks(closed_form):
+                yield from _optimize_scenario(task)
+            return
+        for algorithm in closed_form:
+            yield from _optimize_closed_form_scenarios(
+                    algorithm, model_costs, covariances, target_costs)
+
+    if num_processes == 1 or not numerical:
+        yield from closed_form_results()
+        for task in scenario_tasks(numerical):
+            yield from _optimize_scenario(task)
+        return
+
+    with ProcessPoolExecutor(num_processes) as executor:
+        futures = [executor.submit(_optimize_scenario, task)
+                   for task in scenario_tasks(numerical)]
+        yield from closed_form_results()
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def _broadcast_scenarios(model_costs, covariances, target_costs):
+    covariances = np.asarray(covariances)
+    if covariances.ndim < 3:
+        raise ValueError("Covariances must be stacked along a leading "
+                         "scenario axis")
+    num_scenarios = len(covariances)
+    model_costs = np.broadcast_to(np.asarray(model_costs, dtype=float),
+                                  (num_scenarios, covariances.shape[1]))
+    target_costs = np.broadcast_to(np.asarray(target_costs, dtype=float),
+                                   (num_scenarios,))
+    return model_costs, covariances, target_costs
+
+
+def _optimize_scenario(task):
+    scenario, algorithms, model_costs, covariance, target_cost, \
+        auto_model_selection, algorithm_options = task
+    optimizer = Optimizer(model_costs, covariance, num_threads=1,
+                          **algorithm_options)
+
+    rows = []
+    for algorithm in algorithms:
+        try:
+            result = optimizer.optimize(algorithm, target_cost,
+                                        auto_model_selection)
+            row = (scenario, algorithm, target_cost, np.sum(result.cost),
+                   np.sum(result.variance),
+                   result.allocation.compressed_allocation)
+        except InconsistentModelError:
+            row = (scenario, algorithm, target_cost, np.nan, np.nan, None)
+        rows.append(row)
+    return rows
+
+
+def _optimize_closed_form_scenarios(algorithm, model_costs, covariances,
+                                    target_costs):
+    contexts = [OptimizerContext(costs, covariance)
+                for costs, covariance in zip(model_costs, covariances)]
+    model_costs = np.stack([context.model_costs for context in contexts])
+    covariances = np.stack([context.covariance for context in contexts])
+    if covariances.ndim == 3:
+        covariances = covariances[..., np.newaxis]
+
+    if algorithm.lower() == "mfmc":
+        costs, variances, allocations, consistent = \
+            optimize_mfmc_scenarios(model_costs, covariances, target_costs)
+    else:
+        costs, variances, allocations = \
+            optimize_mlmc_scenarios(model_costs, covariances, target_costs)
+        consistent = np.ones(len(target_costs), dtype=bool)
+
+    for scenario, target_cost in enumerate(target_costs):
+        if consistent[scenario]:
+            yield (scenario, algorithm, target_cost, costs[scenario],
+                   np.sum(variances[scenario]), allocations[scenario])
+        else:
+            yield (scenario, algorithm, target_cost, np.nan, np.nan, None)
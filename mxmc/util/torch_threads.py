@@ -0,0 +1,26 @@
+from contextlib import contextmanager
+
+import torch
+
+
+@contextmanager
+def torch_num_threads(num_threads):
+    '''
+    Context manager that limits the size of torch's intra-op thread pool
+    and restores the previous size on exit. Useful to avoid oversubscribing
+    the cores when several optimizations run in parallel processes.
+
+    :param num_threads: number of threads torch may use (None leaves the
+        thread pool unchanged)
+    :type num_threads: int
+    '''
+    if num_threads is None:
+        yield
+        return
+
+    previous_num_threads = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous_num_threads)
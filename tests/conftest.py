@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def three_model_costs():
+    return np.array([1, 0.1, 0.01])
+
+
+@pytest.fixture
+def three_model_covariance():
+    return np.array([[1.0, 0.9, 0.8],
+                     [0.9, 1.6, 0.7],
+                     [0.8, 0.7, 2.5]])
+
+
+@pytest.fixture
+def four_model_costs():
+    return np.array([1, 0.1, 0.01, 0.001])
+
+
+@pytest.fixture
+def four_model_covariance():
+    return np.array([[1.0, 0.9, 0.8, 0.5],
+                     [0.9, 1.6, 0.7, 0.4],
+                     [0.8, 0.7, 2.5, 0.3],
+                     [0.5, 0.4, 0.3, 1.2]])
@@ -49,7 +49,7 @@ def _generate_random_ratios_fulfilling_constraints(constraints, model_costs):
 
 def _constraints_fulfilled(constraints, ratios):
     for constr in constraints:
-        if constr["fun"](ratios, *constr["args"]) < 0:
+        if np.any(constr["fun"](ratios, *constr["args"]) < 0):
             return False
     return True
 
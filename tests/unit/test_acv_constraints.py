@@ -1,8 +1,11 @@
 import numpy as np
 import pytest
 
+from scipy.optimize import approx_fprime
+
 from mxmc.optimizers.approximate_control_variates.acv_constraints \
     import ACVConstraints
+from mxmc.optimizer import Optimizer
 
 DUMMYVALUE = None
 
@@ -17,66 +20,51 @@ class MockedConstrained(ACVConstraints):
     def _calculate_n(self, _ratios, _target_cost):
         return self._n_value
 
+    def _calculate_n_and_gradient(self, ratios, _target_cost):
+        return self._n_value, np.zeros(len(ratios))
+
+
+def _get_constraints(opt, builder_name):
+    rows = getattr(opt, "_rows_" + builder_name)()
+    return opt._vectorize_constraints(DUMMYVALUE, rows)
+
+
+def _get_constraint_values(constraints, ratios):
+    return np.concatenate([np.atleast_1d(constr["fun"](ratios,
+                                                       *constr["args"]))
+                           for constr in constraints])
+
 
 def _count_constraints_violated(constraints, ratios):
-    violated = 0
-    for constr in constraints:
-        print(constr["fun"](ratios, *constr["args"]))
-        if constr["fun"](ratios, *constr["args"]) < 0:
-            violated += 1
-    return violated
+    return np.count_nonzero(_get_constraint_values(constraints, ratios) < 0)
 
 
 @pytest.mark.parametrize("num_models", range(1, 4))
 def test_n_gt_1_constraint_has_1_entry(num_models):
-    opt = MockedConstrained(num_models=num_models)
-    constraints = opt._constr_n_greater_than_1(target_cost=DUMMYVALUE)
-    assert len(constraints) == 1
+    opt = MockedConstrained(num_models=num_models, n_value=1)
+    constraints = _get_constraints(opt, "n_greater_than_1")
+    ratios = np.ones(num_models - 1)
+    assert len(_get_constraint_values(constraints, ratios)) == 1
 
 
 @pytest.mark.parametrize("n_value, expected_violations",
                          [(0, 1), (0.999, 1), (1, 0), (10, 0)])
 def test_n_gt_1_constraint_is_accurate(n_value, expected_violations):
-    opt = MockedConstrained(n_value=n_value)
-    constraints = opt._constr_n_greater_than_1(target_cost=DUMMYVALUE)
+    opt = MockedConstrained(num_models=3, n_value=n_value)
+    constraints = _get_constraints(opt, "n_greater_than_1")
     constr_violated = _count_constraints_violated(constraints,
-                                                  ratios=DUMMYVALUE)
-    assert constr_violated == expected_violations
-
-
-@pytest.mark.parametrize("num_models", range(1, 4))
-def test_r_1_gt_n_constraints_correct_size(num_models):
-    opt = MockedConstrained(num_models=num_models)
-    constraints = opt._constr_ratios_result_in_samples_1_greater_than_n(
-            target_cost=DUMMYVALUE)
-    assert len(constraints) == num_models - 1
-
-
-@pytest.mark.parametrize("r1_violates", [True, False])
-@pytest.mark.parametrize("r2_violates", [True, False])
-@pytest.mark.parametrize("r3_violates", [True, False])
-def test_r_1_gt_n_constraints_are_accurate(r1_violates, r2_violates,
-                                           r3_violates):
-    opt = MockedConstrained(num_models=4, n_value=1)
-    constraints = opt._constr_ratios_result_in_samples_1_greater_than_n(
-            target_cost=DUMMYVALUE)
-
-    ratios = np.array([2., 2., 2.])
-    violations = np.array([r1_violates, r2_violates, r3_violates])
-    ratios[violations] -= 0.1
-    expected_violations = np.count_nonzero(violations)
-
-    constr_violated = _count_constraints_violated(constraints, ratios)
+                                                  ratios=np.ones(2))
     assert constr_violated == expected_violations
 
 
 @pytest.mark.parametrize("num_models", range(1, 4))
 def test_r_1_gt_prevr_constraints_correct_size(num_models):
-    opt = MockedConstrained(num_models=num_models)
-    constraints = \
-        opt._constr_ratios_result_in_samples_1_greater_than_prev_ratio(
-            target_cost=DUMMYVALUE)
-    assert len(constraints) == num_models - 1
+    opt = MockedConstrained(num_models=num_models, n_value=1)
+    constraints = _get_constraints(
+            opt, "ratios_result_in_samples_1_greater_than_prev_ratio")
+    ratios = np.ones(num_models - 1)
+    assert len(_get_constraint_values(constraints, ratios)) \
+        == num_models - 1
 
 
 @pytest.mark.parametrize("r1_violates", [True, False])
@@ -85,9 +73,8 @@ def test_r_1_gt_prevr_constraints_correct_size(num_models):
 def test_r_1_gt_prevr_constraints_are_accurate(r1_violates, r2_violates,
                                                r3_violates):
     opt = MockedConstrained(num_models=4, n_value=1)
-    constraints = \
-        opt._constr_ratios_result_in_samples_1_greater_than_prev_ratio(
-            target_cost=DUMMYVALUE)
+    constraints = _get_constraints(
+            opt, "ratios_result_in_samples_1_greater_than_prev_ratio")
 
     ratios = np.array([2., 3., 4.])
     expected_violations = 0
@@ -107,12 +94,13 @@ def test_r_1_gt_prevr_constraints_are_accurate(r1_violates, r2_violates,
 
 @pytest.mark.parametrize("num_models", range(1, 4))
 def test_r_1_diff_refr_constraints_correct_size(num_models):
-    opt = MockedConstrained(num_models=num_models,
+    opt = MockedConstrained(num_models=num_models, n_value=1,
                             recursion_refs=[0]*(num_models - 1))
-    constraints = \
-        opt._constr_ratios_result_in_samples_1_different_than_ref(
-            target_cost=DUMMYVALUE)
-    assert len(constraints) == num_models - 1
+    constraints = _get_constraints(
+            opt, "ratios_result_in_samples_1_different_than_ref")
+    ratios = np.ones(num_models - 1)
+    assert len(_get_constraint_values(constraints, ratios)) \
+        == num_models - 1
 
 
 @pytest.mark.parametrize("r1_violates", [True, False])
@@ -122,9 +110,8 @@ def test_r_1_diff_refr_constraints_correct_size(num_models):
 def test_r_1_diff_refr_constraints_are_accurate(r1_violates, r2_violates,
                                                 r3_violates, addend):
     opt = MockedConstrained(num_models=4, n_value=1, recursion_refs=[0, 3, 1])
-    constraints = \
-        opt._constr_ratios_result_in_samples_1_different_than_ref(
-            target_cost=DUMMYVALUE)
+    constraints = _get_constraints(
+            opt, "ratios_result_in_samples_1_different_than_ref")
 
     ratios = np.array([1., 1., 1.])
     expected_violations = 3
@@ -140,3 +127,41 @@ def test_r_1_diff_refr_constraints_are_accurate(r1_violates, r2_violates,
 
     constr_violated = _count_constraints_violated(constraints, ratios)
     assert constr_violated == expected_violations
+
+
+@pytest.mark.parametrize("builder_name, expected", [
+    ("n_greater_than_1", [1]),
+    ("ratios_result_in_samples_greater_than_1", [3, 5, 7]),
+    ("ratios_result_in_samples_1_greater_than_prev_ratio", [1, 1, 1]),
+    ("ratios_result_in_samples_1_different_than_ref", [1, 1, 3])])
+def test_vectorized_constraint_values(builder_name, expected):
+    opt = MockedConstrained(num_models=4, n_value=2,
+                            recursion_refs=[0, 3, 1])
+    constraints = _get_constraints(opt, builder_name)
+
+    assert len(constraints) == 1
+    np.testing.assert_array_almost_equal(
+            _get_constraint_values(constraints, np.array([2., 3., 4.])),
+            expected)
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvmfu", "acvmfmc",
+                                       "acvis", "wrdiff"])
+def test_vectorized_constraint_jacobian_matches_finite_difference(algorithm):
+    covariance = np.array([[1, 0.9, 0.6, 0.3],
+                           [0.9, 1., 0.5, 0.2],
+                           [0.6, 0.5, 1., 0.1],
+                           [0.3, 0.2, 0.1, 1.]])
+    model_costs = np.array([1, 0.2, 0.05, 0.01])
+    opt = Optimizer.get_algorithm(algorithm)(model_costs, covariance)
+    constraint = opt._get_constraints(target_cost=100)[0]
+
+    ratios = np.array([1.5, 2.5, 4.])
+    jacobian = constraint["jac"](ratios)
+    num_constraints = len(constraint["fun"](ratios))
+    fd_jacobian = np.array([approx_fprime(ratios,
+                                          lambda x: constraint["fun"](x)[k],
+                                          1e-7)
+                            for k in range(num_constraints)])
+
+    np.testing.assert_allclose(jacobian, fd_jacobian, atol=1e-5)
@@ -3,6 +3,10 @@ import pytest
 
 from mxmc.optimizer import Optimizer
 from mxmc.util.testing import assert_opt_result_equal
+from mxmc.optimizers.approximate_control_variates.acv_constraints \
+    import satisfies_constraints
+from mxmc.optimizers.approximate_control_variates.acv_optimizer \
+    import ACVOptimizer
 
 
 @pytest.mark.parametrize("algorithm", ["acvmf", "acvmfu"])
@@ -75,3 +79,91 @@ def test_acvmf_optimizer_satisfies_constraints(seed):
     assert sample_nums[0] >= 1
     for sample in sample_nums[1:]:
         assert sample > sample_nums[0]
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvmfu", "acvis", "wrdiff"])
+def test_initial_guess_is_best_feasible_candidate(algorithm):
+    covariance = np.array([[1, 0.9, 0.6],
+                           [0.9, 1., 0.5],
+                           [0.6, 0.5, 1.]])
+    model_costs = np.array([1, 0.1, 0.01])
+    target_cost = 50
+    optimizer = Optimizer.get_algorithm(algorithm)(model_costs, covariance)
+    constraints = optimizer._get_constraints(target_cost)
+
+    def obj_func(ratios):
+        return optimizer._compute_objective_function(ratios, target_cost,
+                                                     gradient=False)
+
+    initial_guess = optimizer._get_initial_guess(constraints, obj_func)
+
+    assert satisfies_constraints(initial_guess, constraints)
+    for candidate in optimizer._get_initial_guess_candidates():
+        if satisfies_constraints(candidate, constraints):
+            assert obj_func(initial_guess) <= obj_func(candidate)
+
+
+def test_mfmc_initial_guess_matches_mfmc_sample_ratios():
+    covariance = np.array([[1, 0.9, 0.6],
+                           [0.9, 1., 0.5],
+                           [0.6, 0.5, 1.]])
+    model_costs = np.array([1, 0.1, 0.01])
+    optimizer = Optimizer.get_algorithm("acvmf")(model_costs, covariance)
+    mfmc = Optimizer.get_algorithm("mfmc")(model_costs, covariance)
+
+    np.testing.assert_array_almost_equal(
+            optimizer._get_mfmc_initial_guess(),
+            mfmc._calculate_sample_ratios()[1:])
+
+
+@pytest.mark.parametrize("solver", ["slsqp_nelder_mead", "slsqp",
+                                    "trust_constr", "trust_constr_bfgs"])
+def test_acvmf_solvers_satisfy_constraints(solver):
+    covariance = np.array([[1, 0.9, 0.6],
+                           [0.9, 1., 0.5],
+                           [0.6, 0.5, 1.]])
+    model_costs = np.array([1, 0.1, 0.01])
+    target_cost = 50
+    optimizer = Optimizer(model_costs, covariance)
+
+    opt_result = optimizer.optimize("acvmf", target_cost, solver=solver)
+    default_result = optimizer.optimize("acvmf", target_cost)
+
+    sample_nums = np.cumsum(opt_result.allocation.compressed_allocation[:, 0])
+    assert sample_nums[0] >= 1
+    assert opt_result.cost <= target_cost
+    assert opt_result.variance < 1.1 * default_result.variance
+
+
+@pytest.mark.parametrize("hessian_failure",
+                         [RuntimeError("singular"),
+                          np.full((2, 2), np.nan)])
+def test_trust_constr_falls_back_to_bfgs_if_hessian_fails(mocker,
+                                                          hessian_failure):
+    covariance = np.array([[1, 0.9, 0.6],
+                           [0.9, 1., 0.5],
+                           [0.6, 0.5, 1.]])
+    model_costs = np.array([1, 0.1, 0.01])
+    optimizer = Optimizer(model_costs, covariance)
+    bfgs_result = optimizer.optimize("acvmf", 50, solver="trust_constr_bfgs")
+    if isinstance(hessian_failure, Exception):
+        mocker.patch.object(ACVOptimizer, "_compute_objective_hessian",
+                            side_effect=hessian_failure)
+    else:
+        mocker.patch.object(ACVOptimizer, "_compute_objective_hessian",
+                            return_value=hessian_failure)
+
+    with pytest.warns(UserWarning, match="Hessian"):
+        result = optimizer.optimize("acvmf", 50, solver="trust_constr")
+
+    assert result.cost <= 50
+    assert result.variance == pytest.approx(bfgs_result.variance)
+
+
+def test_unknown_solver_raises_error():
+    covariance = np.array([[1, 0.9], [0.9, 1]])
+    model_costs = np.array([1, 0.1])
+    optimizer = Optimizer(model_costs, covariance)
+
+    with pytest.raises(ValueError):
+        optimizer.optimize("acvmf", 10, solver="not_a_solver")
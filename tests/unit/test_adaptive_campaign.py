@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+from mxmc import Estimator
+from mxmc.evaluation import AdaptiveCampaign, ModelEvaluator
+from mxmc.optimizers.approximate_control_variates.recursion_enumerator \
+    import RecursionEnumerator
+from mxmc.util.batch_costs import get_total_cost
+
+MODEL_COSTS = np.array([1, 0.1, 0.01])
+
+
+def hifi_model(inputs):
+    return np.sin(inputs[:, 0])
+
+
+def medfi_model(inputs):
+    return np.sin(inputs[:, 0]) + 0.1 * inputs[:, 0] ** 2
+
+
+def lofi_model(inputs):
+    return inputs[:, 0]
+
+
+MODELS = [hifi_model, medfi_model, lofi_model]
+
+
+def sample_generator(num_samples):
+    return np.random.uniform(-2, 2, (num_samples, 1))
+
+
+@pytest.fixture
+def campaign_factory():
+    def make_campaign(algorithm="acvmf", target_cost=300, **kwargs):
+        np.random.seed(0)
+        pilot_inputs = sample_generator(20)
+        pilot_outputs = [model(pilot_inputs) for model in MODELS]
+        return AdaptiveCampaign(MODEL_COSTS, sample_generator, algorithm,
+                                target_cost, pilot_inputs, pilot_outputs,
+                                **kwargs)
+    return make_campaign
+
+
+@pytest.fixture
+def evaluator():
+    return ModelEvaluator(MODELS, MODEL_COSTS, max_workers=1)
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "acvkl"])
+def test_campaign_spends_budget_and_estimates(campaign_factory, evaluator,
+                                              algorithm):
+    campaign = campaign_factory(algorithm)
+    estimate = campaign.run(evaluator)
+
+    assert 300 - np.sum(MODEL_COSTS) <= campaign.spent_cost <= 300
+    allocation = campaign.allocation
+    np.testing.assert_array_equal(allocation.compressed_allocation[0],
+                                  [20, 1, 1, 1, 1, 1])
+    for i, outputs in enumerate(campaign.outputs):
+        model_inputs = campaign.inputs[
+                allocation.get_sample_indices_for_model(i)]
+        np.testing.assert_array_almost_equal(outputs,
+                                             MODELS[i](model_inputs))
+    expected = Estimator(allocation, campaign.get_covariance()) \
+        .get_estimate(campaign.outputs)
+    assert estimate == pytest.approx(expected)
+
+
+def test_evaluated_samples_are_kept_between_stages(campaign_factory,
+                                                   evaluator):
+    campaign = campaign_factory(num_stages=3)
+
+    num_batches = 0
+    batch = campaign.next_batch()
+    while batch is not None:
+        previous_groups = campaign.allocation.compressed_allocation
+        campaign.submit(evaluator.evaluate(batch.allocation, batch.inputs))
+        groups = campaign.allocation.compressed_allocation
+        np.testing.assert_array_equal(groups[:len(previous_groups)],
+                                      previous_groups)
+        np.testing.assert_array_equal(groups[len(previous_groups):],
+                                      batch.allocation.compressed_allocation)
+        num_batches += 1
+        batch = campaign.next_batch()
+
+    assert num_batches == 3
+    assert campaign.is_complete()
+
+
+def test_small_covariance_changes_reuse_cached_ratios():
+    np.random.seed(0)
+    models = [hifi_model, lofi_model]
+    model_costs = np.array([1, 0.01])
+    pilot_inputs = sample_generator(20)
+    campaign = AdaptiveCampaign(model_costs, sample_generator, "acvmf", 300,
+                                pilot_inputs,
+                                [model(pilot_inputs) for model in models],
+                                reoptimize_tolerance=np.inf)
+    campaign.run(ModelEvaluator(models, model_costs, max_workers=1))
+
+    assert campaign.num_optimizations == 1
+    assert campaign.is_complete()
+
+
+def test_recursion_structure_is_enumerated_once(campaign_factory, evaluator,
+                                                mocker):
+    enumeration = mocker.spy(RecursionEnumerator, "optimize")
+    campaign = campaign_factory("acvkl", reoptimize_tolerance=0.)
+    campaign.run(evaluator)
+
+    assert enumeration.call_count == 1
+    assert campaign.num_optimizations == 4
+
+
+def test_batches_must_alternate_with_outputs(campaign_factory, evaluator):
+    campaign = campaign_factory()
+    with pytest.raises(RuntimeError):
+        campaign.submit([])
+
+    batch = campaign.next_batch()
+    with pytest.raises(RuntimeError):
+        campaign.next_batch()
+    with pytest.raises(ValueError):
+        campaign.submit([np.zeros(1)] * 3)
+    campaign.submit(evaluator.evaluate(batch.allocation, batch.inputs))
+
+
+def test_non_acv_algorithm_raises_error(campaign_factory):
+    with pytest.raises(ValueError):
+        campaign_factory("mfmc")
+
+
+def test_num_workers_raises_error(campaign_factory):
+    with pytest.raises(ValueError):
+        campaign_factory(num_workers=4)
+
+
+def test_campaign_with_setup_costs_stays_within_budget(campaign_factory,
+                                                       evaluator):
+    setup_costs = np.array([50., 20., 5.])
+    campaign = campaign_factory(target_cost=1000, setup_costs=setup_costs)
+
+    exact_cost = get_total_cost(
+            campaign.allocation.get_number_of_samples_per_model(),
+            MODEL_COSTS, setup_costs)
+    batch = campaign.next_batch()
+    while batch is not None:
+        exact_cost += get_total_cost(
+                batch.allocation.get_number_of_samples_per_model(),
+                MODEL_COSTS, setup_costs)
+        campaign.submit(evaluator.evaluate(batch.allocation, batch.inputs))
+        batch = campaign.next_batch()
+
+    assert campaign.spent_cost == pytest.approx(exact_cost)
+    assert exact_cost <= 1000
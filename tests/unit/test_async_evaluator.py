@@ -0,0 +1,175 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from mxmc.evaluation import AsyncModelEvaluator, CampaignStore
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+
+
+class LocalModelServer:
+    '''
+    Stand-in for a local simulation server: answers JSON requests holding a
+    batch of input samples with the scaled sums of the samples after a
+    short delay, and records the largest number of concurrent requests.
+    '''
+    def __init__(self, scale, delay=0.01):
+        self.scale = scale
+        self.delay = delay
+        self.active_requests = 0
+        self.max_active_requests = 0
+        self._server = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1",
+                                                  0)
+        return self
+
+    async def __aexit__(self, *_):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        inputs = np.array(json.loads(await reader.readline()))
+        self.active_requests += 1
+        self.max_active_requests = max(self.max_active_requests,
+                                       self.active_requests)
+        await asyncio.sleep(self.delay)
+        self.active_requests -= 1
+        outputs = self.scale * np.sum(inputs, axis=1)
+        writer.write((json.dumps(outputs.tolist()) + "\n").encode())
+        await writer.drain()
+        writer.close()
+
+
+class ModelClient:
+
+    def __init__(self, port):
+        self._port = port
+
+    async def __call__(self, inputs):
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self._port)
+        writer.write((json.dumps(inputs.tolist()) + "\n").encode())
+        await writer.drain()
+        outputs = json.loads(await reader.readline())
+        writer.close()
+        await writer.wait_closed()
+        return np.array(outputs)
+
+
+@pytest.fixture
+def allocation():
+    compressed_allocation = np.array([[2, 1, 1, 1, 0, 0],
+                                      [3, 0, 1, 0, 1, 1],
+                                      [5, 0, 0, 0, 0, 1]])
+    return ACVSampleAllocation(compressed_allocation)
+
+
+@pytest.fixture
+def all_samples():
+    np.random.seed(0)
+    return np.random.random((10, 2))
+
+
+def expected_outputs(allocation, all_samples, scales):
+    return [scale * np.sum(inputs, axis=1) for scale, inputs
+            in zip(scales, allocation.allocate_samples_to_models(all_samples))]
+
+
+def test_outputs_from_local_servers_respect_concurrency_limits(
+        allocation, all_samples):
+    scales = [1., 2., 3.]
+    max_concurrency = [1, 2, 3]
+
+    async def run():
+        servers = [LocalModelServer(scale) for scale in scales]
+        for server in servers:
+            await server.__aenter__()
+        try:
+            evaluator = AsyncModelEvaluator(
+                    [ModelClient(server.port) for server in servers],
+                    max_concurrency=max_concurrency, batch_size=1)
+            outputs = await evaluator.evaluate_async(allocation, all_samples)
+        finally:
+            for server in servers:
+                await server.__aexit__()
+        return outputs, servers
+
+    outputs, servers = asyncio.run(run())
+
+    for output, expected in zip(outputs, expected_outputs(allocation,
+                                                          all_samples,
+                                                          scales)):
+        np.testing.assert_array_almost_equal(output, expected)
+    for server, limit in zip(servers, max_concurrency):
+        assert server.max_active_requests == limit
+
+
+def test_synchronous_evaluation_streams_into_store(tmp_path, allocation,
+                                                   all_samples):
+    async def model(inputs):
+        await asyncio.sleep(0)
+        return np.sum(inputs, axis=1)
+
+    store = CampaignStore(str(tmp_path / "campaign.h5"), allocation,
+                          all_samples)
+    evaluator = AsyncModelEvaluator([model] * 3, max_concurrency=2,
+                                    batch_size=2)
+
+    outputs = evaluator.evaluate(allocation, all_samples, store)
+
+    assert store.is_complete()
+    for output, expected in zip(outputs, expected_outputs(allocation,
+                                                          all_samples,
+                                                          [1, 1, 1])):
+        np.testing.assert_array_almost_equal(output, expected)
+
+
+def test_slow_consumer_limits_pending_evaluations(allocation, all_samples):
+    num_calls = 0
+
+    async def model(sample):
+        nonlocal num_calls
+        num_calls += 1
+        await asyncio.sleep(0)
+        return np.sum(sample)
+
+    async def run():
+        evaluator = AsyncModelEvaluator([model] * 3, batch_size=1,
+                                        batched=False, max_pending=1)
+        results = evaluator.iter_evaluations_async(allocation, all_samples)
+        await results.__anext__()
+        await asyncio.sleep(0.05)
+        calls_while_waiting = num_calls
+        await results.aclose()
+        return calls_while_waiting
+
+    calls_while_waiting = asyncio.run(run())
+
+    num_samples = np.sum(allocation.get_number_of_samples_per_model())
+    assert calls_while_waiting < num_samples
+    # one call in flight per model, one pending batch and the consumed one
+    assert calls_while_waiting <= 3 + 1 + 1
+
+
+def test_model_errors_are_raised(allocation, all_samples):
+    async def failing_model(inputs):
+        raise RuntimeError("server unavailable")
+
+    async def model(inputs):
+        return np.sum(inputs, axis=1)
+
+    evaluator = AsyncModelEvaluator([model, failing_model, model])
+    with pytest.raises(RuntimeError):
+        evaluator.evaluate(allocation, all_samples)
+
+
+def test_non_positive_concurrency_raises_error():
+    with pytest.raises(ValueError):
+        AsyncModelEvaluator([None, None], max_concurrency=[1, 0])
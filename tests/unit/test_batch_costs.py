@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from mxmc import Estimator, Optimizer
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+from mxmc.util.batch_costs import get_samples_per_model, get_total_cost
+
+ALGORITHMS = ["mfmc", "mlmc", "acvmf", "acvmfu", "acvis", "wrdiff", "acvkl",
+              "gmfmr", "gismr", "grdmr"]
+
+
+@pytest.fixture
+def model_costs():
+    return np.array([1, 0.05, 0.01])
+
+
+@pytest.fixture
+def setup_costs():
+    return np.array([5., 2., 3.])
+
+
+@pytest.fixture
+def batch_sizes():
+    return np.array([10, 50, 1000])
+
+
+def test_total_cost_counts_setup_of_every_batch(model_costs, setup_costs,
+                                                batch_sizes):
+    cost = get_total_cost([25, 50, 0], model_costs, setup_costs,
+                          batch_sizes)
+
+    assert cost == pytest.approx(25 * 1 + 50 * 0.05 + 3 * 5. + 1 * 2.)
+
+
+def test_unlimited_batches_cost_one_setup_per_model(model_costs,
+                                                    setup_costs):
+    cost = get_total_cost([[25, 50, 100], [1, 0, 0]], model_costs,
+                          setup_costs)
+
+    np.testing.assert_array_almost_equal(cost, [25 + 2.5 + 1 + 10, 1 + 5])
+
+
+def test_total_cost_without_setup_costs_is_sample_cost(model_costs):
+    cost = get_total_cost([25, 50, 100], model_costs)
+
+    assert cost == pytest.approx(np.dot([25, 50, 100], model_costs))
+
+
+@pytest.mark.parametrize("setup_costs, batch_sizes",
+                         [([1., 1.], None), ([1., 1., -1.], None),
+                          (None, [10, 0, 10])])
+def test_invalid_batch_costs_raise_error(model_costs, three_model_covariance,
+                                         setup_costs, batch_sizes):
+    with pytest.raises(ValueError):
+        get_total_cost([1, 1, 1], model_costs, setup_costs, batch_sizes)
+    with pytest.raises(ValueError):
+        Optimizer(model_costs, three_model_covariance,
+                  setup_costs=setup_costs,
+                  batch_sizes=batch_sizes).optimize("acvmf", 100)
+
+
+def test_samples_per_model_of_compressed_allocations():
+    compressed_allocation = np.array([[10, 1, 1, 1, 0, 0],
+                                      [20, 0, 0, 1, 1, 1],
+                                      [30, 0, 0, 0, 0, 1]])
+    allocation = ACVSampleAllocation(compressed_allocation)
+
+    np.testing.assert_array_equal(
+            get_samples_per_model(compressed_allocation),
+            allocation.get_number_of_samples_per_model())
+    np.testing.assert_array_equal(
+            get_samples_per_model(np.stack([compressed_allocation] * 2)),
+            [[10, 30, 50]] * 2)
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_cost_of_allocation_includes_batch_setup(algorithm, model_costs,
+                                                 setup_costs, batch_sizes,
+                                                 three_model_covariance):
+    result = Optimizer(model_costs, three_model_covariance,
+                       setup_costs=setup_costs,
+                       batch_sizes=batch_sizes).optimize(algorithm, 200)
+
+    samples_per_model = result.allocation.get_number_of_samples_per_model()
+    expected_cost = get_total_cost(samples_per_model, model_costs,
+                                   setup_costs, batch_sizes)
+    assert np.sum(result.cost) == pytest.approx(expected_cost)
+    assert np.sum(result.cost) <= 200
+    estimator = Estimator(result.allocation, three_model_covariance)
+    assert estimator.approximate_variance \
+        == pytest.approx(np.sum(result.variance))
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_zero_setup_costs_do_not_change_allocation(algorithm, model_costs,
+                                                   three_model_covariance):
+    result = Optimizer(model_costs, three_model_covariance).optimize(
+            algorithm, 200)
+    batch_result = Optimizer(model_costs, three_model_covariance,
+                             setup_costs=np.zeros(3),
+                             batch_sizes=[1, 1, 1]).optimize(algorithm, 200)
+
+    np.testing.assert_array_equal(
+            batch_result.allocation.compressed_allocation,
+            result.allocation.compressed_allocation)
+    assert np.sum(batch_result.cost) == pytest.approx(np.sum(result.cost))
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "acvkl"])
+def test_smaller_batches_lower_the_number_of_samples(algorithm, model_costs,
+                                                     setup_costs,
+                                                     three_model_covariance):
+    large_batch_result = Optimizer(
+            model_costs, three_model_covariance, setup_costs=setup_costs,
+            batch_sizes=[100, 1000, 1000]).optimize(algorithm, 200)
+    small_batch_result = Optimizer(
+            model_costs, three_model_covariance, setup_costs=setup_costs,
+            batch_sizes=[5, 1000, 1000]).optimize(algorithm, 200)
+
+    assert small_batch_result.allocation.get_number_of_samples_per_model()[0] \
+        < large_batch_result.allocation.get_number_of_samples_per_model()[0]
+    assert small_batch_result.variance > large_batch_result.variance
+
+
+def test_model_selection_drops_model_with_large_setup_cost(
+        model_costs, three_model_covariance):
+    result = Optimizer(model_costs, three_model_covariance,
+                       setup_costs=[0., 0., 150.]).optimize(
+            "acvmf", 200, auto_model_selection=True)
+
+    samples_per_model = result.allocation.get_number_of_samples_per_model()
+    assert samples_per_model[2] == 0
+    assert result.cost <= 200
+
+
+@pytest.mark.parametrize("algorithm", ["mfmc", "acvmf", "acvkl"])
+def test_optimize_for_variance_with_setup_costs(algorithm, model_costs,
+                                                setup_costs, batch_sizes,
+                                                three_model_covariance):
+    result = Optimizer(model_costs, three_model_covariance,
+                       setup_costs=setup_costs,
+                       batch_sizes=batch_sizes).optimize_for_variance(
+            algorithm, 0.02)
+
+    samples_per_model = result.allocation.get_number_of_samples_per_model()
+    assert np.sum(result.variance) <= 0.02
+    assert np.sum(result.cost) == pytest.approx(
+            get_total_cost(samples_per_model, model_costs, setup_costs,
+                           batch_sizes))
+
+
+def test_target_cost_below_setup_costs_is_invalid(model_costs, setup_costs,
+                                                  three_model_covariance):
+    result = Optimizer(model_costs, three_model_covariance,
+                       setup_costs=setup_costs).optimize("acvmf", 10)
+
+    assert result.variance == np.inf
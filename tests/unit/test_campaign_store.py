@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from mxmc import Estimator, OutputProcessor
+from mxmc.evaluation import CampaignStore, ModelEvaluator
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+from mxmc.util.read_sample_allocation import read_sample_allocation
+
+
+def sum_model(inputs):
+    return np.sum(inputs, axis=1)
+
+
+def product_model(inputs):
+    return np.prod(inputs, axis=1)
+
+
+@pytest.fixture
+def allocation():
+    compressed_allocation = np.array([[2, 1, 1, 1, 0, 0],
+                                      [3, 0, 1, 0, 1, 1],
+                                      [5, 0, 0, 0, 0, 1]])
+    return ACVSampleAllocation(compressed_allocation)
+
+
+@pytest.fixture
+def all_samples():
+    np.random.seed(0)
+    return np.random.random((10, 2))
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "campaign.h5")
+
+
+def test_new_store_has_no_completed_evaluations(store_path, allocation,
+                                                all_samples):
+    store = CampaignStore(store_path, allocation, all_samples)
+
+    assert not store.is_complete()
+    for model in range(3):
+        np.testing.assert_array_equal(
+                store.get_pending_sample_indices(model),
+                allocation.get_sample_indices_for_model(model))
+    np.testing.assert_array_equal(store.all_samples, all_samples)
+
+
+def test_store_file_contains_readable_allocation(store_path, allocation,
+                                                 all_samples):
+    CampaignStore(store_path, allocation, all_samples)
+    stored_allocation = read_sample_allocation(store_path)
+    np.testing.assert_array_equal(stored_allocation.compressed_allocation,
+                                  allocation.compressed_allocation)
+
+
+def test_written_outputs_are_stored_in_model_sample_order(
+        store_path, allocation, all_samples):
+    store = CampaignStore(store_path, allocation, all_samples)
+    store.write_outputs(2, [7, 2], [70., 20.])
+
+    outputs = CampaignStore(store_path).get_model_outputs()[2]
+
+    assert outputs[0] == 20.
+    assert outputs[5] == 70.
+    assert np.sum(np.isnan(outputs)) == 6
+    np.testing.assert_array_equal(store.get_pending_sample_indices(2),
+                                  [3, 4, 5, 6, 8, 9])
+
+
+def test_writing_unallocated_samples_raises_error(store_path, allocation,
+                                                  all_samples):
+    store = CampaignStore(store_path, allocation, all_samples)
+    with pytest.raises(ValueError):
+        store.write_outputs(0, [4], [1.])
+
+
+def test_resuming_with_different_allocation_raises_error(
+        store_path, allocation, all_samples):
+    CampaignStore(store_path, allocation, all_samples)
+    other_allocation = ACVSampleAllocation(np.array([[10, 1, 1, 1, 0, 1]]))
+    with pytest.raises(ValueError):
+        CampaignStore(store_path, other_allocation)
+
+
+def test_creating_store_without_allocation_raises_error(store_path):
+    with pytest.raises(ValueError):
+        CampaignStore(store_path)
+
+
+def test_evaluation_resumes_from_completed_outputs(
+        mocker, store_path, allocation, all_samples):
+    store = CampaignStore(store_path, allocation, all_samples)
+    hifi_indices = allocation.get_sample_indices_for_model(0)
+    store.write_outputs(0, hifi_indices, sum_model(all_samples[hifi_indices]))
+    hifi_model = mocker.Mock(side_effect=sum_model)
+    evaluator = ModelEvaluator([hifi_model, product_model, sum_model])
+
+    resumed_store = CampaignStore(store_path)
+    outputs = evaluator.evaluate(resumed_store.sample_allocation,
+                                 resumed_store.all_samples, resumed_store)
+
+    hifi_model.assert_not_called()
+    assert resumed_store.is_complete()
+    model_inputs = allocation.allocate_samples_to_models(all_samples)
+    for model, inputs, output in zip([sum_model, product_model, sum_model],
+                                     model_inputs, outputs):
+        np.testing.assert_array_almost_equal(output, model(inputs))
+
+
+def test_estimator_and_output_processor_read_from_store(
+        store_path, allocation, all_samples):
+    store = CampaignStore(store_path, allocation, all_samples)
+    evaluator = ModelEvaluator([sum_model, product_model, sum_model])
+    outputs = evaluator.evaluate(allocation, all_samples, store)
+
+    covariance = OutputProcessor.compute_covariance_matrix(outputs,
+                                                           allocation)
+    np.testing.assert_array_almost_equal(
+            OutputProcessor.compute_covariance_matrix(store), covariance)
+
+    estimator = Estimator(allocation, np.array([[1, 0.5, 0.2],
+                                                [0.5, 1, 0.1],
+                                                [0.2, 0.1, 1]]))
+    assert estimator.get_estimate(store) \
+        == pytest.approx(estimator.get_estimate(outputs))
+
+
+def test_estimate_from_incomplete_store_raises_error(store_path, allocation,
+                                                     all_samples):
+    store = CampaignStore(store_path, allocation, all_samples)
+    estimator = Estimator(allocation, np.array([[1, 0.5, 0.2],
+                                                [0.5, 1, 0.1],
+                                                [0.2, 0.1, 1]]))
+    with pytest.raises(ValueError):
+        estimator.get_estimate(store)
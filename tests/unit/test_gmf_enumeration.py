@@ -1,10 +1,18 @@
 import numpy as np
 import pytest
+import torch
 
 from mxmc.optimizers.approximate_control_variates.generalized_multifidelity \
     import impl_optimizers
+from mxmc.optimizers.approximate_control_variates.generalized_multifidelity\
+    .gmf_batch import GMFBatchEvaluator
+from mxmc.optimizers.approximate_control_variates.generalized_multifidelity\
+    .gmf_ordered import GMFOrdered
+from mxmc.optimizers.approximate_control_variates.generalized_multifidelity\
+    .gmf_unordered import GMFUnordered
 from mxmc.optimizer import Optimizer
 from mxmc.optimizers.optimizer_base import OptimizationResult
+from mxmc.optimizers.optimizer_context import OptimizerContext
 
 
 @pytest.mark.parametrize("num_models, num_combinations", [(2, 1),
@@ -55,3 +63,192 @@ def test_mr_enumeration(mocker, num_models, num_combinations):
     _ = optimizer.optimize("gmfmr", target_cost)
 
     assert impl_optimizers.GMFUnordered.call_count == num_combinations
+
+
+@pytest.mark.parametrize("num_models, num_combinations", [(3, 3), (4, 16)])
+def test_warm_started_mr_enumeration_visits_all_structures(mocker, num_models,
+                                                           num_combinations):
+    covariance = np.random.random((num_models, num_models))
+    covariance *= covariance.transpose()
+    model_costs = np.arange(num_models, 0, -1)
+    optimizer = Optimizer(model_costs, covariance, warm_start=True)
+
+    mocked_optimizer = mocker.Mock()
+    mocked_optimizer.optimal_ratios = np.arange(2, num_models + 1)
+    dummy_samples = np.array([[1, 1] + [0]*(num_models*2-2)], dtype=int)
+    mocked_optimizer.optimize.return_value = OptimizationResult(10, 0.1,
+                                                                dummy_samples)
+    mocker.patch('mxmc.optimizers.approximate_control_variates.'
+                 'generalized_multifidelity.impl_optimizers.GMFUnordered',
+                 return_value=mocked_optimizer)
+
+    _ = optimizer.optimize("gmfmr", 100)
+
+    calls = impl_optimizers.GMFUnordered.call_args_list
+    visited = {tuple(call[1]["recursion_refs"]) for call in calls}
+    assert len(visited) == num_combinations
+    assert calls[0][1]["initial_guess"] is None
+    for call in calls[1:]:
+        np.testing.assert_array_equal(call[1]["initial_guess"],
+                                      np.arange(2, num_models + 1))
+
+
+@pytest.mark.parametrize("algorithm", ["gmfsr", "gmfmr", "acvkl"])
+@pytest.mark.parametrize("option", [{"initial_guess": [2, 3, 4]},
+                                    {"recursion_refs": [0, 1, 2]}])
+def test_enumeration_accepts_sub_optimizer_options(
+        algorithm, option, four_model_costs, four_model_covariance):
+    optimizer = Optimizer(four_model_costs, four_model_covariance)
+    result = optimizer.optimize(algorithm, 10, **option)
+    expected = optimizer.optimize(algorithm, 10)
+
+    assert result.variance <= expected.variance * (1 + 1e-2)
+
+
+def test_enumeration_seeds_sub_optimizers_with_initial_guess(mocker):
+    covariance = np.random.random((4, 4))
+    covariance *= covariance.transpose()
+    model_costs = np.arange(4, 0, -1)
+    optimizer = Optimizer(model_costs, covariance, initial_guess=[2, 3, 4])
+
+    mocked_optimizer = mocker.Mock()
+    dummy_samples = np.array([[1, 1] + [0]*6], dtype=int)
+    mocked_optimizer.optimize.return_value = OptimizationResult(10, 0.1,
+                                                                dummy_samples)
+    mocker.patch('mxmc.optimizers.approximate_control_variates.'
+                 'generalized_multifidelity.impl_optimizers.GMFUnordered',
+                 return_value=mocked_optimizer)
+
+    _ = optimizer.optimize("gmfmr", 100)
+
+    for call in impl_optimizers.GMFUnordered.call_args_list:
+        assert call[1]["initial_guess"] == [2, 3, 4]
+
+
+def test_warm_started_enumeration_matches_cold_start():
+    covariance = np.array([[1, 0.9, 0.8],
+                           [0.9, 1, 0.85],
+                           [0.8, 0.85, 1]])
+    model_costs = np.array([1, 0.1, 0.01])
+
+    cold_result = Optimizer(model_costs, covariance).optimize("gmfmr", 100)
+    warm_result = Optimizer(model_costs, covariance,
+                            warm_start=True).optimize("gmfmr", 100)
+
+    assert np.isclose(warm_result.variance, cold_result.variance, rtol=1e-2)
+
+
+@pytest.mark.parametrize("algorithm, sub_optimizer",
+                         [("gmfsr", "GMFUnordered"),
+                          ("gmfmr", "GMFUnordered"),
+                          ("acvkl", "GMFOrdered")])
+def test_screened_enumeration_fully_optimizes_only_best_structures(
+        mocker, algorithm, sub_optimizer):
+    num_models = 4
+    num_screened = 2
+    covariance = np.random.random((num_models, num_models))
+    covariance = np.dot(covariance.transpose(), covariance)
+    model_costs = np.power(10.0, -np.arange(num_models))
+    optimizer = Optimizer(model_costs, covariance, num_screened=num_screened)
+
+    mocked_optimizer = mocker.Mock()
+    dummy_samples = np.array([[1, 1] + [0]*(num_models*2-2)], dtype=int)
+    mocked_optimizer.optimize.return_value = OptimizationResult(10, 0.1,
+                                                                dummy_samples)
+    mocker.patch('mxmc.optimizers.approximate_control_variates.'
+                 'generalized_multifidelity.impl_optimizers.' + sub_optimizer,
+                 return_value=mocked_optimizer)
+
+    _ = optimizer.optimize(algorithm, 100)
+
+    calls = getattr(impl_optimizers, sub_optimizer).call_args_list
+    assert len(calls) == num_screened
+    for call in calls:
+        assert call[1]["initial_guess"].shape == (num_models - 1,)
+
+
+@pytest.mark.parametrize("ordered, sub_optimizer",
+                         [(False, GMFUnordered), (True, GMFOrdered)])
+def test_batch_evaluator_variances_match_sub_optimizers(ordered,
+                                                        sub_optimizer):
+    covariance = np.random.random((4, 4))
+    covariance = np.dot(covariance.transpose(), covariance)
+    model_costs = np.array([1, 0.1, 0.01, 0.001])
+    recursion_refs_list = [[0, 0, 0], [0, 1, 2], [0, 1, 1]]
+    ratios = np.array([[2., 3., 5.], [3., 4., 8.], [6., 2., 9.]])
+    target_cost = 50
+
+    context = OptimizerContext(model_costs, covariance)
+    evaluator = GMFBatchEvaluator(context, recursion_refs_list,
+                                  ordered=ordered)
+    batch_variances = evaluator.compute_variances(
+            torch.tensor(ratios, dtype=torch.double), target_cost)
+
+    expected_variances = []
+    for recursion_refs, sub_ratios in zip(recursion_refs_list, ratios):
+        opt = sub_optimizer(model_costs, covariance,
+                            recursion_refs=recursion_refs)
+        expected_variances.append(opt._compute_objective_function(
+                sub_ratios, target_cost, gradient=False))
+
+    np.testing.assert_array_almost_equal(batch_variances.numpy(),
+                                         expected_variances)
+
+
+@pytest.mark.parametrize("ordered, sub_optimizer",
+                         [(False, GMFUnordered), (True, GMFOrdered)])
+def test_batch_evaluator_variances_match_sub_optimizers_with_workers(
+        ordered, sub_optimizer):
+    covariance = np.random.random((4, 4))
+    covariance = np.dot(covariance.transpose(), covariance)
+    model_costs = np.array([1, 0.1, 0.01, 0.001])
+    recursion_refs_list = [[0, 0, 0], [0, 1, 2], [0, 1, 1]]
+    ratios = np.array([[2., 3., 5.], [3., 4., 8.], [6., 2., 9.]])
+    target_cost = 5
+    num_workers = 4
+
+    context = OptimizerContext(model_costs, covariance)
+    evaluator = GMFBatchEvaluator(context, recursion_refs_list,
+                                  ordered=ordered)
+    max_model_evals = num_workers * np.floor(target_cost / model_costs)
+    batch_variances = evaluator.compute_variances(
+            torch.tensor(ratios, dtype=torch.double),
+            num_workers * target_cost, max_model_evals)
+
+    expected_variances = []
+    for recursion_refs, sub_ratios in zip(recursion_refs_list, ratios):
+        opt = sub_optimizer(model_costs, covariance,
+                            recursion_refs=recursion_refs,
+                            num_workers=num_workers)
+        expected_variances.append(opt._compute_objective_function(
+                sub_ratios, target_cost, gradient=False))
+
+    np.testing.assert_array_almost_equal(batch_variances.numpy(),
+                                         expected_variances)
+
+
+def test_screened_enumeration_close_to_full_enumeration():
+    covariance = np.array([[1, 0.9, 0.8, 0.7],
+                           [0.9, 1, 0.85, 0.75],
+                           [0.8, 0.85, 1, 0.8],
+                           [0.7, 0.75, 0.8, 1]])
+    model_costs = np.array([1, 0.1, 0.01, 0.001])
+
+    full_result = Optimizer(model_costs, covariance).optimize("gmfsr", 100)
+    screened_result = Optimizer(model_costs, covariance,
+                                num_screened=3).optimize("gmfsr", 100)
+
+    assert screened_result.variance <= full_result.variance * 1.05
+
+
+@pytest.mark.parametrize("algorithm", ["gmfsr", "acvkl"])
+@pytest.mark.parametrize("num_screened", [0, -1])
+def test_non_positive_num_screened_raises_error(algorithm, num_screened):
+    covariance = np.array([[1, 0.9, 0.8],
+                           [0.9, 1, 0.85],
+                           [0.8, 0.85, 1]])
+    model_costs = np.array([1, 0.1, 0.01])
+    optimizer = Optimizer(model_costs, covariance, num_screened=num_screened)
+
+    with pytest.raises(ValueError):
+        optimizer.optimize(algorithm, 100)
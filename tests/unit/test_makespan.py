@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from mxmc import Optimizer
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+from mxmc.util.makespan import schedule_allocation
+
+MODEL_COSTS = np.array([10, 0.3, 0.02])
+
+
+@pytest.fixture
+def allocation():
+    return ACVSampleAllocation(np.array([[5, 1, 1, 1, 1, 1],
+                                         [20, 0, 0, 1, 0, 1],
+                                         [60, 0, 0, 0, 0, 1]]))
+
+
+@pytest.mark.parametrize("num_workers", [1, 3, 8, 100])
+def test_schedule_runs_every_evaluation_once_without_overlaps(allocation,
+                                                              num_workers):
+    schedule = schedule_allocation(allocation, MODEL_COSTS, num_workers)
+
+    samples_per_model = allocation.get_number_of_samples_per_model()
+    intervals = [[] for _ in range(num_workers)]
+    for i, cost in enumerate(MODEL_COSTS):
+        assert len(schedule.workers[i]) == samples_per_model[i]
+        for worker, start in zip(schedule.workers[i],
+                                 schedule.start_times[i]):
+            intervals[worker].append((start, start + cost))
+
+    end_times = []
+    for worker_intervals in intervals:
+        worker_intervals.sort()
+        for (_, end), (start, _) in zip(worker_intervals[:-1],
+                                        worker_intervals[1:]):
+            assert start >= end - 1e-12
+        end_times += [end for _, end in worker_intervals]
+    assert schedule.makespan == pytest.approx(max(end_times))
+
+
+@pytest.mark.parametrize("num_workers", [1, 3, 8, 100])
+def test_schedule_makespan_bounds(allocation, num_workers):
+    schedule = schedule_allocation(allocation, MODEL_COSTS, num_workers)
+
+    total_cost = np.dot(allocation.get_number_of_samples_per_model(),
+                        MODEL_COSTS)
+    lower_bound = max(total_cost / num_workers, np.max(MODEL_COSTS))
+    assert lower_bound - 1e-12 <= schedule.makespan <= 4 / 3 * lower_bound
+
+
+def test_single_worker_makespan_is_total_cost(allocation):
+    schedule = schedule_allocation(allocation, MODEL_COSTS, 1)
+
+    total_cost = np.dot(allocation.get_number_of_samples_per_model(),
+                        MODEL_COSTS)
+    assert schedule.makespan == pytest.approx(total_cost)
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "acvkl"])
+@pytest.mark.parametrize("num_workers", [4, 8])
+def test_num_workers_limits_evaluations_to_makespan(algorithm, num_workers,
+                                                    three_model_covariance):
+    result = Optimizer(MODEL_COSTS, three_model_covariance).optimize(
+            algorithm, 25, num_workers=num_workers)
+
+    samples_per_model = result.allocation.get_number_of_samples_per_model()
+    assert samples_per_model[0] <= num_workers * 2
+    assert result.cost <= num_workers * 25
+    schedule = schedule_allocation(result.allocation, MODEL_COSTS,
+                                   num_workers)
+    assert schedule.makespan <= 25 * 4 / 3
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "acvkl"])
+@pytest.mark.parametrize("target_variance", [0.08, 0.15])
+@pytest.mark.parametrize("num_workers", [4, 8])
+def test_makespan_result_meets_variance_with_shorter_schedule(
+        algorithm, target_variance, num_workers, three_model_covariance):
+    optimizer = Optimizer(MODEL_COSTS, three_model_covariance)
+    result = optimizer.optimize_for_makespan(algorithm, target_variance,
+                                             num_workers)
+    serial_result = optimizer.optimize_for_variance(algorithm,
+                                                    target_variance)
+    serial_schedule = schedule_allocation(serial_result.allocation,
+                                          MODEL_COSTS, num_workers)
+
+    assert result.variance <= target_variance
+    assert result.schedule.makespan <= serial_schedule.makespan
+    assert result.cost == pytest.approx(
+            np.dot(result.allocation.get_number_of_samples_per_model(),
+                   MODEL_COSTS))
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "gmfmr", "acvkl", "gismr",
+                                       "grdmr"])
+def test_enumerators_accept_makespan_below_serial_cost(
+        algorithm, four_model_costs, four_model_covariance):
+    result = Optimizer(four_model_costs, four_model_covariance).optimize(
+            algorithm, 1.05, num_workers=4)
+
+    assert np.isfinite(result.variance)
+    assert result.cost <= 4 * 1.05
+
+
+def test_makespan_with_non_acv_algorithm_raises_error(three_model_covariance):
+    with pytest.raises(ValueError):
+        Optimizer(MODEL_COSTS, three_model_covariance).optimize_for_makespan(
+                "mfmc", 0.1, 4)
+
+
+@pytest.mark.parametrize("num_workers", [0, -2])
+def test_invalid_num_workers_raises_error(allocation, three_model_covariance,
+                                          num_workers):
+    with pytest.raises(ValueError):
+        schedule_allocation(allocation, MODEL_COSTS, num_workers)
+    with pytest.raises(ValueError):
+        Optimizer(MODEL_COSTS, three_model_covariance).optimize(
+                "acvmf", 25, num_workers=num_workers)
@@ -56,3 +56,22 @@ def test_mfmc_with_model_selection_no_best_result(mocker):
     expected_sample_array = np.array([[1, 1, 0, 0]], dtype=int)
     assert_opt_result_equal(opt_result, expected_cost, expected_variance,
                             expected_sample_array)
+
+
+def test_mfmc_array_of_target_costs_matches_individual_costs(
+        three_model_costs, three_model_covariance):
+    optimizer = Optimizer.get_algorithm("mfmc")(three_model_costs,
+                                                three_model_covariance)
+    target_costs = np.array([0.5, 10, 100, 1000])
+
+    results = optimizer.optimize(target_costs)
+
+    assert len(results) == len(target_costs)
+    for result, target_cost in zip(results, target_costs):
+        expected = optimizer.optimize(target_cost)
+        assert np.isclose(result.cost, expected.cost)
+        np.testing.assert_array_almost_equal(result.variance,
+                                             expected.variance)
+        np.testing.assert_array_equal(
+                result.allocation.compressed_allocation,
+                expected.allocation.compressed_allocation)
@@ -202,3 +202,29 @@ def test_mlmc_with_model_selection_zero_q():
 
         assert len(warning_log) == 1
         assert issubclass(warning_log[-1].category, UserWarning)
+
+
+def test_mlmc_array_of_target_costs_matches_individual_costs():
+    model_costs = np.array([11, 5, 3, 1])
+    covariance = np.array([[0.75, 1, dummy_var, dummy_var],
+                           [1, 1.5, 1, dummy_var],
+                           [dummy_var, 1, 1, 2],
+                           [dummy_var, dummy_var, 2, 4]])
+    covariance = np.dstack([covariance, 2 * covariance])
+    optimizer = Optimizer.get_algorithm("mlmc")(model_costs, covariance)
+    target_costs = np.array([0.5, 24, 48, 1000])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        results = optimizer.optimize(target_costs)
+        expected_results = [optimizer.optimize(target_cost)
+                            for target_cost in target_costs]
+
+    assert len(results) == len(target_costs)
+    for result, expected in zip(results, expected_results):
+        assert np.isclose(result.cost, expected.cost)
+        np.testing.assert_array_almost_equal(result.variance,
+                                             expected.variance)
+        np.testing.assert_array_equal(
+                result.allocation.compressed_allocation,
+                expected.allocation.compressed_allocation)
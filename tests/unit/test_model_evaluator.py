@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import mxmc
+from mxmc.evaluation import Model, ModelEvaluator, evaluate_model
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+
+
+def sum_model(inputs):
+    return np.sum(inputs, axis=1)
+
+
+def product_model(inputs):
+    return np.prod(inputs, axis=1)
+
+
+class ScalarDifferenceModel(Model):
+    batched = False
+
+    def evaluate(self, inputs):
+        assert inputs.ndim == 1
+        return np.array([inputs[0] - inputs[1]])
+
+
+@pytest.fixture
+def allocation():
+    compressed_allocation = np.array([[2, 1, 1, 1, 0, 0],
+                                      [3, 0, 1, 0, 1, 1],
+                                      [5, 0, 0, 0, 0, 1]])
+    return ACVSampleAllocation(compressed_allocation)
+
+
+@pytest.fixture
+def all_samples():
+    np.random.seed(0)
+    return np.random.random((10, 2))
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+@pytest.mark.parametrize("max_workers", [1, 2])
+@pytest.mark.parametrize("batch_size", [None, 1, 4])
+def test_outputs_match_serial_evaluation(allocation, all_samples, executor,
+                                         max_workers, batch_size):
+    models = [sum_model, product_model, sum_model]
+    evaluator = ModelEvaluator(models, np.array([1, 0.1, 0.01]),
+                               executor=executor, max_workers=max_workers,
+                               batch_size=batch_size)
+
+    outputs = evaluator.evaluate(allocation, all_samples)
+
+    model_inputs = allocation.allocate_samples_to_models(all_samples)
+    for model, inputs, output in zip(models, model_inputs, outputs):
+        np.testing.assert_array_equal(output, model(inputs))
+
+
+def test_each_sample_evaluated_once(mocker, allocation, all_samples):
+    model = mocker.Mock(side_effect=sum_model)
+    evaluator = ModelEvaluator([model, sum_model, sum_model], batch_size=1,
+                               max_workers=2)
+
+    evaluator.evaluate(allocation, all_samples)
+
+    evaluated = sorted(tuple(call.args[0][0]) for call in model.call_args_list)
+    expected = sorted(tuple(sample) for sample in all_samples[:2])
+    assert evaluated == expected
+
+
+def test_batches_scheduled_most_expensive_first(allocation):
+    evaluator = ModelEvaluator([sum_model] * 3, np.array([1, 10, 100]),
+                               batch_size=2)
+    model_indices = [np.arange(2), np.arange(5), np.arange(10)]
+
+    batches = evaluator._get_batches(model_indices)
+
+    costs = [len(indices) * evaluator._model_costs[model]
+             for model, indices in batches]
+    assert costs == sorted(costs, reverse=True)
+    assert batches[0][0] == 2
+
+
+def test_unbatched_models_called_per_sample(allocation, all_samples):
+    def single_sample_model(sample):
+        return np.array([sample[0] - sample[1]])
+
+    evaluator = ModelEvaluator([single_sample_model] * 3, batched=False)
+    outputs = evaluator.evaluate(allocation, all_samples)
+
+    expected = all_samples[:, 0] - all_samples[:, 1]
+    for model_index, output in enumerate(outputs):
+        indices = allocation.get_sample_indices_for_model(model_index)
+        np.testing.assert_array_almost_equal(output, expected[indices])
+
+
+@pytest.mark.parametrize("kwargs", [{"executor": "mpi"}, {"max_workers": 0},
+                                    {"batch_size": 0},
+                                    {"model_costs": np.ones(2)}])
+def test_invalid_settings_raise_error(kwargs):
+    with pytest.raises(ValueError):
+        ModelEvaluator([sum_model] * 3, **kwargs)
+
+
+def test_too_few_samples_raises_error(allocation, all_samples):
+    evaluator = ModelEvaluator([sum_model] * 3)
+    with pytest.raises(ValueError):
+        evaluator.evaluate(allocation, all_samples[:5])
+
+
+def test_declared_batch_capability_of_models(allocation, all_samples):
+    models = [ScalarDifferenceModel(), sum_model, ScalarDifferenceModel()]
+    evaluator = ModelEvaluator(models, max_workers=1)
+
+    outputs = evaluator.evaluate(allocation, all_samples)
+
+    model_inputs = allocation.allocate_samples_to_models(all_samples)
+    np.testing.assert_array_almost_equal(
+            outputs[0], model_inputs[0][:, 0] - model_inputs[0][:, 1])
+    np.testing.assert_array_almost_equal(outputs[1],
+                                         sum_model(model_inputs[1]))
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 3, 20])
+def test_evaluate_model_in_chunks(mocker, all_samples, chunk_size):
+    model = mocker.Mock(side_effect=sum_model)
+
+    outputs = evaluate_model(model, all_samples, chunk_size=chunk_size)
+
+    np.testing.assert_array_almost_equal(outputs, sum_model(all_samples))
+    expected_calls = 1 if chunk_size is None \
+        else int(np.ceil(len(all_samples) / chunk_size))
+    assert model.call_count == expected_calls
+
+
+def test_evaluation_classes_import_without_optimizers():
+    code = ("import sys; from mxmc.evaluation import Model, ModelEvaluator; "
+            "assert 'torch' not in sys.modules")
+    package_root = os.path.dirname(os.path.dirname(mxmc.__file__))
+    subprocess.run([sys.executable, "-c", code], check=True,
+                   cwd=package_root)
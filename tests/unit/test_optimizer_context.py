@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+import torch
+
+from mxmc.optimizer import Optimizer
+from mxmc.optimizers.optimizer_context import OptimizerContext
+
+
+@pytest.fixture
+def covariance():
+    return np.array([[1, 0.9, 0.8],
+                     [0.9, 1.1, 0.7],
+                     [0.8, 0.7, 1.2]])
+
+
+@pytest.fixture
+def model_costs():
+    return np.array([1, 0.1, 0.01])
+
+
+def test_non_symmetric_covariance_raises_error(model_costs):
+    covariance = np.array([[1, 0.9, 0.8], [0.1, 1, 0.7], [0.8, 0.7, 1]])
+    with pytest.raises(ValueError):
+        OptimizerContext(model_costs, covariance)
+
+
+def test_mismatched_dimensions_raises_error(model_costs):
+    with pytest.raises(ValueError):
+        OptimizerContext(model_costs, np.identity(2))
+
+
+def test_costs_and_covariance_are_read_only(model_costs, covariance):
+    context = OptimizerContext(model_costs, covariance)
+    with pytest.raises(ValueError):
+        context.covariance[0, 0] = 2
+    with pytest.raises(ValueError):
+        context.model_costs[0] = 2
+    assert covariance.flags.writeable
+
+
+def test_context_copies_costs_and_covariance(model_costs, covariance):
+    context = OptimizerContext(model_costs, covariance)
+    model_costs[0] = 2
+    covariance[0, 0] = 2
+
+    assert context.model_costs[0] == 1
+    assert context.covariance[0, 0] == 1
+
+
+@pytest.mark.parametrize("model_indices", [[0, 2], [0, 1], [0]])
+def test_subset_indexes_costs_and_covariance(model_costs, covariance,
+                                             model_indices):
+    context = OptimizerContext(model_costs, covariance)
+    subset_context = context.subset(np.array(model_indices))
+
+    np.testing.assert_array_equal(subset_context.model_costs,
+                                  model_costs[model_indices])
+    np.testing.assert_array_equal(
+            subset_context.covariance,
+            covariance[np.ix_(model_indices, model_indices)])
+
+
+def test_subset_of_vector_qoi_covariance(model_costs, covariance):
+    vector_covariance = np.dstack([covariance, 2 * covariance])
+    context = OptimizerContext(model_costs, vector_covariance)
+    subset_context = context.subset(np.array([0, 2]))
+
+    assert subset_context.covariance.shape == (2, 2, 2)
+    np.testing.assert_array_equal(subset_context.covariance[:, :, 1],
+                                  2 * covariance[np.ix_([0, 2], [0, 2])])
+
+
+def test_subset_contexts_are_cached(model_costs, covariance):
+    context = OptimizerContext(model_costs, covariance)
+    subset_context = context.subset(np.array([0, 2]))
+    tensor = subset_context.get_covariance_tensor(torch.double)
+
+    assert context.subset([0, 2]) is subset_context
+    assert context.subset((0, 2)).get_covariance_tensor(torch.double) \
+        is tensor
+    assert context.subset([0, 1]) is not subset_context
+
+
+def test_covariance_tensor_is_cached_and_shares_memory(model_costs,
+                                                       covariance):
+    context = OptimizerContext(model_costs, covariance)
+    tensor = context.get_covariance_tensor(torch.double)
+
+    assert tensor is context.get_covariance_tensor(torch.double)
+    assert tensor.shape == (1, 3, 3)
+    assert tensor.data_ptr() == context.covariance.ctypes.data
+
+
+def test_covariance_tensor_of_vector_qoi_covariance(model_costs, covariance):
+    vector_covariance = np.dstack([covariance, 2 * covariance])
+    context = OptimizerContext(model_costs, vector_covariance)
+    tensor = context.get_covariance_tensor(torch.double)
+
+    np.testing.assert_array_equal(tensor[1].numpy(), 2 * covariance)
+
+
+def test_sub_optimizers_share_covariance_tensor(mocker, model_costs,
+                                                covariance):
+    sub_optimizers = []
+    optimizer = Optimizer.get_algorithm("gmfmr")(model_costs, covariance)
+    get_sub_optimizer = optimizer._get_sub_optimizer
+
+    def record_sub_optimizer(*args, **kwargs):
+        sub_optimizers.append(get_sub_optimizer(*args, **kwargs))
+        return sub_optimizers[-1]
+
+    mocker.patch.object(optimizer, "_get_sub_optimizer",
+                        side_effect=record_sub_optimizer)
+    optimizer.optimize(10)
+
+    tensors = {id(sub_opt._covariance_tensor) for sub_opt in sub_optimizers}
+    assert len(sub_optimizers) > 1
+    assert len(tensors) == 1
+
+
+def test_model_selection_validates_covariance_once(mocker, model_costs,
+                                                   covariance):
+    validate = mocker.spy(OptimizerContext, "_validate_covariance_matrix")
+    optimizer = Optimizer(model_costs, covariance)
+
+    optimizer.optimize("acvmf", 10, auto_model_selection=True)
+
+    assert validate.call_count == 1
@@ -2,6 +2,11 @@ import numpy as np
 import pytest
 
 from mxmc.optimizer import Optimizer
+from mxmc.optimizers.approximate_control_variates.acv_optimizer \
+    import ACVOptimizer
+from mxmc.optimizers.mfmc import MFMC
+from mxmc.optimizers.optimizer_base import OptimizationResult, \
+    TargetVarianceError
 from mxmc.util.testing import assert_opt_result_equal
 
 ALGORITHMS = Optimizer.get_algorithm_names()
@@ -130,3 +135,320 @@ def test_optimizer_runs_for_vector_qois(algorithm, qoi_dim):
     assert len(variance) == qoi_dim
     np.testing.assert_array_almost_equal(variance, np.full_like(variance,
                                                                 variance[0]))
+
+
+@pytest.mark.parametrize("algorithm", NUMERICAL_ALGORITHMS)
+@pytest.mark.parametrize("precision", ["single", "mixed"])
+def test_reduced_precision_matches_double_precision(algorithm, precision,
+                                                    three_model_costs,
+                                                    three_model_covariance):
+    target_cost = 100
+
+    optimizer = Optimizer(three_model_costs, three_model_covariance)
+    double_result = optimizer.optimize(algorithm, target_cost)
+    reduced_result = optimizer.optimize(algorithm, target_cost,
+                                        precision=precision)
+
+    assert isinstance(reduced_result.variance, float)
+    assert np.isclose(reduced_result.variance, double_result.variance,
+                      rtol=1e-2)
+
+
+def test_unknown_precision_raises_error():
+    optimizer = Optimizer(np.array([1, 0.1]), np.array([[1, 0.5], [0.5, 1]]))
+    with pytest.raises(ValueError):
+        optimizer.optimize("acvmf", 10, precision="half")
+
+
+def test_optimizer_limits_threads_during_optimization(mocker):
+    torch = pytest.importorskip("torch")
+    num_threads_before = torch.get_num_threads()
+    num_threads_during = []
+
+    original_optimize = Optimizer.get_algorithm("acvmf").optimize
+
+    def record_num_threads(self, target_cost):
+        num_threads_during.append(torch.get_num_threads())
+        return original_optimize(self, target_cost)
+
+    mocker.patch.object(Optimizer.get_algorithm("acvmf"), "optimize",
+                        record_num_threads)
+    optimizer = Optimizer(np.array([1, 0.1]),
+                          np.array([[1, 0.5], [0.5, 1]]), num_threads=1)
+    optimizer.optimize("acvmf", 10)
+
+    assert num_threads_during == [1]
+    assert torch.get_num_threads() == num_threads_before
+
+
+@pytest.mark.parametrize("num_threads", [0, -2])
+def test_non_positive_num_threads_raises_error(num_threads):
+    with pytest.raises(ValueError):
+        Optimizer(np.array([1, 0.1]), np.array([[1, 0.5], [0.5, 1]]),
+                  num_threads=num_threads)
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("auto_model_selection", [False, True])
+@pytest.mark.parametrize("target_variance", [1e-2, 1e-4])
+def test_optimize_for_variance_meets_target_at_dual_cost(
+        algorithm, auto_model_selection, target_variance, three_model_costs,
+        three_model_covariance):
+    optimizer = Optimizer(three_model_costs, three_model_covariance)
+
+    result = optimizer.optimize_for_variance(
+            algorithm, target_variance,
+            auto_model_selection=auto_model_selection)
+    primal_result = optimizer.optimize(
+            algorithm, np.sum(result.cost),
+            auto_model_selection=auto_model_selection)
+
+    assert np.sum(result.variance) <= target_variance
+    assert np.sum(result.variance) \
+        <= np.sum(primal_result.variance) * (1 + 2e-2)
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "wrdiff"])
+@pytest.mark.parametrize("target_variance", [0.5, 0.2, 0.05])
+def test_optimize_for_variance_is_cheapest_on_cost_grid(
+        algorithm, target_variance, three_model_costs,
+        three_model_covariance):
+    optimizer = Optimizer(three_model_costs, three_model_covariance)
+
+    result = optimizer.optimize_for_variance(algorithm, target_variance)
+    grid_costs = [np.sum(grid_result.cost) for grid_result in
+                  (optimizer.optimize(algorithm, target_cost)
+                   for target_cost in np.linspace(1.2, 30, 60))
+                  if np.sum(grid_result.variance) <= target_variance]
+
+    assert np.sum(result.variance) <= target_variance
+    assert np.sum(result.cost) <= min(grid_costs) * (1 + 1e-2)
+
+
+def test_acv_optimize_for_variance_raises_error_for_unreachable_variance(
+        mocker, three_model_costs, three_model_covariance):
+    optimizer = Optimizer.get_algorithm("acvmf")(three_model_costs,
+                                                 three_model_covariance)
+    unreachable_result = OptimizationResult(1, 10., None)
+    mocker.patch.object(optimizer, "_get_result_from_sample_nums",
+                        return_value=unreachable_result)
+
+    with pytest.raises(RuntimeError):
+        optimizer.optimize_for_variance(1e-2, max_iterations=5)
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_optimize_for_variance_for_one_model(algorithm):
+    optimizer = Optimizer(np.array([2.]), np.array([[12.]]))
+
+    result = optimizer.optimize_for_variance(algorithm, 5.)
+
+    assert result.allocation.compressed_allocation[0, 0] == 3
+    assert np.isclose(result.variance, 4.)
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_optimize_for_variance_with_vector_qois(algorithm, three_model_costs,
+                                                three_model_covariance):
+    covariance = np.stack([three_model_covariance,
+                           2 * three_model_covariance], axis=-1)
+    optimizer = Optimizer(three_model_costs, covariance)
+
+    result = optimizer.optimize_for_variance(algorithm, 1e-3)
+
+    assert len(result.variance) == 2
+    assert np.sum(result.variance) <= 1e-3
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("target_variance", [0, -1])
+def test_optimize_for_non_positive_variance_raises_error(algorithm,
+                                                         target_variance):
+    optimizer = Optimizer(np.array([1, 0.1]), np.array([[1, 0.5], [0.5, 1]]))
+    with pytest.raises(ValueError):
+        optimizer.optimize_for_variance(algorithm, target_variance)
+
+
+@pytest.mark.parametrize("algorithm", ["mfmc", "mlmc"])
+def test_optimize_for_variance_stops_after_convergence(
+        mocker, algorithm, three_model_costs, three_model_covariance):
+    optimizer = Optimizer.get_algorithm(algorithm)(three_model_costs,
+                                                   three_model_covariance)
+    optimize = mocker.spy(optimizer, "optimize")
+
+    result = optimizer.optimize_for_variance(1e-4, max_iterations=10)
+
+    assert np.sum(result.variance) <= 1e-4
+    assert optimize.call_count < 10
+
+
+def test_optimize_for_unreachable_variance_raises_error(mocker):
+    optimizer = Optimizer.get_algorithm("mfmc")(np.array([1, 0.1]),
+                                                np.array([[1, 0.5],
+                                                          [0.5, 1]]))
+    unreachable_result = OptimizationResult(1, 10., None)
+    optimize = mocker.patch.object(optimizer, "optimize",
+                                   return_value=unreachable_result)
+
+    with pytest.raises(RuntimeError):
+        optimizer.optimize_for_variance(1e-2, max_iterations=5)
+    assert optimize.call_count == 10
+
+
+def test_model_selection_skips_subsets_that_miss_target_variance(
+        mocker, three_model_costs, three_model_covariance):
+    optimizer = Optimizer(three_model_costs, three_model_covariance)
+    optimize_for_variance = MFMC.optimize_for_variance
+
+    def fail_for_all_models(mfmc, target_variance):
+        if mfmc.get_num_models() == 3:
+            raise TargetVarianceError("unreachable")
+        return optimize_for_variance(mfmc, target_variance)
+
+    mocker.patch.object(MFMC, "optimize_for_variance", autospec=True,
+                        side_effect=fail_for_all_models)
+
+    result = optimizer.optimize_for_variance("mfmc", 1e-2,
+                                             auto_model_selection=True)
+
+    assert np.sum(result.variance) <= 1e-2
+    assert 0 in result.allocation.get_number_of_samples_per_model()
+
+
+def test_model_selection_raises_error_if_no_subset_meets_variance(mocker):
+    optimizer = Optimizer(np.array([1, 0.1]), np.array([[1, 0.5],
+                                                        [0.5, 1]]))
+    mocker.patch.object(MFMC, "optimize_for_variance",
+                        side_effect=TargetVarianceError("unreachable"))
+
+    with pytest.raises(TargetVarianceError):
+        optimizer.optimize_for_variance("mfmc", 1e-2,
+                                        auto_model_selection=True)
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "wrdiff", "gmfmr"])
+def test_acv_optimize_for_variance_solves_once(mocker, algorithm,
+                                               three_model_costs,
+                                               three_model_covariance):
+    optimizer = Optimizer.get_algorithm(algorithm)(three_model_costs,
+                                                   three_model_covariance)
+    solve = mocker.spy(ACVOptimizer, "_solve_opt_problem")
+
+    optimizer.optimize_for_variance(1e-4)
+
+    num_structures = 1 if algorithm != "gmfmr" else 3
+    assert solve.call_count == num_structures
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "wrdiff"])
+def test_optimize_from_optimal_ratios_reproduces_optimization(
+        algorithm, three_model_costs, three_model_covariance):
+    optimizer = Optimizer.get_algorithm(algorithm)(three_model_costs,
+                                                   three_model_covariance)
+    assert optimizer.optimal_ratios is None
+
+    result = optimizer.optimize(100)
+    ratios_result = optimizer.optimize_from_ratios(optimizer.optimal_ratios,
+                                                   100)
+
+    assert_opt_result_equal(ratios_result, result.cost, result.variance,
+                            result.allocation.compressed_allocation)
+
+
+def test_optimize_from_ratios_violating_constraints_returns_none(
+        three_model_costs, three_model_covariance):
+    optimizer = Optimizer.get_algorithm("acvmf")(three_model_costs,
+                                                 three_model_covariance)
+
+    assert optimizer.optimize_from_ratios(np.array([1., 1.]), 100) is None
+    assert optimizer.optimize_from_ratios(np.array([2., 4.]), 1) is None
+
+
+@pytest.mark.parametrize("algorithm", ["acvkl", "gmfmr", "gismr"])
+def test_enumerator_exposes_best_structure(algorithm, three_model_costs,
+                                           three_model_covariance):
+    enumerator = Optimizer.get_algorithm(algorithm)(three_model_costs,
+                                                    three_model_covariance)
+    assert enumerator.best_recursion_refs is None
+
+    result = enumerator.optimize(100)
+    sub_optimizer = enumerator.get_sub_optimizer(
+            enumerator.best_recursion_refs)
+    ratios_result = sub_optimizer.optimize_from_ratios(
+            enumerator.optimal_ratios, 100)
+
+    assert_opt_result_equal(ratios_result, result.cost, result.variance,
+                            result.allocation.compressed_allocation)
+
+
+@pytest.fixture
+def covariance_replicates(three_model_covariance):
+    scales = np.array([0.8, 1.0, 1.5, 1.1])
+    return scales[:, np.newaxis, np.newaxis] * three_model_covariance
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "wrdiff", "gmfmr"])
+def test_robust_mean_of_scaled_replicates_matches_mean_covariance(
+        algorithm, three_model_costs, covariance_replicates):
+    optimizer = Optimizer(three_model_costs)
+
+    result = optimizer.optimize_robust(algorithm, 100,
+                                       covariance_replicates)
+    expected = Optimizer(three_model_costs,
+                         covariance_replicates.mean(0)).optimize(algorithm,
+                                                                 100)
+
+    assert result.variance == pytest.approx(expected.variance)
+    np.testing.assert_array_equal(result.allocation.compressed_allocation,
+                                  expected.allocation.compressed_allocation)
+
+
+def test_robust_quantile_is_reported_per_qoi(three_model_costs,
+                                             covariance_replicates):
+    replicates = np.stack([covariance_replicates,
+                           2 * covariance_replicates], axis=-1)
+    optimizer = Optimizer(three_model_costs)
+
+    result = optimizer.optimize_robust("acvmf", 100, replicates,
+                                       statistic=0.9)
+
+    sample_nums = result.allocation.get_number_of_samples_per_model()
+    variances = np.array([
+        Optimizer.get_algorithm("acvmf")(three_model_costs, replicate)
+        ._compute_variance_from_sample_nums(sample_nums)
+        for replicate in replicates])
+    assert len(result.variance) == 2
+    np.testing.assert_array_almost_equal(
+            result.variance, np.quantile(variances, 0.9, axis=0))
+
+
+def test_robust_optimization_from_pilot_outputs():
+    np.random.seed(0)
+    hifi_outputs = np.random.random(30)
+    pilot_outputs = [hifi_outputs,
+                     hifi_outputs + 0.1 * np.random.random(30),
+                     hifi_outputs + 0.5 * np.random.random(30)]
+    optimizer = Optimizer(np.array([1, 0.1, 0.01]))
+
+    result = optimizer.optimize_robust("acvis", 100,
+                                       pilot_outputs=pilot_outputs,
+                                       num_replicates=20,
+                                       auto_model_selection=True)
+
+    assert np.sum(result.cost) <= 100
+    assert np.isfinite(result.variance)
+
+
+def test_robust_optimization_requires_acv_algorithm(covariance_replicates):
+    optimizer = Optimizer(np.array([1, 0.1, 0.01]))
+    with pytest.raises(ValueError):
+        optimizer.optimize_robust("mfmc", 100, covariance_replicates)
+
+
+@pytest.mark.parametrize("statistic", ["median", 1.5, 0])
+def test_robust_optimization_invalid_statistic_raises_error(
+        statistic, covariance_replicates):
+    optimizer = Optimizer(np.array([1, 0.1, 0.01]))
+    with pytest.raises(ValueError):
+        optimizer.optimize_robust("acvmf", 100, covariance_replicates,
+                                  statistic=statistic)
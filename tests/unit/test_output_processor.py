@@ -73,3 +73,36 @@ def test_compute_covariance_matrix_with_no_overlap():
 
     expected = np.array([[0.5, np.nan], [np.nan] * 2])
     np.testing.assert_array_almost_equal(covariance, expected)
+
+
+def test_bootstrap_covariances_of_identical_replicates():
+    model_outputs = [np.array([1., 2., 4.]), np.array([2., 3., 1.])]
+    covariances = OutputProcessor.compute_bootstrap_covariances(
+            model_outputs, 5)
+
+    assert covariances.shape == (5, 2, 2)
+    for covariance in covariances:
+        np.testing.assert_array_almost_equal(covariance, covariance.T)
+
+
+def test_bootstrap_covariance_matches_covariance_of_resampled_outputs():
+    np.random.seed(0)
+    outputs = np.random.random((3, 10))
+    outputs[1, 2] = np.nan
+    resample_indices = np.random.randint(10, size=(4, 10))
+
+    covariances = OutputProcessor._compute_stacked_cov_elements(
+            outputs[:, resample_indices])
+
+    for covariance, indices in zip(covariances, resample_indices):
+        expected = OutputProcessor._compute_cov_elements(outputs[:, indices])
+        np.testing.assert_array_almost_equal(covariance, expected)
+
+
+def test_bootstrap_covariances_with_sample_allocation():
+    model_outputs = [np.array([1., 2., 5.]), np.array([3., 4.])]
+    allocation = SampleAllocationStub([[0, 1, 2], [1, 2]])
+    covariances = OutputProcessor.compute_bootstrap_covariances(
+            model_outputs, 3, sample_allocation=allocation)
+
+    assert covariances.shape == (3, 2, 2)
@@ -0,0 +1,218 @@
+import numpy as np
+import pytest
+
+from mxmc import Optimizer, OutputProcessor
+from mxmc.evaluation import Model, profile_pilot_runs, \
+    run_adaptive_pilot
+from mxmc.util.testing import assert_opt_result_equal
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.time = 0.
+
+    def __call__(self):
+        return self.time
+
+
+class TimedModel(Model):
+    '''
+    Model whose calls advance a fake clock by a fixed overhead plus a cost
+    per sample (plus a one time warm-up cost).
+    '''
+    def __init__(self, clock, cost, overhead=0., warmup_cost=0.,
+                 batched=True, scale=1.):
+        self.clock = clock
+        self.cost = cost
+        self.overhead = overhead
+        self.warmup_cost = warmup_cost
+        self.batched = batched
+        self.scale = scale
+
+    def evaluate(self, inputs):
+        inputs = np.atleast_2d(inputs)
+        self.clock.time += self.overhead + self.cost * len(inputs) \
+            + self.warmup_cost
+        self.warmup_cost = 0.
+        outputs = self.scale * np.sum(inputs, axis=1)
+        return outputs if self.batched else outputs[0]
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = FakeClock()
+    mocker.patch("mxmc.evaluation.pilot.time.perf_counter", new=clock)
+    return clock
+
+
+@pytest.fixture
+def pilot_inputs():
+    np.random.seed(0)
+    return np.random.random((20, 2))
+
+
+def test_costs_exclude_warmup_and_batch_overhead(clock, pilot_inputs):
+    models = [TimedModel(clock, 1.0, overhead=5., warmup_cost=100.),
+              TimedModel(clock, 0.1, overhead=0.5),
+              TimedModel(clock, 0.01, batched=False)]
+
+    profile = profile_pilot_runs(models, pilot_inputs)
+
+    np.testing.assert_array_almost_equal(profile.model_costs,
+                                         [1.0, 0.1, 0.01])
+    np.testing.assert_array_almost_equal(profile.batch_overheads,
+                                         [5., 0.5, 0.])
+    np.testing.assert_array_almost_equal(profile.cost_intervals[:, 0],
+                                         profile.model_costs)
+    np.testing.assert_array_almost_equal(profile.cost_intervals[:, 1],
+                                         profile.model_costs)
+
+
+def test_cost_intervals_contain_noisy_costs(clock, pilot_inputs):
+    class NoisyModel(TimedModel):
+        def evaluate(self, inputs):
+            self.clock.time += np.random.uniform(0, 0.02)
+            return super().evaluate(inputs)
+
+    np.random.seed(1)
+    profile = profile_pilot_runs([NoisyModel(clock, 0.1, overhead=0.05)],
+                                 pilot_inputs)
+
+    lower, upper = profile.cost_intervals[0]
+    assert lower < profile.model_costs[0] < upper
+    assert lower < 0.1 < upper
+
+
+def test_overhead_dominated_calls_give_positive_cost(clock, pilot_inputs):
+    class OverheadModel(TimedModel):
+        def evaluate(self, inputs):
+            self.clock.time += 1. / len(np.atleast_2d(inputs))
+            return super().evaluate(inputs)
+
+    profile = profile_pilot_runs([OverheadModel(clock, 0.)], pilot_inputs)
+
+    assert profile.model_costs[0] > 0
+    assert profile.batch_overheads[0] == 0
+
+
+def test_outputs_and_covariance_of_all_pilot_samples(clock, pilot_inputs):
+    models = [TimedModel(clock, 1.0, scale=1.),
+              TimedModel(clock, 0.1, scale=2., batched=False)]
+
+    profile = profile_pilot_runs(models, pilot_inputs, num_warmup=2)
+
+    expected_outputs = [np.sum(pilot_inputs, axis=1),
+                        2 * np.sum(pilot_inputs, axis=1)]
+    for outputs, expected in zip(profile.outputs, expected_outputs):
+        np.testing.assert_array_almost_equal(outputs, expected)
+    np.testing.assert_array_almost_equal(
+            profile.covariance,
+            OutputProcessor.compute_covariance_matrix(expected_outputs))
+
+
+@pytest.mark.parametrize("kwargs", [{"num_warmup": -1}, {"num_warmup": 20},
+                                    {"confidence": 1.}])
+def test_invalid_settings_raise_error(clock, pilot_inputs, kwargs):
+    with pytest.raises(ValueError):
+        profile_pilot_runs([TimedModel(clock, 1.)], pilot_inputs, **kwargs)
+
+
+def correlated_models():
+    return [lambda x: np.sin(x[:, 0]),
+            lambda x: np.sin(x[:, 0]) + 0.1 * x[:, 0] ** 2,
+            lambda x: x[:, 0]]
+
+
+def sample_generator(num_samples):
+    return np.random.uniform(-2, 2, (num_samples, 1))
+
+
+def test_adaptive_pilot_stops_at_tolerance():
+    np.random.seed(0)
+    model_costs = np.array([1, 0.1, 0.01])
+    result = run_adaptive_pilot(correlated_models(), sample_generator,
+                                "mfmc", 100, model_costs, tolerance=0.2,
+                                batch_size=10)
+
+    assert result.converged
+    assert result.variance_errors[-1] <= 0.2
+    assert np.all(result.variance_errors[:-1] > 0.2)
+    assert len(result.inputs) == 10 * len(result.variance_errors)
+    assert result.pilot_cost == pytest.approx(len(result.inputs) * 1.11)
+    np.testing.assert_array_almost_equal(
+            result.covariance,
+            OutputProcessor.compute_covariance_matrix(result.outputs))
+
+
+def test_adaptive_pilot_stops_at_max_samples():
+    np.random.seed(0)
+    result = run_adaptive_pilot(correlated_models(), sample_generator,
+                                "mfmc", 100, np.array([1, 0.1, 0.01]),
+                                tolerance=1e-6, batch_size=10, max_samples=25)
+
+    assert not result.converged
+    assert len(result.inputs) == 25
+    assert len(result.variance_errors) == 3
+    for outputs in result.outputs:
+        assert len(outputs) == 25
+
+
+def test_adaptive_pilot_cost_includes_setup_cost_of_every_batch():
+    np.random.seed(0)
+    model_costs = np.array([1, 0.1, 0.01])
+    setup_costs = np.array([5., 2., 1.])
+    result = run_adaptive_pilot(correlated_models(), sample_generator,
+                                "mfmc", 200, model_costs, tolerance=1e-6,
+                                batch_size=10, max_samples=25,
+                                setup_costs=setup_costs,
+                                batch_sizes=[4, 10, 10])
+
+    num_setups = np.array([3 + 3 + 2, 3, 3])
+    expected_cost = 25 * np.sum(model_costs) + np.dot(num_setups,
+                                                      setup_costs)
+    assert result.pilot_cost == pytest.approx(expected_cost)
+
+
+def test_adaptive_pilot_measures_model_costs(clock):
+    class PerturbedModel(TimedModel):
+        def evaluate(self, inputs):
+            return super().evaluate(inputs) + 0.1 * np.sin(5 * inputs[:, 0])
+
+    np.random.seed(0)
+    models = [TimedModel(clock, 1.0, overhead=0.5),
+              PerturbedModel(clock, 0.1)]
+    result = run_adaptive_pilot(models, lambda n: np.random.random((n, 2)),
+                                "mfmc", 100, tolerance=0.5, batch_size=10)
+
+    np.testing.assert_array_almost_equal(result.model_costs, [1.0, 0.1])
+    np.testing.assert_array_almost_equal(result.setup_costs, [0.5, 0.])
+    assert result.pilot_time > 0
+
+
+def test_adaptive_pilot_optimizes_with_measured_overheads(clock):
+    class PerturbedModel(TimedModel):
+        def evaluate(self, inputs):
+            return super().evaluate(inputs) + 0.1 * np.sin(5 * inputs[:, 0])
+
+    np.random.seed(0)
+    models = [TimedModel(clock, 1.0, overhead=20.),
+              PerturbedModel(clock, 0.1)]
+    result = run_adaptive_pilot(models, lambda n: np.random.random((n, 2)),
+                                "mfmc", 100, batch_size=10, max_samples=10)
+
+    optimizer = Optimizer(result.model_costs, result.covariance,
+                          setup_costs=[20., 0.])
+    expected = optimizer.optimize("mfmc", 100)
+    assert_opt_result_equal(result.optimization_result, expected.cost,
+                            expected.variance,
+                            expected.allocation.compressed_allocation)
+    assert result.pilot_cost == pytest.approx(10 * 1.1 + 20.)
+
+
+@pytest.mark.parametrize("kwargs", [{"tolerance": 0.}, {"batch_size": 1},
+                                    {"batch_size": 20, "max_samples": 10}])
+def test_invalid_adaptive_pilot_settings_raise_error(kwargs):
+    with pytest.raises(ValueError):
+        run_adaptive_pilot(correlated_models(), sample_generator, "mfmc",
+                           100, np.array([1, 0.1, 0.01]), **kwargs)
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+import torch
+
+from mxmc import Estimator, Optimizer
+
+ACV_ALGORITHMS = ["acvmf", "acvmfu", "acvmfmc", "acvis", "wrdiff", "acvkl",
+                  "gmfmr", "gismr", "grdmr"]
+
+
+@pytest.mark.parametrize("algorithm",
+                         ["acvmf", "acvmfu", "acvmfmc", "acvis", "wrdiff"])
+def test_shared_sample_variance_matches_acv_variance(algorithm,
+                                                     four_model_costs,
+                                                     four_model_covariance):
+    optimizer = Optimizer.get_algorithm(algorithm)(four_model_costs,
+                                                   four_model_covariance)
+    ratios = torch.tensor([3., 7., 11.5], dtype=torch.double)
+
+    variance = optimizer._compute_acv_estimator_variance(
+            optimizer._covariance_tensor, ratios, 10.)
+    optimizer._fixed_allocation = np.zeros((1, 8), dtype=int)
+    shared_sample_variance = \
+        optimizer._compute_shared_sample_acv_estimator_variance(
+            optimizer._covariance_tensor, ratios, 10.)
+
+    assert shared_sample_variance.item() == pytest.approx(variance.item())
+
+
+@pytest.mark.parametrize("algorithm", ACV_ALGORITHMS)
+def test_allocation_starts_with_pilot_group(algorithm, four_model_costs,
+                                            four_model_covariance):
+    result = Optimizer(four_model_costs, four_model_covariance).optimize(
+            algorithm, 100, num_pilot_samples=20)
+
+    compressed_allocation = result.allocation.compressed_allocation
+    np.testing.assert_array_equal(compressed_allocation[0],
+                                  [20] + [1] * 7)
+    assert np.all(compressed_allocation[1:, 0] > 0)
+
+
+@pytest.mark.parametrize("algorithm", ACV_ALGORITHMS)
+def test_estimator_variance_includes_pilot_group(algorithm,
+                                                 four_model_costs,
+                                                 four_model_covariance):
+    result = Optimizer(four_model_costs, four_model_covariance).optimize(
+            algorithm, 100, num_pilot_samples=20)
+
+    estimator = Estimator(result.allocation, four_model_covariance)
+    assert estimator.approximate_variance == pytest.approx(result.variance)
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "wrdiff"])
+def test_pilot_cost_is_sunk(algorithm, four_model_costs,
+                            four_model_covariance):
+    optimizer = Optimizer(four_model_costs, four_model_covariance)
+    result = optimizer.optimize(algorithm, 100)
+    pilot_result = optimizer.optimize(algorithm, 100, num_pilot_samples=20)
+
+    assert pilot_result.cost <= 100
+    assert pilot_result.variance < result.variance
+
+
+def _bisect_cost_for_variance(optimizer, algorithm, target_variance,
+                              **options):
+    lower, upper = 1., 1000.
+    for _ in range(40):
+        target_cost = (lower + upper) / 2
+        if optimizer.optimize(algorithm, target_cost,
+                              **options).variance <= target_variance:
+            upper = target_cost
+        else:
+            lower = target_cost
+    return optimizer.optimize(algorithm, upper, **options)
+
+
+@pytest.mark.parametrize("num_pilot_samples, target_variance",
+                         [(20, 0.01), (50, 0.01), (200, 0.004)])
+def test_pilot_samples_lower_cost_for_target_variance(
+        four_model_costs, four_model_covariance, num_pilot_samples,
+        target_variance):
+    optimizer = Optimizer(four_model_costs, four_model_covariance)
+    result = optimizer.optimize_for_variance("acvmf", target_variance)
+    pilot_result = optimizer.optimize_for_variance(
+            "acvmf", target_variance, num_pilot_samples=num_pilot_samples)
+    bisected_result = _bisect_cost_for_variance(
+            optimizer, "acvmf", target_variance,
+            num_pilot_samples=num_pilot_samples)
+
+    assert pilot_result.variance <= target_variance
+    assert pilot_result.cost < result.cost
+    assert pilot_result.cost <= bisected_result.cost * (1 + 1e-2)
+
+
+def test_pilot_group_with_model_selection(four_model_costs,
+                                          four_model_covariance):
+    result = Optimizer(four_model_costs, four_model_covariance).optimize(
+            "acvmf", 100, auto_model_selection=True, num_pilot_samples=20)
+
+    assert result.allocation.compressed_allocation[0, 0] == 20
+    estimator = Estimator(result.allocation, four_model_covariance)
+    assert estimator.approximate_variance == pytest.approx(result.variance)
+
+
+def test_pilot_samples_are_first_samples_of_all_models(four_model_costs,
+                                                       four_model_covariance):
+    result = Optimizer(four_model_costs, four_model_covariance).optimize(
+            "acvmf", 100, num_pilot_samples=20)
+    allocation = result.allocation
+    all_samples = np.arange(allocation.num_total_samples, dtype=float)
+    model_outputs = allocation.allocate_samples_to_models(all_samples)
+
+    for outputs in model_outputs:
+        np.testing.assert_array_equal(outputs[:20], np.arange(20))
+    constant_outputs = [np.full(len(outputs), 3.)
+                        for outputs in model_outputs]
+    estimator = Estimator(allocation, four_model_covariance)
+    assert estimator.get_estimate(constant_outputs) == pytest.approx(3.)
+
+
+@pytest.mark.parametrize("algorithm", ["mfmc", "mlmc"])
+def test_pilot_reuse_with_non_acv_algorithm_raises_error(
+        algorithm, four_model_costs, four_model_covariance):
+    optimizer = Optimizer(four_model_costs, four_model_covariance)
+    with pytest.raises(ValueError):
+        optimizer.optimize(algorithm, 100, num_pilot_samples=20)
+
+
+def test_negative_num_pilot_samples_raises_error(four_model_costs,
+                                                 four_model_covariance):
+    optimizer = Optimizer(four_model_costs, four_model_covariance)
+    with pytest.raises(ValueError):
+        optimizer.optimize("acvmf", 100, num_pilot_samples=-1)
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from mxmc import Optimizer
+from mxmc.util.qoi_compression import group_qoi_covariances
+
+ACV_ALGORITHMS = ["acvmf", "acvmfu", "acvis", "wrdiff"]
+
+
+@pytest.fixture
+def covariance_shapes(three_model_covariance):
+    return [three_model_covariance,
+            np.array([[1.0, 0.2, 0.5],
+                      [0.2, 1.1, 0.1],
+                      [0.5, 0.1, 0.9]])]
+
+
+@pytest.fixture
+def proportional_covariance(covariance_shapes):
+    scales = np.array([0.5, 2.0, 1.0, 3.0, 0.2, 1.5])
+    covariance = np.empty((3, 3, len(scales)))
+    for i, scale in enumerate(scales):
+        covariance[:, :, i] = scale * covariance_shapes[i % 2]
+    return covariance
+
+
+def test_grouping_sums_proportional_covariances(covariance_shapes,
+                                                proportional_covariance):
+    grouped = group_qoi_covariances(proportional_covariance, 2)
+
+    expected = [proportional_covariance[:, :, 0::2].sum(axis=2),
+                proportional_covariance[:, :, 1::2].sum(axis=2)]
+    assert grouped.shape == (3, 3, 2)
+    grouped_matrices = sorted([grouped[:, :, i] for i in range(2)],
+                              key=lambda x: x[0, 1])
+    expected = sorted(expected, key=lambda x: x[0, 1])
+    for matrix, expected_matrix in zip(grouped_matrices, expected):
+        np.testing.assert_array_almost_equal(matrix, expected_matrix)
+
+
+def test_grouping_with_more_groups_than_qois_is_unchanged(
+        proportional_covariance):
+    grouped = group_qoi_covariances(proportional_covariance, 10)
+    np.testing.assert_array_equal(grouped, proportional_covariance)
+
+
+@pytest.mark.parametrize("algorithm", ACV_ALGORITHMS)
+def test_compressed_objective_exact_for_proportional_qois(
+        algorithm, three_model_costs, proportional_covariance):
+    ratios = np.array([3.0, 7.0])
+    optimizer_class = Optimizer.get_algorithm(algorithm)
+
+    exact = optimizer_class(three_model_costs, proportional_covariance)
+    compressed = optimizer_class(three_model_costs, proportional_covariance,
+                                 qoi_compression=2)
+
+    exact_obj = exact._compute_objective_function(ratios, 100,
+                                                  gradient=False)
+    compressed_obj = compressed._compute_objective_function(ratios, 100,
+                                                            gradient=False)
+    assert compressed_obj == pytest.approx(exact_obj)
+
+
+@pytest.mark.parametrize("algorithm", ACV_ALGORITHMS)
+def test_compressed_objective_bounds_exact_objective(algorithm,
+                                                     three_model_costs):
+    np.random.seed(0)
+    covariance = np.empty((3, 3, 20))
+    for i in range(20):
+        samples = np.random.random((3, 3))
+        covariance[:, :, i] = np.dot(samples.T, samples)
+    ratios = np.array([3.0, 7.0])
+    optimizer_class = Optimizer.get_algorithm(algorithm)
+
+    exact = optimizer_class(three_model_costs, covariance)
+    compressed = optimizer_class(three_model_costs, covariance,
+                                 qoi_compression=3)
+
+    exact_obj = exact._compute_objective_function(ratios, 100,
+                                                  gradient=False)
+    compressed_obj = compressed._compute_objective_function(ratios, 100,
+                                                            gradient=False)
+    assert compressed_obj >= exact_obj * (1 - 1e-12)
+
+
+def test_compressed_optimization_reports_exact_variance(
+        three_model_costs, proportional_covariance):
+    exact = Optimizer.get_algorithm("acvmf")(three_model_costs,
+                                             proportional_covariance)
+    compressed = Optimizer.get_algorithm("acvmf")(
+            three_model_costs, proportional_covariance, qoi_compression=1)
+
+    compressed_result = compressed.optimize(100)
+
+    sample_nums = compressed._compute_sample_nums_from_ratios(
+            compressed._optimal_ratios, 100)
+    exact_variance = exact._compute_variance_from_sample_nums(
+            np.floor(sample_nums))
+    np.testing.assert_array_almost_equal(compressed_result.variance,
+                                         exact_variance)
+    assert len(compressed_result.variance) == 6
+
+
+def test_non_positive_compression_raises_error(three_model_costs,
+                                               proportional_covariance):
+    with pytest.raises(ValueError):
+        Optimizer.get_algorithm("acvmf")(three_model_costs,
+                                         proportional_covariance,
+                                         qoi_compression=0)
+
+
+def test_compressed_enumeration_reports_exact_variance(
+        three_model_costs, proportional_covariance):
+    optimizer = Optimizer(three_model_costs, proportional_covariance,
+                          qoi_compression=1, num_screened=2)
+    result = optimizer.optimize("gmfmr", 100)
+
+    assert len(result.variance) == 6
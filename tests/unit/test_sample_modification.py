@@ -3,9 +3,11 @@ import warnings
 import numpy as np
 import pytest
 
+from mxmc import Optimizer
 from mxmc.estimator import Estimator
 from mxmc.sample_allocations.mlmc_sample_allocation import MLMCSampleAllocation
 from mxmc.util.sample_modification import adjust_sample_allocation_to_cost
+from mxmc.util.sample_modification import extend_sample_allocation
 from mxmc.util.sample_modification import _generate_test_samplings
 from mxmc.util.sample_modification import _get_cost_per_sample_by_group
 from mxmc.util.sample_modification import _get_total_sampling_cost
@@ -256,3 +258,122 @@ def test_result_mocked_generate_test_samplings(mocker):
     compressed_allocation_expected = np.array([[4, 1]])
     assert np.array_equal(adjusted_allocation.compressed_allocation,
                           compressed_allocation_expected)
+
+
+@pytest.fixture
+def existing_allocation(three_model_costs, three_model_covariance):
+    optimizer = Optimizer(three_model_costs, three_model_covariance)
+    return optimizer.optimize("acvmf", 100).allocation
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "wrdiff", "acvkl"])
+def test_extension_keeps_existing_groups(algorithm, existing_allocation,
+                                         three_model_costs,
+                                         three_model_covariance):
+    extension = extend_sample_allocation(existing_allocation, 200,
+                                         three_model_costs,
+                                         three_model_covariance, algorithm)
+
+    existing = existing_allocation.compressed_allocation
+    extended = extension.allocation.compressed_allocation
+    np.testing.assert_array_equal(extended[:len(existing)], existing)
+    np.testing.assert_array_equal(extended[len(existing):],
+                                  extension.new_allocation
+                                  .compressed_allocation)
+    assert _get_total_sampling_cost(existing, three_model_costs) \
+        + extension.cost <= 200
+
+
+@pytest.mark.parametrize("algorithm", ["acvmf", "acvis", "wrdiff"])
+def test_extension_variance_is_estimator_variance(algorithm,
+                                                  existing_allocation,
+                                                  three_model_costs,
+                                                  three_model_covariance):
+    extension = extend_sample_allocation(existing_allocation, 200,
+                                         three_model_costs,
+                                         three_model_covariance, algorithm)
+
+    estimator = Estimator(extension.allocation, three_model_covariance)
+    existing_estimator = Estimator(existing_allocation,
+                                   three_model_covariance)
+    assert estimator.approximate_variance \
+        == pytest.approx(extension.variance)
+    assert extension.variance < existing_estimator.approximate_variance
+
+
+def test_extended_outputs_are_existing_then_new_outputs(
+        existing_allocation, three_model_costs, three_model_covariance):
+    extension = extend_sample_allocation(existing_allocation, 200,
+                                         three_model_costs,
+                                         three_model_covariance)
+
+    num_existing = existing_allocation.num_total_samples
+    all_samples = np.arange(extension.allocation.num_total_samples)
+    extended_inputs = extension.allocation.allocate_samples_to_models(
+            all_samples)
+    existing_inputs = existing_allocation.allocate_samples_to_models(
+            all_samples[:num_existing])
+    new_inputs = extension.new_allocation.allocate_samples_to_models(
+            all_samples[num_existing:])
+    for extended, existing, new in zip(extended_inputs, existing_inputs,
+                                       new_inputs):
+        np.testing.assert_array_equal(extended,
+                                      np.concatenate((existing, new)))
+
+
+def test_extension_beyond_budget_raises_error(existing_allocation,
+                                              three_model_costs,
+                                              three_model_covariance):
+    with pytest.raises(ValueError):
+        extend_sample_allocation(existing_allocation, 100, three_model_costs,
+                                 three_model_covariance)
+
+
+def test_extension_with_non_acv_algorithm_raises_error(
+        existing_allocation, three_model_costs, three_model_covariance):
+    with pytest.raises(ValueError):
+        extend_sample_allocation(existing_allocation, 200, three_model_costs,
+                                 three_model_covariance, "mfmc")
+
+
+def test_get_total_sampling_cost_with_setup_costs(
+        two_model_compressed_allocation, two_model_costs):
+    cost = _get_total_sampling_cost(two_model_compressed_allocation,
+                                    two_model_costs, setup_costs=[5., 2.],
+                                    batch_sizes=[4, 100])
+
+    assert cost == pytest.approx(200. + 3 * 5. + 1 * 2.)
+
+
+def test_adjusted_allocation_with_setup_costs_is_within_cost(
+        two_model_sample_allocation, two_model_costs):
+    covariance = np.array([[1, 0.5], [0.5, 1]])
+    setup_costs = [5., 2.]
+    batch_sizes = [10, 100]
+    adjusted_allocation = adjust_sample_allocation_to_cost(
+            two_model_sample_allocation, 240, two_model_costs, covariance,
+            setup_costs, batch_sizes)
+
+    compressed_allocation = adjusted_allocation.compressed_allocation
+    assert _get_total_sampling_cost(compressed_allocation, two_model_costs,
+                                    setup_costs, batch_sizes) <= 240
+    assert compressed_allocation[:, 0].sum() \
+        > two_model_sample_allocation.compressed_allocation[:, 0].sum()
+
+
+def test_extension_with_setup_costs(existing_allocation, three_model_costs,
+                                    three_model_covariance):
+    setup_costs = [10., 5., 1.]
+    extension = extend_sample_allocation(existing_allocation, 200,
+                                         three_model_costs,
+                                         three_model_covariance,
+                                         setup_costs=setup_costs)
+
+    existing_cost = _get_total_sampling_cost(
+            existing_allocation.compressed_allocation, three_model_costs,
+            setup_costs)
+    assert existing_cost + extension.cost <= 200
+    new_cost = _get_total_sampling_cost(
+            extension.new_allocation.compressed_allocation,
+            three_model_costs, setup_costs)
+    assert extension.cost == pytest.approx(new_cost)
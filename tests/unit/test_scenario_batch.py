@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from mxmc.optimizer import Optimizer
+from mxmc.optimizers.optimizer_base import InconsistentModelError
+from mxmc.util.scenario_batch import optimize_scenarios, \
+    iter_scenario_results
+
+ALGORITHMS = ["mfmc", "acvmf", "mlmc", "acvis"]
+
+
+@pytest.fixture
+def covariances(three_model_covariance):
+    return np.array([three_model_covariance,
+                     [[1.0, 0.5, 0.2],
+                      [0.5, 1.0, 0.1],
+                      [0.2, 0.1, 1.0]]])
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_table_matches_individual_optimizations(three_model_costs,
+                                                covariances, num_processes):
+    target_costs = np.array([100, 50])
+    table = optimize_scenarios(ALGORITHMS, three_model_costs, covariances,
+                               target_costs, num_processes=num_processes)
+
+    assert len(table) == len(ALGORITHMS) * len(covariances)
+    for row in table:
+        scenario = row["scenario"]
+        optimizer = Optimizer(three_model_costs, covariances[scenario])
+        result = optimizer.optimize(row["algorithm"],
+                                    target_costs[scenario])
+        assert row["target_cost"] == target_costs[scenario]
+        assert np.isclose(row["cost"], np.sum(result.cost))
+        assert np.isclose(row["variance"], np.sum(result.variance))
+        np.testing.assert_array_equal(row["allocation"],
+                                      result.allocation.compressed_allocation)
+
+
+def test_table_is_ordered_by_scenario_then_algorithm(three_model_costs,
+                                                     covariances):
+    table = optimize_scenarios(ALGORITHMS, three_model_costs, covariances,
+                               100, num_processes=1)
+
+    np.testing.assert_array_equal(table["scenario"], [0] * 4 + [1] * 4)
+    np.testing.assert_array_equal(table["algorithm"], ALGORITHMS * 2)
+
+
+def test_inconsistent_models_give_nan_rows():
+    covariances = np.array([[[1.0, 0.1, 0.9],
+                             [0.1, 1.0, 0.1],
+                             [0.9, 0.1, 1.0]]])
+    table = optimize_scenarios(["mfmc"], np.array([1, 0.5, 0.4]),
+                               covariances, 100, num_processes=1)
+
+    assert np.isnan(table["variance"][0])
+    assert table["allocation"][0] is None
+
+
+def test_scenario_specific_costs_and_vector_qois(covariances):
+    model_costs = np.array([[1, 0.1, 0.01], [1, 0.5, 0.2]])
+    vector_covariances = np.stack([covariances, 2 * covariances], axis=-1)
+    table = optimize_scenarios(["acvmf"], model_costs, vector_covariances,
+                               100, num_processes=1)
+
+    result = Optimizer(model_costs[1], vector_covariances[1]).optimize(
+            "acvmf", 100)
+    assert np.isclose(table["variance"][1], np.sum(result.variance))
+
+
+def test_streaming_yields_all_rows(three_model_costs, covariances):
+    rows = list(iter_scenario_results(ALGORITHMS, three_model_costs,
+                                      covariances, 100, num_processes=1))
+
+    assert sorted((row[0], row[1]) for row in rows) \
+        == sorted((i, a) for i in range(2) for a in ALGORITHMS)
+
+
+@pytest.mark.parametrize("algorithm", ["mfmc", "mlmc"])
+@pytest.mark.parametrize("num_qois", [1, 3])
+def test_closed_form_scenarios_match_individual_optimizations(algorithm,
+                                                              num_qois):
+    rng = np.random.default_rng(3)
+    num_scenarios, num_models = 20, 4
+    noise = np.cumsum(rng.uniform(0.05, 0.5,
+                                  (num_scenarios, num_models, num_qois)),
+                      axis=1)
+    noise[:, 0] = 0
+    scale = rng.uniform(0.5, 2, (num_scenarios, 1, 1, num_qois))
+    covariances = scale * (1 + np.eye(num_models)[None, :, :, None]
+                           * noise[:, None, :, :] ** 2)
+    model_costs = 10. ** -(np.arange(num_models)
+                           + rng.uniform(0, 0.5, (num_scenarios, num_models)))
+    model_costs[:, 0] = 1
+    target_costs = rng.uniform(0.5, 100, num_scenarios)
+    if num_qois == 1:
+        covariances = covariances[..., 0]
+
+    table = optimize_scenarios([algorithm], model_costs, covariances,
+                               target_costs, num_processes=1)
+
+    for row in table:
+        scenario = row["scenario"]
+        optimizer = Optimizer(model_costs[scenario], covariances[scenario])
+        try:
+            result = optimizer.optimize(algorithm, target_costs[scenario])
+        except InconsistentModelError:
+            assert np.isnan(row["variance"])
+            assert row["allocation"] is None
+            continue
+        assert np.isclose(row["cost"], np.sum(result.cost))
+        assert np.isclose(row["variance"], np.sum(result.variance))
+        np.testing.assert_array_equal(row["allocation"],
+                                      result.allocation.compressed_allocation)
+
+
+def test_closed_form_scenarios_run_in_a_single_pass(mocker, three_model_costs,
+                                                    covariances):
+    optimize = mocker.spy(Optimizer, "optimize")
+
+    optimize_scenarios(["mfmc", "mlmc"], three_model_costs, covariances,
+                       100, num_processes=1)
+
+    assert optimize.call_count == 0
+
+
+def test_unstacked_covariance_raises_error(three_model_costs, covariances):
+    with pytest.raises(ValueError):
+        optimize_scenarios(ALGORITHMS, three_model_costs, covariances[0],
+                           100)
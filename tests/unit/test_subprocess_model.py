@@ -0,0 +1,95 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from mxmc.evaluation import ModelEvaluator, SubprocessModel
+from mxmc.sample_allocations.acv_sample_allocation import ACVSampleAllocation
+
+SUM_SCRIPT = """
+import sys
+import numpy as np
+inputs = np.loadtxt(sys.argv[1], delimiter=",", ndmin=2)
+np.savetxt(sys.argv[2], inputs.sum(axis=1))
+"""
+
+FLAKY_SCRIPT = """
+import os
+import sys
+import numpy as np
+marker = os.path.join(sys.argv[3], "failed_once")
+if not os.path.exists(marker):
+    open(marker, "w").close()
+    sys.exit(1)
+inputs = np.loadtxt(sys.argv[1], delimiter=",", ndmin=2)
+np.savetxt(sys.argv[2], inputs.sum(axis=1))
+"""
+
+SLEEP_SCRIPT = "import time; time.sleep(10)"
+
+
+def python_command(script, *extra_args):
+    return [sys.executable, "-c", script, "{input_file}", "{output_file}"] \
+        + list(extra_args)
+
+
+@pytest.fixture
+def inputs():
+    return np.array([[1., 2.], [3., 4.], [5., 6.]])
+
+
+@pytest.mark.parametrize("per_sample", [True, False])
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_outputs_of_file_protocol(inputs, per_sample, max_workers):
+    model = SubprocessModel(python_command(SUM_SCRIPT),
+                            fixed_inputs=[10.], per_sample=per_sample,
+                            max_workers=max_workers)
+
+    np.testing.assert_array_almost_equal(model(inputs),
+                                         10 + inputs.sum(axis=1))
+
+
+def test_run_directories_are_removed(tmp_path, inputs):
+    model = SubprocessModel(python_command(SUM_SCRIPT), work_dir=tmp_path)
+    model(inputs)
+    assert os.listdir(tmp_path) == []
+
+
+def test_run_directories_are_kept(tmp_path, inputs):
+    model = SubprocessModel(python_command(SUM_SCRIPT), work_dir=tmp_path,
+                            keep_files=True)
+    model(inputs)
+    assert len(os.listdir(tmp_path)) == len(inputs)
+
+
+def test_failed_run_is_retried(tmp_path, inputs):
+    model = SubprocessModel(python_command(FLAKY_SCRIPT, str(tmp_path)),
+                            per_sample=False, retries=1)
+    np.testing.assert_array_almost_equal(model(inputs), inputs.sum(axis=1))
+
+
+def test_failed_run_raises_error_after_retries(tmp_path, inputs):
+    model = SubprocessModel(python_command(FLAKY_SCRIPT, str(tmp_path)),
+                            per_sample=False)
+    with pytest.raises(RuntimeError):
+        model(inputs)
+
+
+def test_timed_out_run_raises_error(inputs):
+    model = SubprocessModel(python_command(SLEEP_SCRIPT), timeout=0.5)
+    with pytest.raises(RuntimeError):
+        model(inputs[:1])
+
+
+def test_subprocess_model_in_model_evaluator():
+    allocation = ACVSampleAllocation(np.array([[2, 1, 1, 1],
+                                               [3, 0, 0, 1]]))
+    all_samples = np.arange(10.).reshape(5, 2)
+    model = SubprocessModel(python_command(SUM_SCRIPT), per_sample=False)
+
+    outputs = ModelEvaluator([model, model], max_workers=2).evaluate(
+            allocation, all_samples)
+
+    np.testing.assert_array_almost_equal(outputs[0], [1, 5])
+    np.testing.assert_array_almost_equal(outputs[1], [1, 5, 9, 13, 17])